@@ -1,15 +1,42 @@
 """
 Django admin customization.
 """
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.forms import UserChangeForm as BaseUserChangeForm
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from core import models
+from core import bulk, models, sharding
+
+
+class UserChangeForm(BaseUserChangeForm):
+    """Form of a user, who cannot be deactivated while owning rows."""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (self.instance.is_active and
+                not cleaned_data.get('is_active', True) and
+                bulk.portfolio_size(self.instance)):
+            raise forms.ValidationError(_(
+                'Transfer the portfolio of this user before deactivating '
+                'them.'))
+        return cleaned_data
 
 
 class UserAdmin(BaseUserAdmin):
-    """Define the admin pages for users."""
+    """
+    Define the admin pages for users. The users owning customers, contracts
+    or open events cannot be deleted or deactivated, which would leave
+    these rows without a contact: their portfolio has to be transferred
+    first.
+    """
+    form = UserChangeForm
     ordering = ['id']
     list_display = ['email', 'role', 'first_name', 'last_name']
     fieldsets = (
@@ -45,39 +72,279 @@ class UserAdmin(BaseUserAdmin):
             )
     search_fields = ['email', 'first_name', 'last_name', 'role']
 
+    def get_deleted_objects(self, objs, request):
+        deleted, counts, perms_needed, protected = super(
+            ).get_deleted_objects(objs, request)
+        for user in objs:
+            size = bulk.portfolio_size(user)
+            if size:
+                protected.append(_(
+                    '%(count)d customers, contracts or open events of '
+                    '%(user)s') % {'count': size, 'user': user})
+        return deleted, counts, perms_needed, protected
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of the large tables, over every shard. The count of an
+    unfiltered changelist is read from the planner statistics, a filtered
+    one is counted up to COUNT_LIMIT rows, so that no page has to count
+    millions of rows. capped tells the templates to show a count which
+    stopped there as "10000+".
+    """
+    COUNT_LIMIT = 10000
+    capped = False
+
+    def __init__(self, object_list, *args, **kwargs):
+        self.queryset = object_list
+        super().__init__(sharding.scatter(object_list), *args, **kwargs)
+
+    @cached_property
+    def count(self):
+        querysets = sharding.spread(self.queryset)
+        if (self.queryset.query.where ==
+                self.queryset.model._default_manager.all().query.where):
+            estimate = sum(estimated_count(queryset.model, queryset.db)
+                           for queryset in querysets)
+            if estimate > self.COUNT_LIMIT:
+                return estimate
+        count = sum(queryset.order_by()[:self.COUNT_LIMIT + 1].count()
+                    for queryset in querysets)
+        self.capped = count > self.COUNT_LIMIT
+        return min(count, self.COUNT_LIMIT)
+
+
+def estimated_count(model, using='default'):
+    """Return the planner's estimate of the number of rows of a table."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class '
+                       'WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+class UserChoiceForm(forms.Form):
+    """Form of the actions applying a user to the selected rows."""
+    user = forms.ModelChoiceField(queryset=models.User.objects.none())
+
+    def __init__(self, role, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['user'].queryset = models.User.objects.filter(
+            role=role, is_active=True).order_by('email')
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings of the tables growing to millions of rows, and the
+    helpers of their bulk actions. The changelists merge the rows of every
+    shard, the pages of a row are served by its shard and the actions run
+    on each shard in turn. delete_selected is replaced by delete_rows: its
+    confirmation page loads every related row, while QuerySet.delete hides
+    the rows with one UPDATE per model.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def changeform_view(self, request, object_id=None, *args, **kwargs):
+        with sharding.pinned(sharding.shard_of_id(object_id)):
+            return super().changeform_view(request, object_id, *args,
+                                           **kwargs)
+
+    def delete_view(self, request, object_id, *args, **kwargs):
+        with sharding.pinned(sharding.shard_of_id(object_id)):
+            return super().delete_view(request, object_id, *args, **kwargs)
+
+    def history_view(self, request, object_id, *args, **kwargs):
+        with sharding.pinned(sharding.shard_of_id(object_id)):
+            return super().history_view(request, object_id, *args, **kwargs)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def confirm(self, request, title, form, deleting=False):
+        """Return the page confirming the action on the selected rows."""
+        return TemplateResponse(request, 'admin/core/confirm_action.html', {
+            **self.admin_site.each_context(request),
+            'title': title,
+            'opts': self.model._meta,
+            'form': form,
+            'deleting': deleting,
+            'action': request.POST['action'],
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across') == '1',
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            })
+
+    def apply_user(self, request, queryset, role, title, apply):
+        """
+        Ask for a user of role, then call apply(queryset, user) and report
+        the number of rows changed.
+        """
+        form = UserChoiceForm(
+            role, request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            count = sum(apply(rows, form.cleaned_data['user'])
+                        for rows in sharding.spread(queryset))
+            self.message_user(request, _('%(count)d %(name)s changed.') % {
+                'count': count,
+                'name': self.model._meta.verbose_name_plural})
+            return None
+        return self.confirm(request, title, form)
+
+    @admin.action(description=_('Delete the selected %(verbose_name_plural)s'),
+                  permissions=['delete'])
+    def delete_rows(self, request, queryset):
+        if 'apply' not in request.POST:
+            return self.confirm(request, _('Delete'), forms.Form(),
+                                deleting=True)
+        count = sum(rows.delete()[0] for rows in sharding.spread(queryset))
+        self.message_user(request, _('%(count)d rows deleted.') % {
+            'count': count})
+        return None
 
-class CustomerAdmin(admin.ModelAdmin):
+    @admin.action(description=_('Reassign the sales contact'))
+    def reassign_sales_contact(self, request, queryset):
+        return self.apply_user(
+            request, queryset, 'sales', _('Reassign the sales contact'),
+            lambda rows, user: bulk.reassign(rows, 'sales_contact', user))
+
+
+class CompanyAdmin(admin.ModelAdmin):
+    """Define the admin pages for companies."""
+    ordering = ['name']
+    search_fields = ['^name']
+
+
+class CustomerAdmin(LargeTableAdmin):
     """Define the admin pages for customers."""
     ordering = ['id']
     list_display = ['id', 'first_name', 'last_name',
                     'email', 'phone', 'company', 'sales_contact']
-    search_fields = ['first_name', 'last_name', 'email', 'phone',
-                     'company', 'sales_contact__last_name']
+    list_select_related = ['sales_contact', 'organization']
+    search_fields = ['=email', '^last_name', '^organization__name']
+    search_help_text = _('Exact email, or start of the last name or '
+                         'company.')
+    autocomplete_fields = ['sales_contact', 'organization']
+    date_hierarchy = 'last_activity'
+    actions = ['reassign_sales_contact', 'delete_rows']
 
 
-class ContractAdmin(admin.ModelAdmin):
+class ContractAdmin(LargeTableAdmin):
     """Define the admin pages for contracts."""
     ordering = ['id']
     list_display = ['id', 'customer', 'sales_contact', 'date_created',
                     'date_updated', 'signed', 'amount',
                     'payment_due', 'event']
-    search_fields = ['customer__last_name', 'sales_contact__last_name',
-                     'date_created',
-                     'date_updated', 'signed', 'amount',
-                     'payment_due', 'event__customer__last_name']
+    list_select_related = ['customer__organization', 'sales_contact',
+                           'event__customer__organization']
+    search_fields = ['=customer__email', '^customer__last_name',
+                     '^customer__organization__name']
+    search_help_text = _('Exact customer email, or start of the customer '
+                         'last name or company.')
+    autocomplete_fields = ['customer', 'sales_contact']
+    raw_id_fields = ['event']
+    date_hierarchy = 'date_created'
+    actions = ['reassign_sales_contact', 'sign_contracts', 'delete_rows']
+
+    @admin.action(description=_('Sign with a support contact'))
+    def sign_contracts(self, request, queryset):
+        return self.apply_user(request, queryset, 'support',
+                               _('Sign with a support contact'),
+                               bulk.sign_contracts)
+
 
+class EventAdminForm(forms.ModelForm):
+    """Form of an event, with its notes stored apart."""
+    notes = forms.CharField(widget=forms.Textarea, required=False)
 
-class EventAdmin(admin.ModelAdmin):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.fields['notes'].initial = self.instance.notes
+
+    def save(self, commit=True):
+        self.instance.notes = self.cleaned_data['notes']
+        return super().save(commit)
+
+
+class EventAdmin(LargeTableAdmin):
     """Define the admin pages for events."""
+    form = EventAdminForm
     ordering = ['id']
     list_display = ['id', 'customer', 'support_contact', 'event_closed',
-                    'attendees', 'date_created', 'date_updated', 'notes']
-    search_fields = ['customer__last_name', 'support_contact__last_name',
-                     'event_closed',
-                     'attendees', 'date_created', 'date_updated', 'notes']
+                    'attendees', 'date_created', 'date_updated']
+    list_select_related = ['customer__organization', 'support_contact']
+    search_fields = ['=customer__email', '^customer__last_name',
+                     '^customer__organization__name']
+    search_help_text = _('Exact customer email, or start of the customer '
+                         'last name or company.')
+    autocomplete_fields = ['customer', 'support_contact']
+    date_hierarchy = 'event_date'
+    actions = ['reassign_support_contact', 'close_events', 'delete_rows']
+
+    @admin.action(description=_('Reassign the support contact'))
+    def reassign_support_contact(self, request, queryset):
+        return self.apply_user(
+            request, queryset, 'support', _('Reassign the support contact'),
+            lambda rows, user: bulk.reassign(rows, 'support_contact', user))
+
+    @admin.action(description=_('Close'))
+    def close_events(self, request, queryset):
+        count = sum(bulk.close_events(rows)
+                    for rows in sharding.spread(queryset))
+        self.message_user(request, _('%(count)d events closed.') % {
+            'count': count})
+
+
+class SlowQueryInline(admin.TabularInline):
+    """Show the last recorded samples of a fingerprint."""
+    model = models.SlowQuery
+    fields = ['date_created', 'duration', 'view', 'sql']
+    readonly_fields = fields
+    ordering = ['-id']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class SlowQueryFingerprintAdmin(admin.ModelAdmin):
+    """Define the admin pages for the slow query fingerprints."""
+    ordering = ['-total_time']
+    list_display = ['sql', 'calls', 'total_time', 'average_time',
+                    'max_time', 'last_view', 'last_seen']
+    search_fields = ['sql', 'last_view']
+    readonly_fields = ['fingerprint', 'sql', 'calls', 'total_time',
+                       'max_time', 'last_view', 'last_seen', 'plan']
+    inlines = [SlowQueryInline]
+
+    @admin.display(description=_('average time'))
+    def average_time(self, obj):
+        return round(obj.total_time / obj.calls, 2) if obj.calls else 0
+
+    def has_add_permission(self, request):
+        return False
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Define the admin pages for the slow queries."""
+    ordering = ['-id']
+    list_display = ['id', 'date_created', 'duration', 'view', 'sql']
+    search_fields = ['view']
+    readonly_fields = ['fingerprint', 'sql', 'duration', 'view', 'plan',
+                       'date_created']
+
+    def has_add_permission(self, request):
+        return False
 
 
 admin.site.register(models.User, UserAdmin)
+admin.site.register(models.Company, CompanyAdmin)
 admin.site.register(models.Customer, CustomerAdmin)
 admin.site.register(models.Contract, ContractAdmin)
 admin.site.register(models.Event, EventAdmin)
+admin.site.register(models.SlowQueryFingerprint, SlowQueryFingerprintAdmin)
+admin.site.register(models.SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,104 @@
+"""
+Archival of the settled contracts and closed events.
+
+Signed contracts whose payment was due more than ARCHIVE_AFTER_DAYS ago,
+with their closed event, and closed events without a contract are moved to
+ArchivedContract and ArchivedEvent, keeping their ids. Each batch is moved
+with one DELETE ... RETURNING feeding an INSERT per table, in a
+transaction, so the live tables and their indexes only hold the rows the
+sales and support views work on. The rows are moved, not deleted: no
+signal is sent, the pipeline summary and the customer rollups keep
+counting them and their refresh functions read the archive too. The same
+statement records their tombstones, the rows leaving the lists the clients
+synchronize.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import (
+        ArchivedContract,
+        ArchivedEvent,
+        Contract,
+        Event,
+        Tombstone,
+        )
+
+BATCH_SIZE = 1000
+
+
+def archivable_contracts(cutoff):
+    """Return the contracts settled before cutoff."""
+    return Contract.objects.filter(
+        Q(event__isnull=True) |
+        Q(event__event_closed=True, event__date_updated__lt=cutoff),
+        signed=True, payment_due__lt=cutoff.date(), date_updated__lt=cutoff)
+
+
+def archivable_events(cutoff):
+    """Return the events closed before cutoff which have no contract."""
+    return Event.objects.filter(event_closed=True, date_updated__lt=cutoff,
+                                contract__isnull=True)
+
+
+def move(model, archive_model, ids, now):
+    """
+    Move the rows of model with the given ids to archive_model and record
+    their tombstones.
+    """
+    if not ids:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    columns = ', '.join(
+        connection.ops.quote_name(field.column)
+        for field in archive_model._meta.concrete_fields
+        if field.name != 'date_archived')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {model._meta.db_table} '
+            f'WHERE id = ANY(%s) RETURNING {columns}), '
+            f'archived AS (INSERT INTO {archive_model._meta.db_table} '
+            f'({columns}, date_archived) '
+            f'SELECT {columns}, %s FROM moved) '
+            f'INSERT INTO {Tombstone._meta.db_table} '
+            f'(model, object_id, date_deleted) '
+            f'SELECT %s, id, %s FROM moved',
+            [list(ids), now, model._meta.model_name, now])
+        return cursor.rowcount
+
+
+def archive(days=None, batch_size=BATCH_SIZE):
+    """
+    Move the settled contracts and closed events older than days to the
+    archive tables. Return the number of contracts and events moved.
+    """
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    now = timezone.now()
+    cutoff = now - datetime.timedelta(days=days)
+    moved = {'contracts': 0, 'events': 0}
+    while True:
+        with transaction.atomic(using=router.db_for_write(Contract)):
+            batch = list(archivable_contracts(cutoff).select_for_update(
+                skip_locked=True, of=('self',)).order_by().values_list(
+                    'id', 'event_id')[:batch_size])
+            if not batch:
+                break
+            moved['events'] += move(
+                Event, ArchivedEvent,
+                [event_id for _, event_id in batch if event_id], now)
+            moved['contracts'] += move(
+                Contract, ArchivedContract,
+                [contract_id for contract_id, _ in batch], now)
+    while True:
+        with transaction.atomic(using=router.db_for_write(Event)):
+            batch = list(archivable_events(cutoff).select_for_update(
+                skip_locked=True, of=('self',)).order_by().values_list(
+                    'id', flat=True)[:batch_size])
+            if not batch:
+                break
+            moved['events'] += move(Event, ArchivedEvent, batch, now)
+    return moved
@@ -0,0 +1,167 @@
+"""
+Audit trail of the changes of customers, contracts and events.
+
+The signal receivers hand `record` the values a row was loaded with and
+the values it was saved with. Only the changed fields are kept, in a buffer
+of the connection's transaction, and the whole buffer is written with one
+INSERT once the transaction commits; nothing is written if it rolls back.
+The actor is the user of the request being served, read from the request
+stored by AuditMiddleware.
+
+The table is partitioned by month of date_created, `create_partitions`
+adds the partitions of the coming months (run monthly by the
+create_audit_partitions command), rows outside of them land in the default
+partition.
+"""
+import contextvars
+import datetime
+import threading
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from core import log
+from core.models import AuditEntry
+
+IGNORED_FIELDS = frozenset(('date_created', 'date_updated', 'contract_count',
+                            'signed_amount', 'open_event_count',
+                            'last_activity'))
+
+current_request = contextvars.ContextVar('current_request', default=None)
+
+_buffers = threading.local()
+
+
+def current_actor():
+    """Return the id of the authenticated user of the current request."""
+    request = current_request.get()
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def diff(before, after):
+    """Return the {field: [old, new]} of the fields that changed."""
+    changes = {}
+    for field in (after or before).keys():
+        if field in IGNORED_FIELDS:
+            continue
+        if before and after and field not in before:
+            continue
+        old = before.get(field) if before else None
+        new = after.get(field) if after else None
+        if old != new:
+            changes[field] = [old, new]
+    return changes
+
+
+def pending(using):
+    """
+    Return the buffer of the current transaction of a connection, starting
+    a new one when the previous transaction ended without flushing it.
+    """
+    connection = connections[using]
+    buffer = getattr(_buffers, using, None)
+    if buffer is not None and any(
+            hook[1] is buffer['flush'] for hook in connection.run_on_commit):
+        return buffer['entries']
+    entries = []
+
+    def flush():
+        setattr(_buffers, using, None)
+        AuditEntry.objects.using(using).bulk_create(entries)
+
+    setattr(_buffers, using, {'entries': entries, 'flush': flush})
+    transaction.on_commit(flush, using=using)
+    return entries
+
+
+def record(instance, action, before, after):
+    """Buffer the audit entry of a saved or deleted row."""
+    changes = diff(before, after)
+    if not changes:
+        return
+    using = router.db_for_write(AuditEntry, instance=instance)
+    entry = AuditEntry(
+        model=instance._meta.model_name,
+        object_id=instance.pk,
+        action=action,
+        changes=changes,
+        actor_id=current_actor(),
+        request_id=log.request_id.get(),
+        )
+    if connections[using].in_atomic_block:
+        pending(using).append(entry)
+    else:
+        entry.save(using=using)
+
+
+def record_bulk(model, rows, action='update', using=None):
+    """
+    Buffer the audit entries of a set-based change, rows being the
+    (pk, before, after) values of the changed rows.
+    """
+    using = using or router.db_for_write(AuditEntry)
+    actor_id = current_actor()
+    request_id = log.request_id.get()
+    entries = [
+        AuditEntry(model=model._meta.model_name, object_id=pk,
+                   action=action, changes=changes, actor_id=actor_id,
+                   request_id=request_id)
+        for pk, before, after in rows
+        for changes in (diff(before, after),) if changes]
+    if connections[using].in_atomic_block:
+        pending(using).extend(entries)
+    else:
+        AuditEntry.objects.using(using).bulk_create(entries)
+
+
+def month_starts(count, start=None):
+    """Return the first days of count + 1 consecutive months."""
+    months = [(start or timezone.now().date()).replace(day=1)]
+    for _ in range(count):
+        months.append((months[-1] + datetime.timedelta(days=32)).replace(
+            day=1))
+    return months
+
+
+def create_partitions(count=3, using='default'):
+    """
+    Create the missing partitions of the current and next months. Postgres
+    refuses to create the partition of a month whose entries landed in the
+    default partition, when the command did not run in time, so these are
+    moved to the new partition while the default one is detached.
+    """
+    table = AuditEntry._meta.db_table
+    default = f'{table}_default'
+    months = month_starts(count)
+    names = []
+    with transaction.atomic(using=using), \
+            connections[using].cursor() as cursor:
+        for start, end in zip(months, months[1:]):
+            name = f'{table}_{start:%Y%m}'
+            names.append(name)
+            cursor.execute('SELECT to_regclass(%s)', [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            bounds = [f'{start} 00:00+00', f'{end} 00:00+00']
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM {default} '
+                f'WHERE date_created >= %s AND date_created < %s)', bounds)
+            stranded = cursor.fetchone()[0]
+            if stranded:
+                cursor.execute(
+                    f'ALTER TABLE {table} DETACH PARTITION {default}')
+            cursor.execute(
+                f'CREATE TABLE {name} PARTITION OF {table} '
+                f"FOR VALUES FROM ('{bounds[0]}') TO ('{bounds[1]}')")
+            if stranded:
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM {default} '
+                    f'WHERE date_created >= %s AND date_created < %s '
+                    f'RETURNING *) INSERT INTO {name} SELECT * FROM moved',
+                    bounds)
+                cursor.execute(
+                    f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+    return names
@@ -0,0 +1,274 @@
+"""
+Set-based changes of many customers, contracts or events at once.
+
+Each function updates the selected rows with one UPDATE per chunk of ids,
+all in one transaction, instead of saving them one by one. As UPDATE sends
+no signal, the functions bring the derived tables, the audit trail and the
+notifications up to date themselves: pipeline summary keys and customer
+rollups are refreshed for the touched rows only, and date_updated is set
+so that the rows show up in the incremental sync.
+"""
+from django.db import router, transaction
+from django.db.models import Count
+from django.db.models.functions import Now
+
+from core import (
+        audit,
+        identity,
+        notifications,
+        pipeline,
+        policies,
+        rollups,
+        sharding,
+        )
+from core.models import Contract, Customer, Event
+
+CHUNK_SIZE = 1000
+
+
+def chunks(ids, size=CHUNK_SIZE):
+    """Yield the ids by lists of size."""
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def update(model, ids, chunk_size=CHUNK_SIZE, progress=None, **values):
+    """
+    Update the rows of model with the given ids, chunk by chunk, calling
+    progress(model, done, total) after each chunk.
+    """
+    identity.discard(model, ids)
+    count = 0
+    for chunk in chunks(ids, chunk_size):
+        count += model._base_manager.filter(pk__in=chunk).update(
+            date_updated=Now(), **values)
+        if progress is not None:
+            progress(model, count, len(ids))
+    return count
+
+
+def reassign(queryset, field, user, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Set field (sales_contact or support_contact) of the selected rows to
+    user. Return the number of rows changed.
+    """
+    model = queryset.model
+    attname = f'{field}_id'
+    using = queryset.db
+    with transaction.atomic(using=using), sharding.pinned(using):
+        fields = ['id', attname] + (['customer_id'] if model is Event
+                                    else [])
+        rows = list(queryset.exclude(**{attname: user.pk}).values(
+            *fields).order_by('id'))
+        ids = [row['id'] for row in rows]
+        if model is Contract:
+            keys = pipeline.keys_of(Contract.objects.filter(pk__in=ids))
+        count = update(model, ids, chunk_size, progress,
+                       **{attname: user.pk})
+        if model is Contract:
+            pipeline.refresh(keys | pipeline.keys_of(
+                Contract.objects.filter(pk__in=ids)))
+        audit.record_bulk(model, (
+            (row['id'], {attname: row[attname]}, {attname: user.pk})
+            for row in rows))
+        if model is Event:
+            for row in rows:
+                notifications.notify(user.pk, 'event.assigned',
+                                     using=using, event=row['id'],
+                                     customer=row['customer_id'])
+    return count
+
+
+def close_events(queryset, chunk_size=CHUNK_SIZE):
+    """Close the selected open events. Return the number closed."""
+    using = queryset.db
+    with transaction.atomic(using=using), sharding.pinned(using):
+        rows = list(queryset.filter(event_closed=False).values(
+            'id', 'customer_id', 'support_contact_id').order_by('id'))
+        count = update(Event, [row['id'] for row in rows], chunk_size,
+                       event_closed=True)
+        rollups.refresh(Customer.objects.filter(
+            pk__in={row['customer_id'] for row in rows}))
+        audit.record_bulk(Event, (
+            (row['id'], {'event_closed': False}, {'event_closed': True})
+            for row in rows))
+        for row in rows:
+            notifications.notify(row['support_contact_id'], 'event.closed',
+                                 using=using, event=row['id'],
+                                 customer=row['customer_id'])
+    return count
+
+
+def sign_contracts(queryset, support_contact, chunk_size=CHUNK_SIZE):
+    """
+    Sign the selected unsigned contracts, creating the event of each one
+    with support_contact, as signing through the API does. Contracts
+    without a customer cannot have an event and are left unsigned. Return
+    the number of contracts signed. Raise ValueError when support_contact
+    is not an active support user.
+    """
+    if support_contact.role != 'support' or not support_contact.is_active:
+        raise ValueError('The support contact must be an active support '
+                         'user')
+    using = queryset.db
+    with transaction.atomic(using=using), sharding.pinned(using):
+        contracts = list(queryset.filter(
+            signed=False, customer__isnull=False).select_for_update(
+                of=('self',)).only('id', 'customer_id', 'event_id',
+                                   'sales_contact_id', 'date_created',
+                                   'amount', 'signed').order_by('id'))
+        keys = pipeline.keys_of(Contract.objects.filter(
+            pk__in=[contract.pk for contract in contracts]))
+        new_events = [contract for contract in contracts
+                      if contract.event_id is None]
+        events = Event.objects.bulk_create(
+            Event(customer_id=contract.customer_id,
+                  support_contact=support_contact)
+            for contract in new_events)
+        audit.record_bulk(Event, (
+            (event.pk, None, {'customer_id': event.customer_id,
+                              'support_contact_id': support_contact.pk})
+            for event in events), action='create')
+        previous_events = {contract.pk: contract.event_id
+                           for contract in contracts}
+        for contract, event in zip(new_events, events):
+            contract.event_id = event.pk
+        now = Now()
+        for contract in contracts:
+            contract.signed = True
+            contract.date_updated = now
+        Contract.objects.bulk_update(
+            contracts, ['signed', 'event', 'date_updated'],
+            batch_size=chunk_size)
+        ids = [contract.pk for contract in contracts]
+        pipeline.refresh(keys | pipeline.keys_of(
+            Contract.objects.filter(pk__in=ids)))
+        rollups.refresh(Customer.objects.filter(
+            pk__in={contract.customer_id for contract in contracts}))
+        audit.record_bulk(Contract, (
+            (contract.pk,
+             {'signed': False, 'event_id': previous_events[contract.pk]},
+             {'signed': True, 'event_id': contract.event_id})
+            for contract in contracts))
+        for contract, event in zip(new_events, events):
+            notifications.notify(support_contact.pk, 'contract.signed',
+                                 using=using, contract=contract.pk,
+                                 event=event.pk,
+                                 customer=contract.customer_id)
+    return len(contracts)
+
+
+def portfolio(user, customers=None):
+    """
+    Return the querysets of the rows a sales or support user may change,
+    by field of the owner: their customers and contracts, or their open
+    events. customers restricts them to the rows of those customer ids.
+    """
+    if user.role == 'sales':
+        querysets = {policies.CUSTOMER.owner: [
+            Customer.objects.filter(policies.CUSTOMER.write_filter(user)),
+            Contract.objects.filter(policies.CONTRACT.write_filter(user))]}
+    elif user.role == 'support':
+        querysets = {policies.EVENT.owner: [
+            Event.objects.filter(policies.EVENT.write_filter(user),
+                                 event_closed=False)]}
+    else:
+        querysets = {}
+    if customers is not None:
+        querysets = {field: [
+            queryset.filter(**{
+                'pk__in' if queryset.model is Customer else 'customer_id__in':
+                customers}) for queryset in models]
+            for field, models in querysets.items()}
+    return querysets
+
+
+def portfolio_size(user):
+    """Return the number of rows of the portfolio of user on every shard."""
+    size = 0
+    for _ in sharding.each():
+        for querysets in portfolio(user).values():
+            size += sum(queryset.count() for queryset in querysets)
+    return size
+
+
+def owner_field(user):
+    """Return the field owning the portfolio of a sales or support user."""
+    return (policies.CUSTOMER.owner if user.role == 'sales' else
+            policies.EVENT.owner)
+
+
+def owned_counts(field, targets):
+    """Return the number of rows each target already owns through field."""
+    counts = {target.pk: 0 for target in targets}
+    models = (Customer, Contract) if field == 'sales_contact' else (Event,)
+    for model in models:
+        rows = model.objects.filter(**{f'{field}__in': targets})
+        if model is Event:
+            rows = rows.filter(event_closed=False)
+        for row in rows.values(f'{field}_id').annotate(
+                count=Count('id')).order_by():
+            counts[row[f'{field}_id']] += row['count']
+    return counts
+
+
+def split(groups, targets, field, balance=False, loads=None):
+    """
+    Return the customer ids handed to each target, given the number of
+    rows of each customer (None for the contracts without one). Customers
+    are dealt in turn to the targets, or, when balancing, largest first to
+    the target owning the fewest rows. loads, the rows each target owns on
+    every shard, is updated with the rows handed out; without it the loads
+    are counted on the current database.
+    """
+    shares = {target.pk: [] for target in targets}
+    customer_ids = sorted(groups, key=lambda pk: (pk is None, pk or 0))
+    if balance:
+        if loads is None:
+            loads = owned_counts(field, targets)
+        for customer_id in sorted(customer_ids,
+                                  key=lambda pk: -groups[pk]):
+            target_id = min(loads, key=lambda pk: (loads[pk], pk))
+            shares[target_id].append(customer_id)
+            loads[target_id] += groups[customer_id]
+    else:
+        for index, customer_id in enumerate(customer_ids):
+            shares[targets[index % len(targets)].pk].append(customer_id)
+    return shares
+
+
+def transfer(user, targets, customers=None, balance=False,
+             chunk_size=CHUNK_SIZE, progress=None, loads=None):
+    """
+    Move the portfolio of a sales or support user to the targets, in one
+    transaction. The rows of one customer all go to the same target.
+    loads is passed to split when balancing the shards one by one.
+    Return the number of rows moved by model and by target.
+    """
+    moved = {'customers': 0, 'contracts': 0, 'events': 0}
+    by_target = {target.pk: 0 for target in targets}
+    targets_by_id = {target.pk: target for target in targets}
+    with transaction.atomic(using=router.db_for_write(Customer)):
+        for field, querysets in portfolio(user, customers).items():
+            rows = {}
+            for queryset in querysets:
+                key = 'pk' if queryset.model is Customer else 'customer_id'
+                for pk, customer_id in queryset.values_list('pk', key):
+                    rows.setdefault(customer_id, []).append(
+                        (queryset.model, pk))
+            shares = split({customer_id: len(group)
+                            for customer_id, group in rows.items()},
+                           targets, field, balance, loads)
+            for target_id, customer_ids in shares.items():
+                for queryset in querysets:
+                    ids = [pk for customer_id in customer_ids
+                           for model, pk in rows[customer_id]
+                           if model is queryset.model]
+                    if not ids:
+                        continue
+                    count = reassign(
+                        queryset.model.objects.filter(pk__in=ids), field,
+                        targets_by_id[target_id], chunk_size, progress)
+                    moved[queryset.model._meta.verbose_name_plural] += count
+                    by_target[target_id] += count
+    return {**moved, 'targets': by_target}
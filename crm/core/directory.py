@@ -0,0 +1,83 @@
+"""
+Staff directory served to the sales and support contact pickers, listing
+the sales and support users only.
+
+The users change rarely and the directory is read on every sign dialog, so
+each process keeps the whole list in memory with its ETag. Saving or
+deleting a user clears the list of the process doing it; the other
+processes reload theirs after USER_DIRECTORY_TTL seconds at most.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+
+from core import metrics
+from core.models import User
+
+FIELDS = ('id', 'email', 'first_name', 'last_name', 'role', 'is_active')
+ROLES = ('sales', 'support')
+
+_lock = threading.Lock()
+# (users, version, expires), rebound whole so that a reader taking it once
+# never sees a directory half cleared or half reloaded.
+_directory = None
+
+
+def load():
+    """Return the users of the directory, ordered by name."""
+    return list(User.objects.filter(role__in=ROLES).order_by(
+        'last_name', 'first_name', 'email').values(*FIELDS))
+
+
+def get_directory():
+    """Return the memoized directory of the process."""
+    global _directory
+    directory = _directory
+    if directory is not None and directory[2] > time.monotonic():
+        metrics.cache_hit('user_directory')
+        return directory
+    with _lock:
+        directory = _directory
+        if directory is None or directory[2] <= time.monotonic():
+            metrics.cache_miss('user_directory')
+            users = load()
+            for user in users:
+                user['search'] = [(user[field] or '').lower() for field in
+                                  ('email', 'first_name', 'last_name')]
+            directory = _directory = (
+                    tuple(users),
+                    hashlib.sha1(json.dumps(
+                        users, sort_keys=True).encode()).hexdigest(),
+                    time.monotonic() + settings.USER_DIRECTORY_TTL)
+    return directory
+
+
+def clear():
+    """Forget the memoized directory."""
+    global _directory
+    with _lock:
+        _directory = None
+
+
+def search(role=None, active=True, prefix=None):
+    """
+    Return the ETag and the users of the directory having role and active
+    state (any when None) whose email or names start with prefix.
+    """
+    users, version, _expires = get_directory()
+    if role is not None:
+        users = [user for user in users if user['role'] == role]
+    if active is not None:
+        users = [user for user in users if user['is_active'] == active]
+    if prefix:
+        prefix = prefix.lower()
+        users = [user for user in users
+                 if any(value.startswith(prefix) for value in user['search'])]
+    etag = '"{}"'.format(hashlib.sha1(
+        f'{version}:{role}:{active}:{prefix}'.encode(),
+        ).hexdigest())
+    return etag, [{field: user[field] for field in FIELDS}
+                  for user in users]
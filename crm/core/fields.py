@@ -0,0 +1,24 @@
+"""
+Custom model fields.
+"""
+from django.db import models
+
+
+class EnumField(models.CharField):
+    """
+    CharField stored as a Postgres enumerated type, 4 bytes per row instead
+    of the text of the value. The type is created by a migration before the
+    field is added, with the values of the choices.
+    """
+
+    def __init__(self, *args, enum_type, **kwargs):
+        self.enum_type = enum_type
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['enum_type'] = self.enum_type
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        return self.enum_type
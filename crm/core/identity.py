@@ -0,0 +1,103 @@
+"""
+Identity map of the rows looked up while serving a request.
+
+IdentityMapMiddleware gives every request a map, and the views and
+serializers look the customers, contracts, events and users up with `get`,
+so each (model, pk) is loaded at most once per request (the ids are unique
+across the shards). The authenticated user is taken from the request and
+the rows fetched by a view's get_object are added to the map. Saving a row
+replaces its entry, deleting it or changing it with core.bulk removes the
+entry. Outside of a request, `get` simply queries the database.
+
+With IDENTITY_MAP_DEBUG, the lookups the map saved are counted in the
+X-Identity-Map-Hits header of the response and listed in the
+X-Identity-Map-Redundant header.
+"""
+import collections
+import contextvars
+
+current_map = contextvars.ContextVar('identity_map', default=None)
+
+
+def key(model, pk):
+    """Return the key of the row of model with primary key pk."""
+    return (model._meta.label_lower, str(pk))
+
+
+class IdentityMap:
+    """The rows loaded while serving a request, by (model, pk)."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.rows = {}
+        self.hits = collections.Counter()
+
+    def get(self, model, pk):
+        """Return the row of model with primary key pk, loaded once."""
+        row_key = key(model, pk)
+        if row_key in self.rows:
+            self.hits[row_key] += 1
+            return self.rows[row_key]
+        user = getattr(self.request, 'user', None)
+        if (isinstance(user, model) and user.is_authenticated and
+                str(user.pk) == row_key[1]):
+            self.hits[row_key] += 1
+            self.rows[row_key] = user
+            return user
+        instance = model._default_manager.get(pk=pk)
+        self.rows[row_key] = instance
+        return instance
+
+    def add(self, instance):
+        """Remember a row loaded otherwise."""
+        self.rows[key(type(instance), instance.pk)] = instance
+
+    def refresh(self, instance):
+        """Replace the entry of a saved row."""
+        row_key = key(type(instance), instance.pk)
+        if row_key in self.rows:
+            self.rows[row_key] = instance
+
+    def discard(self, model, pks):
+        """Remove the entries of the rows of model with the given pks."""
+        for pk in pks:
+            self.rows.pop(key(model, pk), None)
+
+    def redundant(self):
+        """Return the description of the lookups saved."""
+        return ', '.join(
+            f'{label}/{pk}*{count}' if count > 1 else f'{label}/{pk}'
+            for (label, pk), count in self.hits.items())
+
+
+def get(model, pk):
+    """
+    Return the row of model with primary key pk, from the map of the
+    current request if any. Raise model.DoesNotExist if there is none.
+    """
+    identity_map = current_map.get()
+    if identity_map is None:
+        return model._default_manager.get(pk=pk)
+    return identity_map.get(model, pk)
+
+
+def add(instance):
+    """Add a row to the map of the current request and return it."""
+    identity_map = current_map.get()
+    if identity_map is not None:
+        identity_map.add(instance)
+    return instance
+
+
+def refresh(instance):
+    """Replace the entry of a saved row in the map of the request."""
+    identity_map = current_map.get()
+    if identity_map is not None:
+        identity_map.refresh(instance)
+
+
+def discard(model, pks):
+    """Remove rows from the map of the current request."""
+    identity_map = current_map.get()
+    if identity_map is not None:
+        identity_map.discard(model, pks)
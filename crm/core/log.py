@@ -0,0 +1,195 @@
+"""
+Logging pipeline of the CRM.
+
+Records are filtered and tagged with the current request id in the thread
+which logs them, then put on a bounded queue. A background QueueListener
+formats them as JSON and writes them to the console and to a file rotated
+both by size and by time, so request threads never wait for disk I/O. Each
+worker process writes and rotates its own file, named after its pid.
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+
+request_id = contextvars.ContextVar('request_id', default='-')
+
+
+class RequestIDFilter(logging.Filter):
+    """Tag the records with the id of the request being handled."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DeduplicateFilter(logging.Filter):
+    """
+    Let at most `burst` identical messages through per `interval` seconds.
+
+    The first record logged once the interval is over reports how many
+    copies were dropped in its `suppressed` attribute.
+    """
+
+    def __init__(self, interval=60, burst=5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.windows = {}
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            start, count, suppressed = self.windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count >= self.burst:
+                self.windows[key] = (start, count, suppressed + 1)
+                return False
+            self.windows[key] = (start, count + 1, 0)
+            if len(self.windows) > 10000:
+                self.windows.clear()
+        record.suppressed = suppressed
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Format the records as one JSON object per line."""
+
+    def format(self, record):
+        data = {
+                'time': datetime.datetime.fromtimestamp(
+                    record.created, datetime.timezone.utc).isoformat(),
+                'level': record.levelname,
+                'logger': record.name,
+                'module': record.module,
+                'process': record.process,
+                'thread': record.thread,
+                'request_id': getattr(record, 'request_id', '-'),
+                'message': record.getMessage(),
+                }
+        if getattr(record, 'suppressed', 0):
+            data['suppressed'] = record.suppressed
+        if getattr(record, 'dropped', 0):
+            data['dropped'] = record.dropped
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Rotate the file at a given time or once it reaches `max_bytes`. The
+    pid of the process is added to the file name, so that no two processes
+    rotate the same file.
+    """
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        self.max_bytes = max_bytes
+        self.filename = filename
+        super().__init__(self.process_filename(), **kwargs)
+
+    def process_filename(self):
+        """Return the name of the file of the current process."""
+        root, ext = os.path.splitext(self.filename)
+        return f'{root}.{os.getpid()}{ext}'
+
+    def reopen(self):
+        """Write to the file of the current process from now on."""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self.baseFilename = os.path.abspath(self.process_filename())
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+
+class AsyncHandler(logging.handlers.QueueHandler):
+    """
+    Hand the records over to a background thread writing them as JSON.
+
+    When the queue is full the record is dropped rather than blocking the
+    request, and the number of dropped records is reported with the next
+    record written.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 when='midnight', console=True, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        os.makedirs(os.path.dirname(os.path.abspath(filename)),
+                    exist_ok=True)
+        formatter = JSONFormatter()
+        handlers = [SizedTimedRotatingFileHandler(
+            filename, max_bytes=max_bytes, when=when,
+            backupCount=backup_count, delay=True)]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        """
+        Restart the listener in a child process, the thread of the parent
+        not being copied, writing to the file of the child.
+        """
+        if self.listener is None:
+            return
+        self.queue = self.listener.queue = queue.Queue(self.queue.maxsize)
+        self.listener._thread = None
+        for handler in self.listener.handlers:
+            if isinstance(handler, SizedTimedRotatingFileHandler):
+                handler.reopen()
+        self.dropped = 0
+        self.listener.start()
+
+    def prepare(self, record):
+        """Render the message and the traceback before crossing threads."""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        with self.lock:
+            if self.dropped:
+                record.dropped, self.dropped = self.dropped, 0
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
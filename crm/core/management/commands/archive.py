@@ -0,0 +1,29 @@
+"""
+Move the settled contracts and closed events to the archive tables.
+"""
+from django.core.management.base import BaseCommand
+
+from core import archive, sharding
+
+
+class Command(BaseCommand):
+    help = ("Move the signed contracts due and the events closed for more "
+            "than ARCHIVE_AFTER_DAYS to the archive tables.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Age in days, ARCHIVE_AFTER_DAYS by '
+                                 'default.')
+        parser.add_argument('--batch-size', type=int,
+                            default=archive.BATCH_SIZE,
+                            help='Number of contracts moved per '
+                                 'transaction.')
+
+    def handle(self, *args, **options):
+        moved = {'contracts': 0, 'events': 0}
+        for _ in sharding.each():
+            for key, count in archive.archive(options['days'],
+                                              options['batch_size']).items():
+                moved[key] += count
+        self.stdout.write('{contracts} contracts and {events} events '
+                          'archived.'.format(**moved))
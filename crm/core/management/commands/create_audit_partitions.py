@@ -0,0 +1,20 @@
+"""
+Create the audit trail partitions of the coming months.
+"""
+from django.core.management.base import BaseCommand
+
+from core import audit, sharding
+
+
+class Command(BaseCommand):
+    help = ("Create the monthly partitions of the audit trail for the "
+            "current and next months. Run it monthly.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3,
+                            help='Number of months to create.')
+
+    def handle(self, *args, **options):
+        for alias in sharding.aliases():
+            for name in audit.create_partitions(options['months'], alias):
+                self.stdout.write(f'{name} ready.')
@@ -0,0 +1,15 @@
+"""
+Export the analytics snapshot.
+"""
+from django.core.management.base import BaseCommand
+
+from core import snapshots
+
+
+class Command(BaseCommand):
+    help = ("Export the contracts and events into a new columnar snapshot "
+            "read by /reports/analytics/. Meant to run nightly.")
+
+    def handle(self, *args, **options):
+        path = snapshots.export()
+        self.stdout.write(f'Snapshot written to {path}.')
@@ -0,0 +1,20 @@
+"""
+Generate the OpenAPI schema served by /schema/.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    help = ("Generate the OpenAPI schema once, at deploy time, into "
+            "OPENAPI_SCHEMA_DIR.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_DIR,
+                            help='Directory to write the schema to.')
+
+    def handle(self, *args, **options):
+        for path in schema.write(options['output']):
+            self.stdout.write(f'Schema written to {path}.')
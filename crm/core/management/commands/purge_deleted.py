@@ -0,0 +1,24 @@
+"""
+Remove the customers, contracts and events deleted for long enough.
+"""
+from django.core.management.base import BaseCommand
+
+from core import sharding, softdelete
+
+
+class Command(BaseCommand):
+    help = ("Remove for good the customers, contracts and events deleted "
+            "more than SOFT_DELETE_RETENTION_DAYS ago.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Age in days, SOFT_DELETE_RETENTION_DAYS '
+                                 'by default.')
+        parser.add_argument('--batch-size', type=int,
+                            default=softdelete.BATCH_SIZE,
+                            help='Number of rows removed per transaction.')
+
+    def handle(self, *args, **options):
+        count = sum(softdelete.purge(options['days'], options['batch_size'])
+                    for _ in sharding.each())
+        self.stdout.write(f'{count} deleted rows purged.')
@@ -0,0 +1,23 @@
+"""
+Delete the tombstones older than the sync retention.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import sharding
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = ("Delete the records of deleted rows older than "
+            "TOMBSTONE_RETENTION_DAYS.")
+
+    def handle(self, *args, **options):
+        limit = timezone.now() - datetime.timedelta(
+            days=settings.TOMBSTONE_RETENTION_DAYS)
+        count = sum(Tombstone.objects.filter(
+            date_deleted__lt=limit).delete()[0] for _ in sharding.each())
+        self.stdout.write(f'{count} tombstones purged.')
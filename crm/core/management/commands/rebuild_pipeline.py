@@ -0,0 +1,18 @@
+"""
+Rebuild the sales pipeline summary.
+"""
+from django.core.management.base import BaseCommand
+
+from core import pipeline, sharding
+from core.models import PipelineSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute the whole sales pipeline summary from the contracts."
+
+    def handle(self, *args, **options):
+        count = 0
+        for _ in sharding.each():
+            pipeline.refresh()
+            count += PipelineSummary.objects.count()
+        self.stdout.write(f'{count} pipeline rows rebuilt.')
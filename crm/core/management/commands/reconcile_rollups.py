@@ -0,0 +1,15 @@
+"""
+Reconcile the per-customer rollups.
+"""
+from django.core.management.base import BaseCommand
+
+from core import rollups, sharding
+
+
+class Command(BaseCommand):
+    help = ("Recompute the contract count, signed amount, open event count "
+            "and last activity of every customer.")
+
+    def handle(self, *args, **options):
+        count = sum(rollups.refresh() for _ in sharding.each())
+        self.stdout.write(f'{count} customer rollups reconciled.')
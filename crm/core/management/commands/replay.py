@@ -0,0 +1,74 @@
+"""
+Replay captured traffic against running instances.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import traffic
+
+
+class Command(BaseCommand):
+    help = ("Replay the requests recorded by TrafficRecorderMiddleware and "
+            "report their latency distribution and error rate. With "
+            "--baseline, the capture is replayed against both instances "
+            "and their results are compared.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('captures', nargs='+',
+                            help='Capture files to replay.')
+        parser.add_argument('--target', default='http://localhost:8000',
+                            help='Base URL of the instance under test.')
+        parser.add_argument('--baseline',
+                            help='Base URL of the instance to compare to.')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Replay speed factor, 0 for as fast as '
+                                 'possible.')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--token',
+                            help='Access token sent with every request.')
+        parser.add_argument('--report',
+                            help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0 or options['concurrency'] < 1:
+            raise CommandError('Speed must be >= 0 and concurrency >= 1.')
+        entries = traffic.load(options['captures'])
+        self.stdout.write(f'Replaying {len(entries)} requests.')
+        report = {}
+        results = {}
+        targets = [('target', options['target'])]
+        if options['baseline']:
+            targets.insert(0, ('baseline', options['baseline']))
+        for name, url in targets:
+            results[name] = traffic.replay(
+                    entries, url, speed=options['speed'],
+                    concurrency=options['concurrency'],
+                    token=options['token'])
+            report[name] = traffic.summarize(results[name])
+            self.write_summary(name, url, report[name])
+        if options['baseline']:
+            report['status_changes'] = traffic.compare(
+                    entries, results['baseline'], results['target'])
+            self.write_comparison(report)
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+
+    def write_summary(self, name, url, summary):
+        self.stdout.write(
+            '{} ({}): {} requests, error rate {:.2%}, p50 {:.1f} ms, '
+            'p90 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms'.format(
+                name, url, summary['requests'], summary['error_rate'],
+                summary['p50'], summary['p90'], summary['p99'],
+                summary['max']))
+
+    def write_comparison(self, report):
+        baseline, target = report['baseline'], report['target']
+        for key in ('p50', 'p90', 'p99'):
+            self.stdout.write('{}: {:+.1f} ms'.format(
+                key, target[key] - baseline[key]))
+        self.stdout.write('error rate: {:+.2%}'.format(
+            target['error_rate'] - baseline['error_rate']))
+        self.stdout.write('{} requests changed status'.format(
+            len(report['status_changes'])))
@@ -0,0 +1,21 @@
+"""
+Copy the users to the shards.
+"""
+from django.core.management.base import BaseCommand
+
+from core import sharding
+from core.models import User
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ("Copy every user of the default database to the shards, once "
+            "a shard is added. Saved users are replicated as they change.")
+
+    def handle(self, *args, **options):
+        users = User.objects.using('default').order_by('id')
+        for start in range(0, users.count(), BATCH_SIZE):
+            sharding.replicate(users[start:start + BATCH_SIZE])
+        self.stdout.write(f'{users.count()} users replicated to '
+                          f'{len(sharding.aliases()) - 1} shards.')
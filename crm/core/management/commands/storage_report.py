@@ -0,0 +1,43 @@
+"""
+Report the size of the tables of the core app and of their indexes.
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.defaultfilters import filesizeformat
+
+
+class Command(BaseCommand):
+    help = ("Print the estimated rows, table size, index size and bytes per "
+            "row of each core table, e.g. before and after a migration.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help='Refresh the row estimates first.')
+
+    def handle(self, *args, **options):
+        tables = sorted({model._meta.db_table for model in
+                         apps.get_app_config('core').get_models()})
+        query = ('SELECT relname, GREATEST(reltuples, 0)::bigint, '
+                 'pg_table_size(oid), pg_indexes_size(oid) FROM pg_class '
+                 "WHERE relname = ANY(%s) AND relkind IN ('r', 'p') "
+                 'ORDER BY relname')
+        with connection.cursor() as cursor:
+            cursor.execute(query, [tables])
+            rows = cursor.fetchall()
+            if options['analyze']:
+                for name, *_ in rows:
+                    cursor.execute(
+                        f'ANALYZE {connection.ops.quote_name(name)}')
+                cursor.execute(query, [tables])
+                rows = cursor.fetchall()
+        self.stdout.write(f'{"table":<32}{"rows":>12}{"table":>12}'
+                          f'{"indexes":>12}{"per row":>10}')
+        total = 0
+        for name, count, table_size, index_size in rows:
+            per_row = f'{table_size // count} B' if count else '-'
+            self.stdout.write(
+                f'{name:<32}{count:>12}{filesizeformat(table_size):>12}'
+                f'{filesizeformat(index_size):>12}{per_row:>10}')
+            total += table_size + index_size
+        self.stdout.write(f'Total: {filesizeformat(total)}')
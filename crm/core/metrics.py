@@ -0,0 +1,195 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Each worker process keeps its own counters and histograms in memory and
+periodically dumps them to a file named after its pid in
+``settings.METRICS_DIR``. The ``/metrics/`` view merges every file found in
+that directory, so a scrape reports the totals of all the workers sharing
+the directory.
+"""
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+OFFSET_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+HELP = {
+    'crm_http_requests_total': (
+        'counter', 'Requests served, by view, action and status code.'),
+    'crm_http_request_duration_seconds': (
+        'histogram', 'Request latency, by view and action.'),
+    'crm_db_queries_per_request': (
+        'histogram', 'Database queries issued per request.'),
+    'crm_db_query_seconds_per_request': (
+        'histogram', 'Time spent in the database per request.'),
+    'crm_pagination_offset': (
+        'histogram', 'Offset requested on paginated list endpoints.'),
+    'crm_cache_requests_total': (
+        'counter', 'Cache lookups, by cache name and result.'),
+}
+
+
+class Registry:
+    """Counters and histograms of the current process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        """Increment a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        """Record a value in a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = {
+                        'buckets': list(buckets),
+                        'counts': [0] * len(buckets),
+                        'sum': 0,
+                        'count': 0,
+                        }
+                self.histograms[key] = histogram
+            for index, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        """Return a JSON serializable copy of the metrics."""
+        with self.lock:
+            return {
+                    'counters': [[name, labels, value] for (name, labels),
+                                 value in self.counters.items()],
+                    'histograms': [[name, labels, dict(histogram)]
+                                   for (name, labels), histogram
+                                   in self.histograms.items()],
+                    }
+
+    def flush(self, force=False):
+        """Dump the metrics to this process' file in METRICS_DIR."""
+        now = time.monotonic()
+        if (not force and
+                now - self.last_flush < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.last_flush = now
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as tmp_file:
+            json.dump(self.snapshot(), tmp_file)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter of the current process."""
+    registry.inc(name, labels, value)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Record a value in a histogram of the current process."""
+    registry.observe(name, labels, value, buckets)
+
+
+def cache_hit(cache):
+    """Count a hit on the named cache."""
+    registry.inc('crm_cache_requests_total', {'cache': cache, 'result': 'hit'})
+
+
+def cache_miss(cache):
+    """Count a miss on the named cache."""
+    registry.inc('crm_cache_requests_total',
+                 {'cache': cache, 'result': 'miss'})
+
+
+def collect():
+    """Merge the metrics dumped by every process."""
+    registry.flush(force=True)
+    counters = {}
+    histograms = {}
+    directory = settings.METRICS_DIR
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as metrics_file:
+                data = json.load(metrics_file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, histogram in data['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, {
+                'buckets': histogram['buckets'],
+                'counts': [0] * len(histogram['buckets']),
+                'sum': 0,
+                'count': 0,
+                })
+            for index, count in enumerate(histogram['counts']):
+                merged['counts'][index] += count
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+        )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    counters, histograms = collect()
+    lines = []
+    names = sorted({name for name, _ in counters} |
+                   {name for name, _ in histograms})
+    for name in names:
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(histogram['buckets'],
+                                    histogram['counts']):
+                lines.append('{}_bucket{} {}'.format(
+                    name, _format_labels(labels, [('le', bound)]), count))
+            lines.append('{}_bucket{} {}'.format(
+                name, _format_labels(labels, [('le', '+Inf')]),
+                histogram['count']))
+            lines.append(
+                f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+            lines.append(
+                f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
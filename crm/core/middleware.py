@@ -0,0 +1,190 @@
+"""
+Middlewares of the CRM.
+"""
+import atexit
+import contextlib
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import audit, identity, log, metrics, sharding, traffic
+from core.slow_queries import SlowQueryRecorder
+
+
+def view_labels(view_func, method):
+    """Return the (viewset, action) names describing a resolved view."""
+    view_class = (getattr(view_func, 'cls', None) or
+                  getattr(view_func, 'view_class', None))
+    if view_class is None:
+        return view_func.__name__, ''
+    actions = getattr(view_func, 'actions', None) or {}
+    return view_class.__name__, actions.get(method.lower(), '')
+
+
+def execute_wrapper(wrapper):
+    """Return the context installing wrapper on every shard's connection."""
+    stack = contextlib.ExitStack()
+    for alias in sharding.aliases():
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+    return stack
+
+
+class RequestIDMiddleware:
+    """
+    Give every request an id, reused from the X-Request-ID header when the
+    client sends a sane one, so that its log records can be correlated.
+    """
+    valid_id = re.compile(r'^[\w.-]{1,64}$')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not self.valid_id.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        token = log.request_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            log.request_id.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class AuditMiddleware:
+    """Make the request available to the audit trail to find the actor."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = audit.current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            audit.current_request.reset(token)
+
+
+class IdentityMapMiddleware:
+    """
+    Give the request its identity map, see core.identity, and report the
+    lookups it saved when IDENTITY_MAP_DEBUG is set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        identity_map = identity.IdentityMap(request)
+        token = identity.current_map.set(identity_map)
+        try:
+            response = self.get_response(request)
+        finally:
+            identity.current_map.reset(token)
+        if settings.IDENTITY_MAP_DEBUG:
+            response['X-Identity-Map-Hits'] = sum(
+                identity_map.hits.values())
+            response['X-Identity-Map-Redundant'] = identity_map.redundant()
+        return response
+
+
+class MetricsMiddleware:
+    """Record request, database and pagination metrics for every request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        atexit.register(metrics.registry.flush, True)
+
+    def __call__(self, request):
+        request.metrics_labels = ('unresolved', '')
+        queries = {'count': 0, 'duration': 0.0}
+
+        def count_queries(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries['count'] += 1
+                queries['duration'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with execute_wrapper(count_queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        viewset, action = request.metrics_labels
+        metrics.inc('crm_http_requests_total', viewset=viewset,
+                    action=action, method=request.method,
+                    status=response.status_code)
+        metrics.observe('crm_http_request_duration_seconds', duration,
+                        viewset=viewset, action=action)
+        metrics.observe('crm_db_queries_per_request', queries['count'],
+                        buckets=metrics.QUERY_COUNT_BUCKETS,
+                        viewset=viewset, action=action)
+        metrics.observe('crm_db_query_seconds_per_request',
+                        queries['duration'], viewset=viewset, action=action)
+        if action == 'list':
+            try:
+                offset = max(int(request.GET.get('offset', 0)), 0)
+            except ValueError:
+                offset = 0
+            metrics.observe('crm_pagination_offset', offset,
+                            buckets=metrics.OFFSET_BUCKETS, viewset=viewset)
+        metrics.registry.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Remember which view and action handle the request."""
+        request.metrics_labels = view_labels(view_func, request.method)
+
+
+class SlowQueryMiddleware:
+    """Record the slow queries issued while handling a request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.slow_query_recorder = SlowQueryRecorder()
+        with execute_wrapper(request.slow_query_recorder):
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Tag the recorded queries with the view handling the request."""
+        viewset, action = view_labels(view_func, request.method)
+        request.slow_query_recorder.view = (f'{viewset}.{action}' if action
+                                            else viewset)
+
+
+class TrafficRecorderMiddleware:
+    """
+    Record a sample of the requests for the replay command. Only enabled
+    when TRAFFIC_CAPTURE_DIR is set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.writer = traffic.get_writer()
+        if self.writer is None:
+            raise MiddlewareNotUsed()
+
+    def __call__(self, request):
+        if random.random() >= settings.TRAFFIC_CAPTURE_RATE:
+            return self.get_response(request)
+        request.captured_body = b''
+        if (request.content_type == 'application/json' and
+                int(request.META.get('CONTENT_LENGTH') or 0) <=
+                settings.TRAFFIC_CAPTURE_MAX_BODY):
+            request.captured_body = request.body
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.writer.write(traffic.capture_entry(
+            request, response, time.perf_counter() - start))
+        return response
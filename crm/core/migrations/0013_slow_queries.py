@@ -0,0 +1,43 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_alter_contract_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQueryFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True)),
+                ('sql', models.TextField()),
+                ('calls', models.IntegerField(default=0)),
+                ('total_time', models.FloatField(default=0)),
+                ('max_time', models.FloatField(default=0)),
+                ('last_view', models.CharField(blank=True, max_length=255)),
+                ('last_seen', models.DateTimeField()),
+                ('plan', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sql', models.TextField()),
+                ('duration', models.FloatField()),
+                ('view', models.CharField(blank=True, max_length=255)),
+                ('plan', models.TextField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='core.slowqueryfingerprint')),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+            },
+        ),
+    ]
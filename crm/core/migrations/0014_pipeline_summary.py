@@ -0,0 +1,69 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def populate_pipeline_summary(apps, schema_editor):
+    Contract = apps.get_model("core", "Contract")
+    PipelineSummary = apps.get_model("core", "PipelineSummary")
+    totals = (
+        Contract.objects.annotate(
+            month=TruncMonth("date_created", output_field=DateField())
+        )
+        .values("sales_contact_id", "month", "signed")
+        .annotate(contract_count=Count("id"), total_amount=Sum("amount"))
+        .order_by()
+    )
+    PipelineSummary.objects.bulk_create(PipelineSummary(**row) for row in totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_slow_queries"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PipelineSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("signed", models.BooleanField()),
+                ("contract_count", models.IntegerField(default=0)),
+                (
+                    "total_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "sales_contact",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="pipelinesummary",
+            constraint=models.UniqueConstraint(
+                fields=("sales_contact", "month", "signed"),
+                name="unique_pipeline_summary",
+            ),
+        ),
+        migrations.RunPython(populate_pipeline_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_pipeline_summary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["support_contact", "event_closed", "event_date"],
+                name="event_support_calendar_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_event_support_calendar_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("signed", True)),
+                fields=["payment_due"],
+                name="contract_signed_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:49
+
+from django.db import migrations, models
+from django.db.models import (
+    Count,
+    DecimalField,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+
+def _total(queryset, aggregate, output_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(customer=OuterRef("pk"))
+            .order_by()
+            .values("customer")
+            .annotate(total=aggregate)
+            .values("total")
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def populate_customer_rollups(apps, schema_editor):
+    Contract = apps.get_model("core", "Contract")
+    Customer = apps.get_model("core", "Customer")
+    Event = apps.get_model("core", "Event")
+    Customer.objects.update(
+        contract_count=_total(Contract.objects, Count("id"), IntegerField()),
+        signed_amount=_total(
+            Contract.objects.filter(signed=True),
+            Sum("amount"),
+            DecimalField(max_digits=14, decimal_places=2),
+        ),
+        open_event_count=_total(
+            Event.objects.filter(event_closed=False), Count("id"), IntegerField()
+        ),
+        last_activity=Greatest(
+            Subquery(
+                Contract.objects.filter(customer=OuterRef("pk"))
+                .order_by("-date_updated")
+                .values("date_updated")[:1]
+            ),
+            Subquery(
+                Event.objects.filter(customer=OuterRef("pk"))
+                .order_by("-date_updated")
+                .values("date_updated")[:1]
+            ),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_contract_signed_due_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="contract_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="last_activity",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="open_event_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="signed_amount",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["signed_amount"], name="customer_signed_amount_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["last_activity"], name="customer_last_activity_idx"
+            ),
+        ),
+        migrations.RunPython(populate_customer_rollups, migrations.RunPython.noop),
+    ]
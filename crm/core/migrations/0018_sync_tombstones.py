@@ -0,0 +1,48 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_customer_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=50)),
+                ("object_id", models.IntegerField()),
+                ("date_deleted", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="contract",
+            index=models.Index(fields=["date_updated", "id"], name="contract_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["date_updated", "id"], name="customer_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(fields=["date_updated", "id"], name="event_sync_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["model", "date_deleted", "id"], name="tombstone_sync_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,128 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:57
+
+import datetime
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_partitions(apps, schema_editor):
+    # Partitions of the current and next months, later months are created by
+    # the create_audit_partitions command.
+    today = django.utils.timezone.now().date().replace(day=1)
+    months = [today]
+    for _ in range(3):
+        months.append((months[-1] + datetime.timedelta(days=32)).replace(day=1))
+    for start, end in zip(months, months[1:]):
+        schema_editor.execute(
+            f"CREATE TABLE core_auditentry_{start:%Y%m} "
+            f"PARTITION OF core_auditentry "
+            f"FOR VALUES FROM ('{start} 00:00+00') TO ('{end} 00:00+00')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_sync_tombstones"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="AuditEntry",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "date_created",
+                            models.DateTimeField(default=django.utils.timezone.now),
+                        ),
+                        ("model", models.CharField(max_length=50)),
+                        ("object_id", models.IntegerField()),
+                        (
+                            "action",
+                            models.CharField(
+                                choices=[
+                                    ("create", "Create"),
+                                    ("update", "Update"),
+                                    ("delete", "Delete"),
+                                ],
+                                max_length=10,
+                            ),
+                        ),
+                        (
+                            "changes",
+                            models.JSONField(
+                                encoder=django.core.serializers.json.DjangoJSONEncoder
+                            ),
+                        ),
+                        ("request_id", models.CharField(blank=True, max_length=64)),
+                        (
+                            "actor",
+                            models.ForeignKey(
+                                blank=True,
+                                db_constraint=False,
+                                null=True,
+                                on_delete=django.db.models.deletion.DO_NOTHING,
+                                related_name="+",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "verbose_name_plural": "audit entries",
+                    },
+                ),
+                migrations.AddIndex(
+                    model_name="auditentry",
+                    index=models.Index(
+                        fields=["model", "object_id", "date_created"],
+                        name="audit_object_idx",
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name="auditentry",
+                    index=models.Index(
+                        fields=["actor", "date_created"], name="audit_actor_idx"
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    """
+                    CREATE TABLE core_auditentry (
+                        id bigint GENERATED BY DEFAULT AS IDENTITY,
+                        date_created timestamp with time zone NOT NULL,
+                        actor_id bigint NULL,
+                        model varchar(50) NOT NULL,
+                        object_id integer NOT NULL,
+                        action varchar(10) NOT NULL,
+                        changes jsonb NOT NULL,
+                        request_id varchar(64) NOT NULL,
+                        PRIMARY KEY (id, date_created)
+                    ) PARTITION BY RANGE (date_created);
+                    CREATE TABLE core_auditentry_default
+                        PARTITION OF core_auditentry DEFAULT;
+                    CREATE INDEX audit_object_idx
+                        ON core_auditentry (model, object_id, date_created);
+                    CREATE INDEX audit_actor_idx
+                        ON core_auditentry (actor_id, date_created);
+                    """,
+                    "DROP TABLE core_auditentry;",
+                ),
+                migrations.RunPython(create_partitions, migrations.RunPython.noop),
+            ],
+        ),
+    ]
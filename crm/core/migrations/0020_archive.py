@@ -0,0 +1,88 @@
+# Generated by Django 4.1.6 on 2026-10-19 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_audit_trail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedEvent",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("date_created", models.DateTimeField()),
+                ("date_updated", models.DateTimeField()),
+                ("event_closed", models.BooleanField(default=False)),
+                ("attendees", models.IntegerField(blank=True, null=True)),
+                ("event_date", models.DateTimeField(blank=True, null=True)),
+                ("notes", models.TextField(blank=True, null=True)),
+                ("date_archived", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_events",
+                        to="core.customer",
+                    ),
+                ),
+                (
+                    "support_contact",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedContract",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("date_created", models.DateTimeField()),
+                ("date_updated", models.DateTimeField()),
+                ("signed", models.BooleanField(default=False)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("payment_due", models.DateField()),
+                ("date_archived", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_contracts",
+                        to="core.customer",
+                    ),
+                ),
+                (
+                    "event",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="contract",
+                        to="core.archivedevent",
+                    ),
+                ),
+                (
+                    "sales_contact",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
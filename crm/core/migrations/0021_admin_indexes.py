@@ -0,0 +1,55 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:04
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0020_archive"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                fields=["date_created"], name="contract_date_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customer",
+            index=models.Index(
+                django.db.models.functions.text.Upper("email"),
+                name="customer_email_upper_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customer",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("last_name"),
+                    name="varchar_pattern_ops",
+                ),
+                name="customer_last_name_like_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customer",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("company"),
+                    name="varchar_pattern_ops",
+                ),
+                name="customer_company_like_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(fields=["event_date"], name="event_date_idx"),
+        ),
+    ]
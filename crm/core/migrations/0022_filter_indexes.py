@@ -0,0 +1,55 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:14
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0021_admin_indexes"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("signed", False)),
+                fields=["sales_contact", "date_created"],
+                name="contract_unsigned_sales_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("signed", True)),
+                fields=["sales_contact", "payment_due"],
+                name="contract_signed_sales_due_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("event_closed", False)),
+                fields=["support_contact", "event_date"],
+                name="event_open_support_date_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("event_closed", True)),
+                fields=["date_updated"],
+                name="event_closed_updated_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="event",
+            name="event_support_calendar_idx",
+        ),
+    ]
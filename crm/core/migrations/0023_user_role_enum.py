@@ -0,0 +1,46 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:40
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE TYPE user_role AS ENUM "
+            "('management', 'sales', 'support', 'admin')",
+            "DROP TYPE user_role",
+        ),
+        # Django would alter the column without the cast the enum needs.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    "ALTER TABLE core_user ALTER COLUMN role TYPE user_role "
+                    "USING role::user_role",
+                    "ALTER TABLE core_user ALTER COLUMN role TYPE varchar(255) "
+                    "USING role::varchar(255)",
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="user",
+                    name="role",
+                    field=core.fields.EnumField(
+                        choices=[
+                            ("management", "management"),
+                            ("sales", "sales"),
+                            ("support", "support"),
+                        ],
+                        default="management",
+                        enum_type="user_role",
+                        max_length=10,
+                    ),
+                ),
+            ],
+        ),
+    ]
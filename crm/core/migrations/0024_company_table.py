@@ -0,0 +1,93 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:40
+#
+# First step of the move of the customers' company names to their own table:
+# the old column stays, nullable, so that the processes still running the
+# previous release keep working while the new one is deployed. The customers
+# they create are caught up by 0033_drop_customer_company, which drops the
+# column.
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+import django.db.models.functions.text
+
+BATCH_SIZE = 10000
+
+
+def link_companies(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Customer = apps.get_model("core", "Customer")
+    ids = Customer.objects.using(alias).order_by("id").values_list("id", flat=True)
+    first, last = ids.first(), ids.last()
+    if first is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO core_company (name) SELECT DISTINCT company "
+            "FROM core_customer WHERE organization_id IS NULL "
+            "AND company IS NOT NULL ON CONFLICT (name) DO NOTHING"
+        )
+        for start in range(first, last + 1, BATCH_SIZE):
+            with transaction.atomic(using=alias):
+                cursor.execute(
+                    "UPDATE core_customer SET organization_id = core_company.id "
+                    "FROM core_company WHERE core_company.name = "
+                    "core_customer.company AND organization_id IS NULL "
+                    "AND core_customer.id >= %s AND core_customer.id < %s",
+                    [start, start + BATCH_SIZE],
+                )
+
+
+class Migration(migrations.Migration):
+    # Each batch of customers is linked in its own transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0023_user_role_enum"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Company",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=250, unique=True)),
+            ],
+            options={
+                "verbose_name_plural": "companies",
+                "indexes": [
+                    models.Index(
+                        django.contrib.postgres.indexes.OpClass(
+                            django.db.models.functions.text.Upper("name"),
+                            name="varchar_pattern_ops",
+                        ),
+                        name="company_name_like_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="organization",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="customers",
+                to="core.company",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="customer",
+            name="company",
+            field=models.CharField(max_length=250, null=True),
+        ),
+        migrations.RunPython(link_companies, migrations.RunPython.noop),
+    ]
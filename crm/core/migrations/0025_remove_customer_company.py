@@ -0,0 +1,40 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:40
+#
+# Second step of the move of the customers' company names, in the state
+# only: the release reading the companies no longer knows the old column,
+# which the previous release keeps writing during the deploy. The database
+# is changed by 0033_drop_customer_company, once that release is gone.
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0024_company_table"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name="customer",
+                    name="customer_company_like_idx",
+                ),
+                migrations.RemoveField(
+                    model_name="customer",
+                    name="company",
+                ),
+                migrations.AlterField(
+                    model_name="customer",
+                    name="organization",
+                    field=models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="customers",
+                        to="core.company",
+                    ),
+                ),
+            ],
+        ),
+    ]
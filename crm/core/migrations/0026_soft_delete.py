@@ -0,0 +1,149 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:25
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0025_remove_customer_company"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True), ("signed", False)),
+                fields=["sales_contact", "date_created"],
+                name="contract_live_unsigned_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True), ("signed", True)),
+                fields=["sales_contact", "payment_due"],
+                name="contract_live_signed_due_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="contract",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", False)),
+                fields=["deleted_at"],
+                name="contract_deleted_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customer",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", False)),
+                fields=["deleted_at"],
+                name="customer_deleted_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(
+                    ("deleted_at__isnull", True), ("event_closed", False)
+                ),
+                fields=["support_contact", "event_date"],
+                name="event_live_open_support_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", False)),
+                fields=["deleted_at"],
+                name="event_deleted_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customer",
+            index=models.Index(
+                django.db.models.functions.text.Upper("email"),
+                condition=models.Q(("deleted_at__isnull", True)),
+                name="customer_live_email_upper_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="customer",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("last_name"),
+                    name="varchar_pattern_ops",
+                ),
+                condition=models.Q(("deleted_at__isnull", True)),
+                name="customer_live_last_name_idx",
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    "CREATE UNIQUE INDEX CONCURRENTLY customer_live_email_uniq "
+                    "ON core_customer (email) WHERE deleted_at IS NULL",
+                    "DROP INDEX CONCURRENTLY customer_live_email_uniq",
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name="customer",
+                    constraint=models.UniqueConstraint(
+                        condition=models.Q(("deleted_at__isnull", True)),
+                        fields=("email",),
+                        name="customer_live_email_uniq",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="customer",
+            name="email",
+            field=models.EmailField(max_length=100),
+        ),
+        RemoveIndexConcurrently(
+            model_name="contract",
+            name="contract_unsigned_sales_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="contract",
+            name="contract_signed_sales_due_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="event",
+            name="event_open_support_date_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="customer",
+            name="customer_email_upper_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="customer",
+            name="customer_last_name_like_idx",
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.6 on 2026-10-19 15:02
+#
+# Each shard hands out the ids of its own range, so that the shard of a
+# customer, contract or event is known from its id (see core.sharding). The
+# default database keeps the first range and its sequences as they are.
+
+from django.conf import settings
+from django.db import migrations
+
+SHARD_ID_RANGE = 2**28
+
+TABLES = ("core_customer", "core_contract", "core_event")
+
+
+def move_sequences(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    if alias not in settings.SHARDS:
+        return
+    start = settings.SHARDS.index(alias) * SHARD_ID_RANGE
+    if not start:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {table})) + 1, "
+                f"false)",
+                [start],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0026_soft_delete"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 4.1.6 on 2026-10-19 11:48
+#
+# First step of the move of the events' notes to EventNote, keyed by the id
+# of the event, zlib compressing the bodies of EVENT_NOTES_COMPRESS_MIN bytes
+# or more as core.notes does. The notes columns are only dropped from the
+# models: they stay in the tables, so that the processes still running the
+# previous release keep working while the new one is deployed. A trigger
+# records the notes they write to core_event in core_eventnote_pending,
+# unless the new release writes the EventNote afterwards, and
+# 0032_drop_event_notes copies them before dropping the columns.
+
+import zlib
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 10000
+
+PENDING_SQL = [
+    "CREATE TABLE core_eventnote_pending (id bigint PRIMARY KEY, notes text)",
+    """
+    CREATE FUNCTION core_eventnote_mark() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO core_eventnote_pending (id, notes)
+        VALUES (NEW.id, NEW.notes)
+        ON CONFLICT (id) DO UPDATE SET notes = EXCLUDED.notes;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE FUNCTION core_eventnote_unmark() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF current_setting('crm.notes_catch_up', true) = 'on' THEN
+            RETURN NULL;
+        ELSIF TG_OP = 'DELETE' THEN
+            DELETE FROM core_eventnote_pending WHERE id = OLD.id;
+        ELSE
+            DELETE FROM core_eventnote_pending WHERE id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    "CREATE TRIGGER core_event_notes_insert AFTER INSERT ON core_event "
+    "FOR EACH ROW WHEN (NEW.notes <> '') "
+    "EXECUTE FUNCTION core_eventnote_mark()",
+    "CREATE TRIGGER core_event_notes_update AFTER UPDATE OF notes ON core_event "
+    "FOR EACH ROW WHEN (OLD.notes IS DISTINCT FROM NEW.notes) "
+    "EXECUTE FUNCTION core_eventnote_mark()",
+    "CREATE TRIGGER core_eventnote_written "
+    "AFTER INSERT OR UPDATE OR DELETE ON core_eventnote "
+    "FOR EACH ROW EXECUTE FUNCTION core_eventnote_unmark()",
+]
+DROP_PENDING_SQL = [
+    "DROP TRIGGER core_eventnote_written ON core_eventnote",
+    "DROP TRIGGER core_event_notes_update ON core_event",
+    "DROP TRIGGER core_event_notes_insert ON core_event",
+    "DROP FUNCTION core_eventnote_unmark()",
+    "DROP FUNCTION core_eventnote_mark()",
+    "DROP TABLE core_eventnote_pending",
+]
+
+
+def encode(text):
+    body = text.encode()
+    if len(body) >= settings.EVENT_NOTES_COMPRESS_MIN:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            return compressed, True
+    return body, False
+
+
+def move_notes(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    EventNote = apps.get_model("core", "EventNote")
+    for name in ("Event", "ArchivedEvent"):
+        model = apps.get_model("core", name)
+        rows = (
+            model._base_manager.using(alias)
+            .exclude(notes__isnull=True)
+            .exclude(notes="")
+            .order_by("id")
+            .values_list("id", "notes")
+        )
+        last = 0
+        while True:
+            batch = list(rows.filter(id__gt=last)[:BATCH_SIZE])
+            if not batch:
+                break
+            with transaction.atomic(using=alias):
+                # The notes written meanwhile by the previous release stay
+                # pending, the copy may be older.
+                with schema_editor.connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL crm.notes_catch_up = 'on'")
+                EventNote.objects.using(alias).bulk_create(
+                    [
+                        EventNote(id=pk, body=body, compressed=compressed)
+                        for pk, (body, compressed) in (
+                            (pk, encode(text)) for pk, text in batch
+                        )
+                    ],
+                    ignore_conflicts=True,
+                )
+            last = batch[-1][0]
+
+
+def restore_notes(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    EventNote = apps.get_model("core", "EventNote")
+    targets = [apps.get_model("core", name) for name in ("Event", "ArchivedEvent")]
+    rows = (
+        EventNote.objects.using(alias)
+        .order_by("id")
+        .values_list("id", "body", "compressed")
+    )
+    last = -1
+    while True:
+        batch = list(rows.filter(id__gt=last)[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic(using=alias):
+            for pk, body, compressed in batch:
+                body = bytes(body)
+                text = (zlib.decompress(body) if compressed else body).decode()
+                for model in targets:
+                    model._base_manager.using(alias).filter(pk=pk).update(notes=text)
+        last = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    # Each batch of notes is moved in its own transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0027_shard_sequences"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventNote",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("body", models.BinaryField()),
+                ("compressed", models.BooleanField(default=False)),
+                ("date_updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(PENDING_SQL, DROP_PENDING_SQL),
+        migrations.RunPython(move_notes, restore_notes),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name="archivedevent",
+                    name="notes",
+                ),
+                migrations.RemoveField(
+                    model_name="event",
+                    name="notes",
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.6 on 2026-10-19 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0028_event_notes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tombstone",
+            name="object_id",
+            field=models.BigIntegerField(),
+        ),
+    ]
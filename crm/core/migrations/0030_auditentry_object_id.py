@@ -0,0 +1,18 @@
+# Generated by Django 4.1.6 on 2026-10-19 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0029_tombstone_object_id"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="auditentry",
+            name="object_id",
+            field=models.BigIntegerField(),
+        ),
+    ]
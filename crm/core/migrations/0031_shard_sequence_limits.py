@@ -0,0 +1,51 @@
+# Generated by Django 4.1.6 on 2026-10-19 12:55
+#
+# Caps the sequences of each database at the end of its range of ids, so
+# that a full shard fails its inserts instead of handing out the ids of the
+# next shard (see core.sharding). The default database is only capped while
+# its ids are still in the first range.
+
+from django.conf import settings
+from django.db import migrations
+
+SHARD_ID_RANGE = 2**28
+
+TABLES = ("core_customer", "core_contract", "core_event")
+
+
+def sequences(cursor):
+    for table in TABLES:
+        cursor.execute(f"SELECT pg_get_serial_sequence('{table}', 'id')")
+        yield cursor.fetchone()[0]
+
+
+def limit_sequences(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    if alias not in settings.SHARDS:
+        return
+    start = settings.SHARDS.index(alias) * SHARD_ID_RANGE
+    with schema_editor.connection.cursor() as cursor:
+        for sequence in list(sequences(cursor)):
+            cursor.execute(f"SELECT last_value FROM {sequence}")
+            if start or cursor.fetchone()[0] < SHARD_ID_RANGE:
+                cursor.execute(
+                    f"ALTER SEQUENCE {sequence} MAXVALUE %s",
+                    [start + SHARD_ID_RANGE - 1],
+                )
+
+
+def unlimit_sequences(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for sequence in list(sequences(cursor)):
+            cursor.execute(f"ALTER SEQUENCE {sequence} NO MAXVALUE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0030_auditentry_object_id"),
+    ]
+
+    operations = [
+        migrations.RunPython(limit_sequences, unlimit_sequences),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 4.1.6 on 2026-10-19 12:40
+#
+# Second step of the move of the events' notes, to run once no process of
+# the previous release is left (stop at 0031_shard_sequence_limits during
+# the deploy): the notes they wrote, recorded by the trigger of
+# 0028_event_notes, are copied to EventNote, then the trigger and the old
+# columns are dropped.
+
+import zlib
+
+from django.conf import settings
+from django.db import migrations, transaction
+
+BATCH_SIZE = 10000
+TABLES = ("core_event", "core_archivedevent")
+
+PENDING_SQL = [
+    "CREATE TABLE core_eventnote_pending (id bigint PRIMARY KEY, notes text)",
+    """
+    CREATE FUNCTION core_eventnote_mark() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO core_eventnote_pending (id, notes)
+        VALUES (NEW.id, NEW.notes)
+        ON CONFLICT (id) DO UPDATE SET notes = EXCLUDED.notes;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE FUNCTION core_eventnote_unmark() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF current_setting('crm.notes_catch_up', true) = 'on' THEN
+            RETURN NULL;
+        ELSIF TG_OP = 'DELETE' THEN
+            DELETE FROM core_eventnote_pending WHERE id = OLD.id;
+        ELSE
+            DELETE FROM core_eventnote_pending WHERE id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    "CREATE TRIGGER core_event_notes_insert AFTER INSERT ON core_event "
+    "FOR EACH ROW WHEN (NEW.notes <> '') "
+    "EXECUTE FUNCTION core_eventnote_mark()",
+    "CREATE TRIGGER core_event_notes_update AFTER UPDATE OF notes ON core_event "
+    "FOR EACH ROW WHEN (OLD.notes IS DISTINCT FROM NEW.notes) "
+    "EXECUTE FUNCTION core_eventnote_mark()",
+    "CREATE TRIGGER core_eventnote_written "
+    "AFTER INSERT OR UPDATE OR DELETE ON core_eventnote "
+    "FOR EACH ROW EXECUTE FUNCTION core_eventnote_unmark()",
+]
+DROP_PENDING_SQL = [
+    "DROP TRIGGER core_eventnote_written ON core_eventnote",
+    "DROP TRIGGER core_event_notes_update ON core_event",
+    "DROP TRIGGER core_event_notes_insert ON core_event",
+    "DROP FUNCTION core_eventnote_unmark()",
+    "DROP FUNCTION core_eventnote_mark()",
+    "DROP TABLE core_eventnote_pending",
+]
+
+
+def encode(text):
+    body = text.encode()
+    if len(body) >= settings.EVENT_NOTES_COMPRESS_MIN:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            return compressed, True
+    return body, False
+
+
+def move_notes(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    EventNote = apps.get_model("core", "EventNote")
+    notes = EventNote.objects.using(alias)
+    with schema_editor.connection.cursor() as cursor:
+        last = -1
+        while True:
+            cursor.execute(
+                "SELECT id, notes FROM core_eventnote_pending WHERE id > %s "
+                "AND (EXISTS (SELECT 1 FROM core_event "
+                "WHERE core_event.id = core_eventnote_pending.id) "
+                "OR EXISTS (SELECT 1 FROM core_archivedevent "
+                "WHERE core_archivedevent.id = core_eventnote_pending.id)) "
+                "ORDER BY id LIMIT %s",
+                [last, BATCH_SIZE],
+            )
+            batch = cursor.fetchall()
+            if not batch:
+                break
+            with transaction.atomic(using=alias):
+                notes.filter(pk__in=[pk for pk, text in batch if not text]).delete()
+                notes.bulk_create(
+                    [
+                        EventNote(id=pk, body=body, compressed=compressed)
+                        for pk, (body, compressed) in (
+                            (pk, encode(text)) for pk, text in batch if text
+                        )
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["id"],
+                    update_fields=["body", "compressed"],
+                )
+            last = batch[-1][0]
+
+
+def restore_notes(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    EventNote = apps.get_model("core", "EventNote")
+    rows = (
+        EventNote.objects.using(alias)
+        .order_by("id")
+        .values_list("id", "body", "compressed")
+    )
+    last = -1
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            batch = list(rows.filter(id__gt=last)[:BATCH_SIZE])
+            if not batch:
+                break
+            with transaction.atomic(using=alias):
+                for pk, body, compressed in batch:
+                    body = bytes(body)
+                    text = (zlib.decompress(body) if compressed else body).decode()
+                    for table in TABLES:
+                        cursor.execute(
+                            f"UPDATE {table} SET notes = %s WHERE id = %s",
+                            [text, pk],
+                        )
+            last = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    # Each batch of notes is moved in its own transaction.
+    atomic = False
+
+    dependencies = [
+        ("core", "0031_shard_sequence_limits"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_notes, restore_notes),
+        migrations.RunSQL(
+            DROP_PENDING_SQL
+            + [f"ALTER TABLE {table} DROP COLUMN notes" for table in TABLES],
+            [f"ALTER TABLE {table} ADD COLUMN notes text NULL" for table in TABLES]
+            + PENDING_SQL,
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.1.6 on 2026-10-19 14:10
+#
+# Last step of the move of the customers' company names, to run once no
+# process of the previous release is left (stop at
+# 0031_shard_sequence_limits during the deploy): the customers they created
+# are linked to their company, the company becomes required and the old
+# column is dropped. The NOT NULL is proven by a constraint validated
+# without blocking the writes, so that setting it does not scan the table
+# under an exclusive lock.
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 10000
+
+
+def link_companies(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Customer = apps.get_model("core", "Customer")
+    ids = Customer.objects.using(alias).order_by("id").values_list("id", flat=True)
+    first, last = ids.first(), ids.last()
+    if first is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO core_company (name) SELECT DISTINCT company "
+            "FROM core_customer WHERE organization_id IS NULL "
+            "AND company IS NOT NULL ON CONFLICT (name) DO NOTHING"
+        )
+        for start in range(first, last + 1, BATCH_SIZE):
+            with transaction.atomic(using=alias):
+                cursor.execute(
+                    "UPDATE core_customer SET organization_id = core_company.id "
+                    "FROM core_company WHERE core_company.name = "
+                    "core_customer.company AND organization_id IS NULL "
+                    "AND core_customer.id >= %s AND core_customer.id < %s",
+                    [start, start + BATCH_SIZE],
+                )
+
+
+def restore_company_names(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE core_customer SET company = core_company.name "
+            "FROM core_company WHERE core_company.id = "
+            "core_customer.organization_id"
+        )
+
+
+class Migration(migrations.Migration):
+    # Each batch of customers is linked in its own transaction, and the
+    # index is dropped concurrently.
+    atomic = False
+
+    dependencies = [
+        ("core", "0032_drop_event_notes"),
+    ]
+
+    operations = [
+        migrations.RunPython(link_companies, restore_company_names),
+        migrations.RunSQL(
+            [
+                "ALTER TABLE core_customer ADD CONSTRAINT "
+                "customer_organization_not_null "
+                "CHECK (organization_id IS NOT NULL) NOT VALID",
+                "ALTER TABLE core_customer VALIDATE CONSTRAINT "
+                "customer_organization_not_null",
+                "ALTER TABLE core_customer ALTER COLUMN organization_id SET NOT NULL",
+                "ALTER TABLE core_customer DROP CONSTRAINT "
+                "customer_organization_not_null",
+            ],
+            "ALTER TABLE core_customer ALTER COLUMN organization_id DROP NOT NULL",
+        ),
+        migrations.RunSQL(
+            "DROP INDEX CONCURRENTLY customer_company_like_idx",
+            "CREATE INDEX CONCURRENTLY customer_company_like_idx ON core_customer "
+            "((UPPER(company)) varchar_pattern_ops)",
+        ),
+        migrations.RunSQL(
+            "ALTER TABLE core_customer DROP COLUMN company",
+            "ALTER TABLE core_customer ADD COLUMN company varchar(250) NULL",
+        ),
+    ]
@@ -3,16 +3,26 @@ Database models.
 """
 import logging
 
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.contrib.auth.models import (
         AbstractBaseUser,
         BaseUserManager,
         PermissionsMixin,
         )
 
+from core import sharding
+from core.fields import EnumField
+
 
 logger = logging.getLogger('django')
 
+# Values of the user_role enumerated type; superusers have the admin role.
+ROLES = ('management', 'sales', 'support', 'admin')
+
 
 class UserManager(BaseUserManager):
     """Manager for user profiles."""
@@ -23,6 +33,9 @@ class UserManager(BaseUserManager):
         if not email:
             logger.error("User must have an email address.")
             raise ValueError('Users must have an email address')
+        if role not in ROLES:
+            logger.error("User role is invalid.")
+            raise ValueError('Users must have a valid role')
         user = self.model(email=self.normalize_email(email),
                           first_name=first_name,
                           last_name=last_name, role=role, **extra_fields)
@@ -56,11 +69,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=255, blank=True, null=True)
     last_name = models.CharField(max_length=255, blank=True, null=True)
-    role = models.CharField(max_length=255, default='management', choices=(
-        ('management', 'management'),
-        ('sales', 'sales'),
-        ('support', 'support'),
-        ))
+    role = EnumField(max_length=10, default='management',
+                     enum_type='user_role',
+                     choices=(
+                         ('management', 'management'),
+                         ('sales', 'sales'),
+                         ('support', 'support'),
+                         ))
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
 
@@ -75,25 +90,197 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
-class Customer(models.Model):
+class TrackedModel(models.Model):
+    """
+    Model remembering the values it was loaded with, so that the signal
+    receivers can tell what a save changed. Saves run in a transaction so
+    that the receivers' writes commit or roll back with the row, on the
+    row's shard. New rows are written to the shard of their key.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_values(self):
+        """Return the values of the row before the pending changes."""
+        return getattr(self, '_loaded_values', {})
+
+    def current_values(self):
+        """Return the current values of the concrete fields."""
+        return {field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__}
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        values = self.current_values()
+        if fields is not None:
+            names = {self._meta.get_field(name).attname for name in fields}
+            values = {name: value for name, value in values.items()
+                      if name in names}
+        self._loaded_values = {**self.loaded_values(), **values}
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using')
+        if self._state.adding:
+            using = sharding.shard_for(self) or using
+        kwargs['using'] = using = using or router.db_for_write(
+            type(self), instance=self)
+        with transaction.atomic(using=using), sharding.pinned(using):
+            super().save(*args, **kwargs)
+        self._loaded_values = self.current_values()
+
+
+class LiveQuerySet(models.QuerySet):
+    """QuerySet whose delete hides the rows instead of removing them."""
+
+    def delete(self):
+        from core import softdelete
+
+        return softdelete.delete(self)
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class LiveManager(models.Manager.from_queryset(LiveQuerySet)):
+    """
+    Manager of the rows which are not deleted, nor hidden by the deletion
+    of the rows listed in the deleted_with of the model.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True, **{
+            f'{parent}__deleted_at__isnull': True
+            for parent in self.model.deleted_with})
+
+
+class SoftDeleteModel(TrackedModel):
+    """
+    Model whose deletes only set deleted_at, in one UPDATE, the default
+    manager hiding the deleted rows and the rows they hide. core.softdelete
+    restores them, and the purge_deleted command removes them for good once
+    they are old enough.
+    """
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Lookups of the rows whose deletion hides this one.
+    deleted_with = ()
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        from core import softdelete
+
+        return softdelete.delete(type(self).objects.using(
+            using or self._state.db).filter(pk=self.pk))
+
+    def restore(self):
+        """Bring back the row, and the rows its deletion hid."""
+        from core import softdelete
+
+        return softdelete.restore(type(self).all_objects.using(
+            self._state.db).filter(pk=self.pk))
+
+
+class Company(models.Model):
+    """Company of customers, stored once for all of them."""
+    name = models.CharField(max_length=250, unique=True)
+
+    class Meta:
+        verbose_name_plural = 'companies'
+        indexes = [
+            models.Index(OpClass(Upper('name'), name='varchar_pattern_ops'),
+                         name='company_name_like_idx'),
+            ]
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return self.name
+
+
+class Customer(SoftDeleteModel):
     """Customer class to store customer details."""
     first_name = models.CharField(max_length=25)
     last_name = models.CharField(max_length=25)
-    email = models.EmailField(unique=True, max_length=100)
+    email = models.EmailField(max_length=100)
     phone = models.CharField(max_length=20, blank=True, null=True)
     mobile = models.CharField(max_length=20, blank=True, null=True)
-    company = models.CharField(max_length=250)
+    organization = models.ForeignKey('Company', on_delete=models.PROTECT,
+                                     related_name='customers')
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
     sales_contact = models.ForeignKey('User', on_delete=models.SET_NULL,
                                       null=True, blank=True)
+    contract_count = models.IntegerField(default=0, editable=False)
+    signed_amount = models.DecimalField(max_digits=14, decimal_places=2,
+                                        default=0, editable=False)
+    open_event_count = models.IntegerField(default=0, editable=False)
+    last_activity = models.DateTimeField(null=True, blank=True,
+                                         editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['email'], condition=models.Q(deleted_at__isnull=True),
+                name='customer_live_email_uniq'),
+            ]
+        indexes = [
+            models.Index(fields=['date_updated', 'id'],
+                         name='customer_sync_idx'),
+            models.Index(fields=['signed_amount'],
+                         name='customer_signed_amount_idx'),
+            models.Index(fields=['last_activity'],
+                         name='customer_last_activity_idx'),
+            models.Index(Upper('email'),
+                         condition=models.Q(deleted_at__isnull=True),
+                         name='customer_live_email_upper_idx'),
+            models.Index(OpClass(Upper('last_name'),
+                                 name='varchar_pattern_ops'),
+                         condition=models.Q(deleted_at__isnull=True),
+                         name='customer_live_last_name_idx'),
+            models.Index(fields=['deleted_at'],
+                         condition=models.Q(deleted_at__isnull=False),
+                         name='customer_deleted_idx'),
+            ]
 
     def __str__(self):
         """Return a string representation of the model."""
         return self.first_name + ' ' + self.last_name
 
+    @property
+    def company(self):
+        """Return the name of the customer's company."""
+        if hasattr(self, '_company'):
+            return self._company
+        return self.organization.name if self.organization_id else None
+
+    @company.setter
+    def company(self, name):
+        """Set the company by name, created if new when the row is saved."""
+        self._company = name
+
+    def save(self, *args, **kwargs):
+        if getattr(self, '_company', None) is not None and (
+                self.organization_id is None or
+                self.organization.name != self._company):
+            self.organization = Company.objects.db_manager(
+                router.db_for_write(Customer, instance=self)).get_or_create(
+                    name=self._company)[0]
+        self.__dict__.pop('_company', None)
+        super().save(*args, **kwargs)
+
 
-class Contract(models.Model):
+class Contract(SoftDeleteModel):
     """Contract class to store contract details."""
     sales_contact = models.ForeignKey('User', on_delete=models.SET_NULL,
                                       null=True, blank=True)
@@ -107,12 +294,64 @@ class Contract(models.Model):
     event = models.OneToOneField('Event', on_delete=models.CASCADE,
                                  null=True, blank=True)
 
+    deleted_with = ('event', 'event__customer')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_updated', 'id'],
+                         name='contract_sync_idx'),
+            models.Index(fields=['payment_due'],
+                         condition=models.Q(signed=True),
+                         name='contract_signed_due_idx'),
+            models.Index(fields=['date_created'],
+                         name='contract_date_created_idx'),
+            models.Index(fields=['sales_contact', 'date_created'],
+                         condition=models.Q(signed=False,
+                                            deleted_at__isnull=True),
+                         name='contract_live_unsigned_idx'),
+            models.Index(fields=['sales_contact', 'payment_due'],
+                         condition=models.Q(signed=True,
+                                            deleted_at__isnull=True),
+                         name='contract_live_signed_due_idx'),
+            models.Index(fields=['deleted_at'],
+                         condition=models.Q(deleted_at__isnull=False),
+                         name='contract_deleted_idx'),
+            ]
+
     def __str__(self):
         """Return a string representation of the model."""
         return f"{self.customer.company} - {self.amount}"
 
 
-class Event(models.Model):
+class NotesMixin:
+    """
+    Event whose notes are stored apart in EventNote, loaded when first read
+    and written with the event when set, see core.notes.
+    """
+
+    @property
+    def notes(self):
+        """Return the notes of the event."""
+        if '_notes' not in self.__dict__:
+            from core import notes
+
+            self._notes = (notes.load([self.pk], self._state.db).get(self.pk)
+                           if self.pk is not None else None)
+        return self._notes
+
+    @notes.setter
+    def notes(self, text):
+        """Set the notes, written when the event is saved."""
+        self._notes = text
+        self._notes_changed = True
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None and not self.__dict__.get('_notes_changed'):
+            self.__dict__.pop('_notes', None)
+
+
+class Event(NotesMixin, SoftDeleteModel):
     """Event class to store information about events."""
     customer = models.ForeignKey('Customer', on_delete=models.CASCADE,
                                  null=False, blank=False)
@@ -123,8 +362,199 @@ class Event(models.Model):
     event_closed = models.BooleanField(default=False)
     attendees = models.IntegerField(null=True, blank=True)
     event_date = models.DateTimeField(null=True, blank=True)
-    notes = models.TextField(blank=True, null=True)
+
+    deleted_with = ('customer',)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_updated', 'id'],
+                         name='event_sync_idx'),
+            models.Index(fields=['support_contact', 'event_date'],
+                         condition=models.Q(event_closed=False,
+                                            deleted_at__isnull=True),
+                         name='event_live_open_support_idx'),
+            models.Index(fields=['date_updated'],
+                         condition=models.Q(event_closed=True),
+                         name='event_closed_updated_idx'),
+            models.Index(fields=['event_date'], name='event_date_idx'),
+            models.Index(fields=['deleted_at'],
+                         condition=models.Q(deleted_at__isnull=False),
+                         name='event_deleted_idx'),
+            ]
 
     def __str__(self):
         """Return a string representation of the model."""
         return f"{self.customer.company} - {self.event_date}"
+
+
+class ArchivedContract(models.Model):
+    """
+    Settled contract moved out of the contract table by core.archive, with
+    the id it had there.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sales_contact = models.ForeignKey('User', on_delete=models.SET_NULL,
+                                      null=True, blank=True,
+                                      related_name='+')
+    customer = models.ForeignKey('Customer', on_delete=models.SET_NULL,
+                                 null=True, blank=True,
+                                 related_name='archived_contracts')
+    date_created = models.DateTimeField()
+    date_updated = models.DateTimeField()
+    signed = models.BooleanField(default=False)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_due = models.DateField()
+    event = models.OneToOneField('ArchivedEvent', on_delete=models.CASCADE,
+                                 null=True, blank=True,
+                                 related_name='contract')
+    date_archived = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f"{self.customer_id} - {self.amount}"
+
+
+class ArchivedEvent(NotesMixin, models.Model):
+    """
+    Closed event moved out of the event table by core.archive, with the id
+    it had there.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey('Customer', on_delete=models.CASCADE,
+                                 related_name='archived_events')
+    date_created = models.DateTimeField()
+    date_updated = models.DateTimeField()
+    support_contact = models.ForeignKey('User', on_delete=models.SET_NULL,
+                                        null=True, blank=True,
+                                        related_name='+')
+    event_closed = models.BooleanField(default=False)
+    attendees = models.IntegerField(null=True, blank=True)
+    event_date = models.DateTimeField(null=True, blank=True)
+    date_archived = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f"{self.customer_id} - {self.event_date}"
+
+
+class EventNote(models.Model):
+    """Notes of the live or archived event with the same id."""
+    id = models.BigIntegerField(primary_key=True)
+    body = models.BinaryField()
+    compressed = models.BooleanField(default=False)
+    date_updated = models.DateTimeField(auto_now=True)
+
+
+class SlowQueryFingerprint(models.Model):
+    """Statistics of the slow queries sharing a normalized SQL."""
+    fingerprint = models.CharField(max_length=32, unique=True)
+    sql = models.TextField()
+    calls = models.IntegerField(default=0)
+    total_time = models.FloatField(default=0)
+    max_time = models.FloatField(default=0)
+    last_view = models.CharField(max_length=255, blank=True)
+    last_seen = models.DateTimeField()
+    plan = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return self.sql[:100]
+
+
+class SlowQuery(models.Model):
+    """A query which took longer than SLOW_QUERY_THRESHOLD_MS."""
+    fingerprint = models.ForeignKey('SlowQueryFingerprint',
+                                    on_delete=models.CASCADE,
+                                    related_name='samples')
+    sql = models.TextField()
+    duration = models.FloatField()
+    view = models.CharField(max_length=255, blank=True)
+    plan = models.TextField(blank=True, null=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f"{self.view} - {self.duration:.0f} ms"
+
+
+class PipelineSummary(models.Model):
+    """
+    Number and amount of the contracts per sales contact, month of creation
+    and signature status, maintained by core.pipeline.
+    """
+    sales_contact = models.ForeignKey('User', on_delete=models.SET_NULL,
+                                      null=True, blank=True)
+    month = models.DateField()
+    signed = models.BooleanField()
+    contract_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2,
+                                       default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sales_contact', 'month', 'signed'],
+                name='unique_pipeline_summary'),
+            ]
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f"{self.sales_contact_id} - {self.month} - {self.signed}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted customer, contract or event, returned to the
+    clients synchronizing the lists incrementally.
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    date_deleted = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'date_deleted', 'id'],
+                         name='tombstone_sync_idx'),
+            ]
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f"{self.model} {self.object_id} - {self.date_deleted}"
+
+
+class AuditEntry(models.Model):
+    """
+    Changed fields of a customer, contract or event. The table is
+    partitioned by month of date_created, its primary key is
+    (id, date_created) in the database.
+    """
+    ACTIONS = (
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+        )
+    date_created = models.DateTimeField(default=timezone.now)
+    actor = models.ForeignKey('User', on_delete=models.DO_NOTHING,
+                              null=True, blank=True, db_constraint=False,
+                              related_name='+')
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    changes = models.JSONField(encoder=DjangoJSONEncoder)
+    request_id = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'audit entries'
+        indexes = [
+            models.Index(fields=['model', 'object_id', 'date_created'],
+                         name='audit_object_idx'),
+            models.Index(fields=['actor', 'date_created'],
+                         name='audit_actor_idx'),
+            ]
+
+    def __str__(self):
+        """Return a string representation of the model."""
+        return f"{self.model} {self.object_id} {self.action}"
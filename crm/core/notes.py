@@ -0,0 +1,69 @@
+"""
+Storage of the notes of the events.
+
+The notes are unbounded and rarely read, so they live in EventNote, keyed
+by the id of the event, out of the event table which the lists and the
+support views scan. Bodies of EVENT_NOTES_COMPRESS_MIN bytes or more are
+stored zlib compressed. `Event.notes` loads the notes of one event when
+first read, `attach` those of a page of events with one query per shard,
+and a save of the event only writes them when they were set. The archived
+events keep their id, hence their notes.
+"""
+import zlib
+
+from django.conf import settings
+
+from core.models import EventNote
+
+
+def encode(text):
+    """Return the stored body of text and whether it is compressed."""
+    body = text.encode()
+    if len(body) >= settings.EVENT_NOTES_COMPRESS_MIN:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            return compressed, True
+    return body, False
+
+
+def decode(body, compressed):
+    """Return the text of a stored body."""
+    body = bytes(body)
+    return (zlib.decompress(body) if compressed else body).decode()
+
+
+def load(ids, using=None):
+    """Return the notes of the events with the given ids, by id."""
+    return {pk: decode(body, compressed)
+            for pk, body, compressed in EventNote.objects.using(using).filter(
+                pk__in=list(ids)).values_list('id', 'body', 'compressed')}
+
+
+def attach(events):
+    """Load the notes of the events which have not loaded them yet."""
+    pending = {}
+    for event in events:
+        if '_notes' not in event.__dict__:
+            pending.setdefault(event._state.db, []).append(event)
+    for using, rows in pending.items():
+        notes = load((event.pk for event in rows), using)
+        for event in rows:
+            event._notes = notes.get(event.pk)
+
+
+def store(event):
+    """
+    Write the notes set on an event, unless unchanged, removing empty ones.
+    Return the previous notes.
+    """
+    previous = load([event.pk], event._state.db).get(event.pk)
+    if (event._notes or None) == previous:
+        return previous
+    rows = EventNote.objects.using(event._state.db)
+    if not event._notes:
+        rows.filter(pk=event.pk).delete()
+    else:
+        body, compressed = encode(event._notes)
+        rows.update_or_create(pk=event.pk, defaults={
+            'body': body, 'compressed': compressed})
+    return previous
@@ -0,0 +1,146 @@
+"""
+Per-user change notifications pushed to the event streams.
+
+`notify` queues a notification until the current transaction commits, then
+publishes it. With the "local" backend the process broker hands it to the
+streams of the user opened in this process. With the "postgres" backend it
+is sent with pg_notify, and every ASGI process runs a listener thread
+handing the notifications of the channel to its own broker, so the writer
+and the stream do not need to share a process.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from core import sharding
+
+logger = logging.getLogger('django')
+
+CHANNEL = 'crm_notifications'
+QUEUE_SIZE = 100
+
+
+class Broker:
+    """Fan out the notifications of each user to their open streams."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def subscribe(self, user_id):
+        """Return a queue receiving the notifications of a user."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._queues.setdefault(user_id, {})[queue] = (
+                asyncio.get_running_loop())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        """Stop sending notifications to a queue."""
+        with self._lock:
+            queues = self._queues.get(user_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._queues.pop(user_id, None)
+
+    def subscribers(self, user_id):
+        """Return the number of open streams of a user."""
+        with self._lock:
+            return len(self._queues.get(user_id, {}))
+
+    def publish(self, user_id, message):
+        """Hand a notification to the streams of a user, from any thread."""
+        with self._lock:
+            queues = list(self._queues.get(user_id, {}).items())
+        for queue, loop in queues:
+            loop.call_soon_threadsafe(_put, queue, message)
+
+
+def _put(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        logger.error('Notification dropped, stream too slow.')
+
+
+broker = Broker()
+
+
+class Listener(threading.Thread):
+    """Thread handing the notifications of the channel to the broker."""
+
+    def __init__(self, using='default'):
+        super().__init__(name='notification-listener', daemon=True)
+        self.using = using
+        self.stopped = threading.Event()
+
+    def run(self):
+        wrapper = connections[self.using]
+        connection = wrapper.get_new_connection(
+            wrapper.get_connection_params())
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            while not self.stopped.is_set():
+                if select.select([connection], [], [], 1) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    self.dispatch(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+    def dispatch(self, payload):
+        """Publish a notification received from the channel."""
+        try:
+            data = json.loads(payload)
+            broker.publish(data['user'], data['message'])
+        except (ValueError, KeyError, TypeError):
+            logger.error('Invalid notification payload.')
+
+    def stop(self):
+        """Ask the thread to stop after its current wait."""
+        self.stopped.set()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_listener():
+    """Start the listener of the process if the backend needs one."""
+    global _listener
+    if settings.NOTIFICATIONS_BACKEND != 'postgres':
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = Listener()
+            _listener.start()
+
+
+def publish(user_id, message):
+    """Publish a notification now."""
+    if settings.NOTIFICATIONS_BACKEND == 'postgres':
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [
+                CHANNEL, json.dumps({'user': user_id, 'message': message})])
+    else:
+        broker.publish(user_id, message)
+
+
+def notify(user_id, kind, using=None, **data):
+    """
+    Publish a notification to a user once the transaction of using, the
+    database of the changed rows, commits.
+    """
+    if user_id is None:
+        return
+    using = using or sharding.current_shard.get() or 'default'
+    message = {'type': kind, **data}
+    transaction.on_commit(lambda: publish(user_id, message), using=using)
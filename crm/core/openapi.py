@@ -0,0 +1,142 @@
+"""
+drf-spectacular annotations of the API views which are not built on a
+serializer. core.schema imports this module while generating the schema
+only, so that serving requests never loads drf-spectacular.
+"""
+from drf_spectacular.extensions import OpenApiViewExtension
+from drf_spectacular.openapi import AutoSchema
+from drf_spectacular.utils import (
+        OpenApiParameter,
+        extend_schema,
+        inline_serializer,
+        )
+from rest_framework import serializers
+
+from core.directory import ROLES
+from report.serializers import AnalyticsQuerySerializer, PipelineSerializer
+from user.serializers import TransferSerializer
+
+
+def annotate(view_class, **kwargs):
+    """Return a subclass of view_class described by extend_schema."""
+    return extend_schema(**kwargs)(type(view_class.__name__, (view_class,), {
+        'schema': AutoSchema()}))
+
+
+def amounts(name, fields):
+    """Return the serializer of the aging buckets labelled by fields."""
+    buckets = {bucket: serializers.DecimalField(max_digits=14,
+                                                decimal_places=2)
+               for bucket in ('current', '1-30', '31-60', '61-90', '90+')}
+    return inline_serializer(name, {**fields, **buckets}, many=True)
+
+
+class PipelineViewSchema(OpenApiViewExtension):
+    target_class = 'report.views.PipelineView'
+
+    def view_replacement(self):
+        return annotate(
+            self.target_class,
+            parameters=[
+                OpenApiParameter('from', description='First month, YYYY-MM.'),
+                OpenApiParameter('to', description='Last month, YYYY-MM.'),
+                OpenApiParameter('sales_contact', int),
+                ],
+            responses=PipelineSerializer(many=True))
+
+
+class AnalyticsViewSchema(OpenApiViewExtension):
+    target_class = 'report.views.AnalyticsView'
+
+    def view_replacement(self):
+        stats = inline_serializer('AnalyticsGroup', {
+            'key': serializers.JSONField(),
+            'count': serializers.IntegerField(),
+            'sum': serializers.FloatField(),
+            'mean': serializers.FloatField(),
+            'percentiles': serializers.DictField(
+                child=serializers.FloatField()),
+            })
+        return annotate(
+            self.target_class,
+            parameters=[
+                AnalyticsQuerySerializer,
+                OpenApiParameter('dataset', str, OpenApiParameter.PATH,
+                                 enum=['contracts', 'events']),
+                OpenApiParameter('signed', bool),
+                OpenApiParameter('closed', bool),
+                ],
+            responses=inline_serializer('Analytics', {
+                'groups': serializers.ListField(child=stats),
+                'histogram': inline_serializer('AnalyticsHistogram', {
+                    'edges': serializers.ListField(
+                        child=serializers.FloatField()),
+                    'counts': serializers.ListField(
+                        child=serializers.IntegerField()),
+                    }, required=False),
+                'generated_at': serializers.DateTimeField(),
+                }))
+
+
+class CollectionsViewSchema(OpenApiViewExtension):
+    target_class = 'report.views.CollectionsView'
+
+    def view_replacement(self):
+        return annotate(
+            self.target_class,
+            responses=inline_serializer('Collections', {
+                'date': serializers.DateField(),
+                'sales_contacts': amounts('CollectionsSalesContact', {
+                    'sales_contact': serializers.IntegerField(),
+                    'email': serializers.EmailField(),
+                    }),
+                'customers': amounts('CollectionsCustomer', {
+                    'customer': serializers.IntegerField(),
+                    'company': serializers.CharField(),
+                    }),
+                }))
+
+
+class DirectoryViewSchema(OpenApiViewExtension):
+    target_class = 'user.views.DirectoryView'
+
+    def view_replacement(self):
+        return annotate(
+            self.target_class,
+            parameters=[
+                OpenApiParameter('role', str, enum=list(ROLES)),
+                OpenApiParameter('search', str,
+                                 description='Start of the email, first or '
+                                             'last name.'),
+                OpenApiParameter('active', str,
+                                 enum=['true', 'false', 'all']),
+                ],
+            responses=inline_serializer('DirectoryUser', {
+                'id': serializers.IntegerField(),
+                'email': serializers.EmailField(),
+                'first_name': serializers.CharField(),
+                'last_name': serializers.CharField(),
+                'role': serializers.CharField(),
+                'is_active': serializers.BooleanField(),
+                }, many=True))
+
+
+class TransferViewSchema(OpenApiViewExtension):
+    target_class = 'user.views.TransferView'
+
+    def view_replacement(self):
+        return annotate(
+            self.target_class,
+            request=TransferSerializer,
+            responses=inline_serializer('TransferResult', {
+                'customers': serializers.IntegerField(),
+                'contracts': serializers.IntegerField(),
+                'events': serializers.IntegerField(),
+                'targets': serializers.DictField(
+                    child=serializers.IntegerField()),
+                'progress': inline_serializer('TransferProgress', {
+                    'model': serializers.CharField(),
+                    'done': serializers.IntegerField(),
+                    'total': serializers.IntegerField(),
+                    }, many=True),
+                }))
@@ -0,0 +1,107 @@
+"""
+Maintenance of the sales pipeline summary.
+
+PipelineSummary holds, for every (sales_contact, month, signed) key, the
+number and total amount of the contracts created that month. The rows are
+adjusted in place when a contract is saved or deleted, and `refresh`
+recomputes any subset of them from the contracts in one grouped query.
+"""
+import decimal
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from core.models import ArchivedContract, Contract, PipelineSummary
+
+
+def month_of(value):
+    """Return the first day of the local month of a datetime."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def contribution(values):
+    """Return the summary key and amount a contract accounts for."""
+    if not values or values.get('date_created') is None:
+        return None
+    key = (values['sales_contact_id'], month_of(values['date_created']),
+           values['signed'])
+    return key, decimal.Decimal(str(values['amount']))
+
+
+def key_filter(key):
+    """Return the lookup matching a summary key."""
+    sales_contact_id, month, signed = key
+    return {'sales_contact_id': sales_contact_id, 'month': month,
+            'signed': signed}
+
+
+def apply(key, count, amount):
+    """Add count contracts worth amount to the summary row of key."""
+    rows = PipelineSummary.objects.filter(**key_filter(key))
+    changes = {'contract_count': F('contract_count') + count,
+               'total_amount': F('total_amount') + amount}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic(using=rows.db):
+            PipelineSummary.objects.create(contract_count=count,
+                                           total_amount=amount,
+                                           **key_filter(key))
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def record_change(before, after):
+    """Move a contract's contribution from its old to its new values."""
+    old, new = contribution(before), contribution(after)
+    if old == new:
+        return
+    if old is not None:
+        apply(old[0], -1, -old[1])
+    if new is not None:
+        apply(new[0], 1, new[1])
+
+
+def by_month(contracts):
+    """Annotate contracts with the month they are summarized in."""
+    return contracts.annotate(
+            month=TruncMonth('date_created', output_field=DateField()))
+
+
+def keys_of(contracts):
+    """Return a filter matching the summary keys of the given contracts."""
+    keys = Q(pk__in=[])
+    for key in by_month(contracts).values(
+            'sales_contact_id', 'month', 'signed').distinct().order_by():
+        keys |= Q(**key)
+    return keys
+
+
+def refresh(keys=None):
+    """
+    Recompute the summary rows matching keys, as returned by keys_of, or
+    every row when keys is None, from the live and archived contracts. Used
+    after set-based updates of contracts, which do not send signals, and to
+    reconcile the whole table.
+    """
+    if keys is None:
+        keys = Q()
+    with transaction.atomic(using=router.db_for_write(PipelineSummary)):
+        PipelineSummary.objects.filter(keys).delete()
+        totals = {}
+        for contracts in (Contract.objects.all(),
+                          ArchivedContract.objects.all()):
+            for row in by_month(contracts).filter(keys).values(
+                    'sales_contact_id', 'month', 'signed').annotate(
+                    contract_count=Count('id'), total_amount=Sum('amount'),
+                    ).order_by():
+                key = (row['sales_contact_id'], row['month'], row['signed'])
+                if key in totals:
+                    totals[key]['contract_count'] += row['contract_count']
+                    totals[key]['total_amount'] += row['total_amount']
+                else:
+                    totals[key] = row
+        PipelineSummary.objects.bulk_create(
+                PipelineSummary(**row) for row in totals.values())
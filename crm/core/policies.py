@@ -0,0 +1,55 @@
+"""
+Ownership rules of the customers, contracts and events.
+
+Each rule is stated once, as the role allowed to write and the field of the
+user owning the rows, and compiled both into a Q filter, for the lists
+and the portfolio transfers, and into a check of a fetched object, for
+the permission classes.
+"""
+from django.db.models import Q
+
+
+class Policy:
+    """Who may change the rows of a model, and which rows are whose."""
+
+    def __init__(self, role, owner, mine=None):
+        self.role = role
+        self.owner = owner
+        self.mine = {role: owner, **(mine or {})}
+
+    def can_write(self, user):
+        """Return whether the user's role may change rows at all."""
+        return user.role == self.role
+
+    def write_filter(self, user):
+        """Return the filter of the rows the user may change."""
+        if not self.can_write(user):
+            return Q(pk__in=[])
+        return Q(**{f'{self.owner}_id': user.pk})
+
+    def can_write_object(self, user, obj):
+        """Return whether the user may change a fetched row."""
+        return (self.can_write(user) and
+                getattr(obj, f'{self.owner}_id') == user.pk)
+
+    def scope_filter(self, user, model):
+        """
+        Return the filter of the rows of model belonging to the user, as
+        owner or through the related rows of their role.
+        """
+        lookup = self.mine.get(user.role)
+        if lookup is None:
+            return Q(pk__in=[])
+        relation = model._meta.get_field(lookup.split('__')[0])
+        if relation.one_to_many or relation.many_to_many:
+            return Q(pk__in=model.objects.filter(
+                **{lookup: user.pk}).values('pk'))
+        return Q(**{lookup: user.pk})
+
+
+CUSTOMER = Policy('sales', 'sales_contact',
+                  mine={'support': 'event__support_contact'})
+CONTRACT = Policy('sales', 'sales_contact',
+                  mine={'support': 'event__support_contact'})
+EVENT = Policy('support', 'support_contact',
+               mine={'sales': 'contract__sales_contact'})
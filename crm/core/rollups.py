@@ -0,0 +1,125 @@
+"""
+Maintenance of the per-customer rollup columns.
+
+Customer.contract_count, signed_amount, open_event_count and last_activity
+summarize the contracts and events of a customer. They are adjusted in
+place by the signal receivers when a contract or an event is saved or
+deleted, and `refresh` recomputes them from the contracts and events.
+"""
+import decimal
+
+from django.db.models import (
+        Count,
+        DecimalField,
+        F,
+        IntegerField,
+        OuterRef,
+        Subquery,
+        Sum,
+        Value,
+        )
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from core.models import (
+        ArchivedContract,
+        ArchivedEvent,
+        Contract,
+        Customer,
+        Event,
+        )
+
+
+def apply(customer_id, activity, contracts=0, signed_amount=0,
+          open_events=0):
+    """Add the given deltas to the rollups of a customer."""
+    changes = {'last_activity': Greatest(F('last_activity'), Value(activity))}
+    if contracts:
+        changes['contract_count'] = F('contract_count') + contracts
+    if signed_amount:
+        changes['signed_amount'] = F('signed_amount') + signed_amount
+    if open_events:
+        changes['open_event_count'] = F('open_event_count') + open_events
+    Customer.objects.filter(pk=customer_id).update(**changes)
+
+
+def contract_contribution(values):
+    """Return the customer and signed amount a contract accounts for."""
+    if not values or values.get('customer_id') is None:
+        return None
+    amount = decimal.Decimal(str(values['amount']))
+    return values['customer_id'], amount if values['signed'] else 0
+
+
+def event_contribution(values):
+    """Return the customer and open event count an event accounts for."""
+    if not values or values.get('customer_id') is None:
+        return None
+    return values['customer_id'], 0 if values['event_closed'] else 1
+
+
+def record_contract_change(before, after):
+    """Move a contract's contribution from its old to its new customer."""
+    old, new = contract_contribution(before), contract_contribution(after)
+    activity = (after or {}).get('date_updated') or timezone.now()
+    if old is not None and (new is None or old[0] != new[0]):
+        apply(old[0], activity, contracts=-1, signed_amount=-old[1])
+        old = None
+    if new is not None:
+        if old is None:
+            apply(new[0], activity, contracts=1, signed_amount=new[1])
+        else:
+            apply(new[0], activity, signed_amount=new[1] - old[1])
+
+
+def record_event_change(before, after):
+    """Move an event's contribution from its old to its new customer."""
+    old, new = event_contribution(before), event_contribution(after)
+    activity = (after or {}).get('date_updated') or timezone.now()
+    if old is not None and (new is None or old[0] != new[0]):
+        apply(old[0], activity, open_events=-old[1])
+        old = None
+    if new is not None:
+        apply(new[0], activity,
+              open_events=new[1] - (old[1] if old is not None else 0))
+
+
+def _subquery(queryset, aggregate, output_field):
+    return Coalesce(Subquery(
+        queryset.filter(customer=OuterRef('pk')).order_by().values(
+            'customer').annotate(total=aggregate).values('total')),
+        Value(0), output_field=output_field)
+
+
+def _last_update(queryset):
+    return Subquery(queryset.filter(customer=OuterRef('pk')).order_by(
+        '-date_updated').values('date_updated')[:1])
+
+
+def refresh(customers=None):
+    """
+    Recompute the rollups of the given customers, or of all of them, in a
+    single UPDATE, counting the archived contracts and events. Used after
+    set-based updates, which do not send signals, and to reconcile the
+    columns.
+    """
+    if customers is None:
+        customers = Customer.objects.all()
+    amount = DecimalField(max_digits=14, decimal_places=2)
+    return customers.update(
+        contract_count=(
+            _subquery(Contract.objects, Count('id'), IntegerField()) +
+            _subquery(ArchivedContract.objects, Count('id'),
+                      IntegerField())),
+        signed_amount=(
+            _subquery(Contract.objects.filter(signed=True), Sum('amount'),
+                      amount) +
+            _subquery(ArchivedContract.objects.filter(signed=True),
+                      Sum('amount'), amount)),
+        open_event_count=_subquery(Event.objects.filter(event_closed=False),
+                                   Count('id'), IntegerField()),
+        last_activity=Greatest(
+            _last_update(Contract.objects), _last_update(Event.objects),
+            _last_update(ArchivedContract.objects),
+            _last_update(ArchivedEvent.objects)),
+        )
@@ -0,0 +1,67 @@
+"""
+Database router of the sharded deployment, see core.sharding.
+"""
+from core import sharding
+
+# Models whose rows live on the shard of their customer, the others being
+# kept on the default database. The users are written to the default
+# database and replicated to the shards.
+SHARDED_MODELS = frozenset((
+    'core.customer', 'core.contract', 'core.event', 'core.company',
+    'core.archivedcontract', 'core.archivedevent', 'core.eventnote',
+    'core.pipelinesummary', 'core.tombstone', 'core.auditentry',
+    ))
+REPLICATED_MODELS = frozenset(('core.user',))
+
+
+def label(model):
+    """Return the lower case app_label.model_name of a model."""
+    return model._meta.label_lower
+
+
+class ShardRouter:
+    """
+    Send the sharded models to the shard of the row at hand, of the row
+    they are read through, or pinned for the request. The users are written
+    to the default database and read from any shard.
+    """
+
+    def db_for_shard(self, model, instance):
+        if instance is not None and label(type(instance)) in SHARDED_MODELS:
+            if instance._state.adding and type(instance) is model:
+                shard = sharding.shard_for(instance)
+                if shard is not None:
+                    return shard
+            if instance._state.db:
+                return instance._state.db
+        return sharding.current_shard.get()
+
+    def db_for_read(self, model, **hints):
+        if label(model) in SHARDED_MODELS:
+            return self.db_for_shard(model, hints.get('instance'))
+        if label(model) in REPLICATED_MODELS:
+            instance = hints.get('instance')
+            if instance is not None and instance._state.db:
+                return instance._state.db
+            return sharding.current_shard.get() or 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        if label(model) in SHARDED_MODELS:
+            return self.db_for_shard(model, hints.get('instance'))
+        if label(model) in REPLICATED_MODELS:
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        Allow the relations to the users, present on every shard, and of
+        the new rows, written to the shard of their key when saved.
+        """
+        labels = {label(type(obj1)), label(type(obj2))}
+        if labels & REPLICATED_MODELS:
+            return True
+        if labels <= SHARDED_MODELS and (obj1._state.adding or
+                                         obj2._state.adding):
+            return True
+        return None
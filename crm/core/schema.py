@@ -0,0 +1,140 @@
+"""
+OpenAPI schema served as a precomputed document.
+
+The schema is written to OPENAPI_SCHEMA_DIR at deploy time by the
+`generate_schema` command. When the files are missing it is generated on
+the first request instead. Either way it is kept in memory by each process
+with its gzipped version and ETag, and drf-spectacular is only imported
+when the schema has to be generated or the Swagger UI is requested: the
+views keep DRF's default schema class, the generator giving each of them
+drf-spectacular's AutoSchema, and the annotations of core.openapi are only
+loaded then.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from core import metrics
+
+
+FORMATS = {
+    'yaml': 'application/vnd.oai.openapi; charset=utf-8',
+    'json': 'application/vnd.oai.openapi+json; charset=utf-8',
+}
+
+_lock = threading.Lock()
+_documents = {}
+_docs_view = None
+
+
+def generate():
+    """Return the schema rendered in every format."""
+    from drf_spectacular.generators import SchemaGenerator
+    from drf_spectacular.openapi import AutoSchema
+    from drf_spectacular.renderers import (
+            OpenApiJsonRenderer,
+            OpenApiYamlRenderer,
+            )
+
+    from core import openapi  # noqa: F401 registers the view annotations
+
+    class Generator(SchemaGenerator):
+        """Generator describing every view with drf-spectacular."""
+
+        def create_view(self, callback, method, request=None):
+            view = super().create_view(callback, method, request)
+            if not isinstance(view.schema, AutoSchema):
+                self._set_schema_to_view(view, AutoSchema())
+            return view
+
+    schema = Generator().get_schema(request=None, public=True)
+    return {
+            'yaml': OpenApiYamlRenderer().render(schema, renderer_context={}),
+            'json': OpenApiJsonRenderer().render(schema, renderer_context={}),
+            }
+
+
+def write(directory):
+    """Generate the schema and write one file per format to directory."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for schema_format, content in generate().items():
+        path = os.path.join(directory, f'schema.{schema_format}')
+        with open(path, 'wb') as schema_file:
+            schema_file.write(content)
+        paths.append(path)
+    return paths
+
+
+def _read():
+    directory = settings.OPENAPI_SCHEMA_DIR
+    try:
+        contents = {}
+        for schema_format in FORMATS:
+            path = os.path.join(directory, f'schema.{schema_format}')
+            with open(path, 'rb') as schema_file:
+                contents[schema_format] = schema_file.read()
+        return contents
+    except OSError:
+        return None
+
+
+def get_documents():
+    """Return the memoized schema documents of the process."""
+    if _documents:
+        metrics.cache_hit('openapi_schema')
+        return _documents
+    with _lock:
+        if not _documents:
+            metrics.cache_miss('openapi_schema')
+            contents = _read() or generate()
+            for schema_format, content in contents.items():
+                _documents[schema_format] = {
+                        'content': content,
+                        'gzip': gzip.compress(content),
+                        'etag': '"{}"'.format(
+                            hashlib.sha1(content).hexdigest()),
+                        }
+    return _documents
+
+
+def clear():
+    """Forget the memoized schema."""
+    _documents.clear()
+
+
+def schema_view(request):
+    """Serve the OpenAPI schema in YAML, or JSON when asked for."""
+    schema_format = request.GET.get('format')
+    if schema_format not in FORMATS:
+        accept = request.headers.get('Accept', '')
+        schema_format = 'json' if 'json' in accept else 'yaml'
+    document = get_documents()[schema_format]
+    if document['etag'] in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(document['gzip'],
+                                content_type=FORMATS[schema_format])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(document['content'],
+                                content_type=FORMATS[schema_format])
+    response['ETag'] = document['etag']
+    response['Cache-Control'] = 'public, max-age=300'
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
+
+
+def docs_view(request, *args, **kwargs):
+    """Serve the Swagger UI, importing drf-spectacular on first use."""
+    global _docs_view
+    if _docs_view is None:
+        from drf_spectacular.views import SpectacularSwaggerView
+
+        _docs_view = SpectacularSwaggerView.as_view(url_name='schema')
+    return _docs_view(request, *args, **kwargs)
@@ -0,0 +1,262 @@
+"""
+Sharding of the customers, contracts and events over several databases.
+
+The shards are the databases of settings.SHARDS, the default one first,
+added with the DB_SHARDS environment variable. A customer lives on the
+shard of its sales contact, and its contracts and events on the shard of
+the customer, so that a customer's rows and the derived tables (pipeline
+summary, tombstones, audit trail) are always read and written together.
+The users are replicated to every shard, for the foreign keys.
+
+Each shard hands out the ids of its own range of SHARD_ID_RANGE ids, its
+sequences being moved there by migration 0027 and capped at its end by
+0031, so the shard of a row is known from its id alone: a detail or
+nested route is served by one shard, pinned for the request with `pinned`.
+Lists outside of a pinned shard run on every shard, the rows being merged
+in the order of the query.
+"""
+import contextlib
+import contextvars
+import copy
+import heapq
+import itertools
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, OrderBy
+
+# Ids per shard. The range was sized for the int object ids of the
+# tombstones and audit entries, which are bigint since 0029 and 0030, but
+# the ids already handed out by the shards depend on it: it cannot change
+# without renumbering them, nor can the order of settings.SHARDS.
+SHARD_ID_RANGE = 2 ** 28
+
+current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+def aliases():
+    """Return the database aliases of the shards."""
+    return settings.SHARDS
+
+
+def is_sharded():
+    """Return whether the rows are spread over several databases."""
+    return len(aliases()) > 1
+
+
+def shard_of_id(pk):
+    """Return the shard holding the row with id pk, None if unknown."""
+    try:
+        index = int(pk) // SHARD_ID_RANGE
+    except (TypeError, ValueError):
+        return None
+    shards = aliases()
+    return shards[index] if 0 <= index < len(shards) else None
+
+
+def shard_of_user(user_id):
+    """Return the shard of the customers of a sales contact."""
+    shards = aliases()
+    return shards[(user_id or 0) % len(shards)]
+
+
+def shard_for(instance):
+    """
+    Return the shard a new customer, contract or event is written to, None
+    for the other models.
+    """
+    if not is_sharded():
+        return None
+    name = instance._meta.model_name
+    if name == 'customer':
+        return shard_of_user(instance.sales_contact_id)
+    if name in ('contract', 'event', 'archivedcontract', 'archivedevent'):
+        if instance.customer_id is not None:
+            return shard_of_id(instance.customer_id)
+        if name in ('contract', 'archivedcontract'):
+            return shard_of_user(instance.sales_contact_id)
+    return None
+
+
+@contextlib.contextmanager
+def pinned(alias):
+    """Send the queries of the sharded models to alias, if not None."""
+    if alias is None:
+        yield
+        return
+    token = current_shard.set(alias)
+    try:
+        yield
+    finally:
+        current_shard.reset(token)
+
+
+def each():
+    """Iterate over the shards, pinning each one in turn."""
+    for alias in aliases():
+        with pinned(alias):
+            yield alias
+
+
+@contextlib.contextmanager
+def locked(key):
+    """
+    Serialize the blocks holding the same key, whatever their shard, with a
+    transaction advisory lock on the default database. The unique indexes
+    of a shard only see its own rows: a check made on every shard holds
+    until the block ends. Nothing is locked when the rows are not sharded.
+    """
+    if not is_sharded():
+        yield
+        return
+    with transaction.atomic(using='default'):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))',
+                           [key])
+        yield
+
+
+def replicate(users):
+    """Copy users to every shard but the default database."""
+    users = list(users)
+    if not users:
+        return
+    model = type(users[0])
+    fields = [field.name for field in model._meta.concrete_fields
+              if not field.primary_key]
+    for alias in aliases()[1:]:
+        model.objects.using(alias).bulk_create(
+            [copy.copy(user) for user in users], update_conflicts=True,
+            unique_fields=['id'], update_fields=fields)
+
+
+def unreplicate(user):
+    """Delete a user from every shard but the default database."""
+    for alias in aliases()[1:]:
+        type(user).objects.using(alias).filter(pk=user.pk).delete()
+
+
+def ordering(queryset):
+    """
+    Return the (field, descending, nulls_first) of the ordering of
+    queryset, by id when it has none.
+    """
+    fields = (queryset.query.order_by or queryset.model._meta.ordering or
+              ('pk',))
+    keys = []
+    for field in fields:
+        if isinstance(field, str):
+            field = (F(field[1:]).desc() if field.startswith('-')
+                     else F(field).asc())
+        if not isinstance(field, OrderBy) or not isinstance(
+                field.expression, F):
+            raise ValueError(field)
+        descending = field.descending
+        if field.nulls_first:
+            nulls_first = True
+        elif field.nulls_last:
+            nulls_first = False
+        else:
+            nulls_first = descending
+        name = field.expression.name
+        if name == 'pk':
+            name = queryset.model._meta.pk.attname
+        keys.append((name, descending, nulls_first))
+    return keys
+
+
+def value(row, field):
+    """Return the value of a field, possibly across relations, of a row."""
+    for name in field.split('__'):
+        row = getattr(row, name) if row is not None else None
+    return row
+
+
+class SortKey:
+    """Key sorting the rows as the database ordered them."""
+    __slots__ = ('values', 'keys')
+
+    def __init__(self, values, keys):
+        self.values = values
+        self.keys = keys
+
+    def __lt__(self, other):
+        for mine, theirs, (_, descending, nulls_first) in zip(
+                self.values, other.values, self.keys):
+            if mine == theirs:
+                continue
+            if mine is None:
+                return nulls_first
+            if theirs is None:
+                return not nulls_first
+            return mine > theirs if descending else mine < theirs
+        return False
+
+
+class Merge:
+    """
+    The rows of a queryset on every shard, merged in the queryset's order,
+    counted and sliced lazily: a page fetches at most offset + limit rows
+    of each shard.
+    """
+    ordered = True
+
+    def __init__(self, queryset):
+        self.keys = ordering(queryset)
+        if not queryset.ordered:
+            queryset = queryset.order_by(*(
+                f'-{name}' if descending else name
+                for name, descending, _ in self.keys))
+        self.model = queryset.model
+        self.querysets = [queryset.using(alias) for alias in aliases()]
+        self._count = None
+
+    def count(self):
+        """Return the number of rows of every shard."""
+        if self._count is None:
+            self._count = sum(queryset.count()
+                              for queryset in self.querysets)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def key(self, row):
+        """Return the sort key of a row."""
+        return SortKey([value(row, name) for name, _, _ in self.keys],
+                       self.keys)
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        if stop <= start:
+            return []
+        rows = heapq.merge(*(queryset[:stop] for queryset in self.querysets),
+                           key=self.key)
+        return list(itertools.islice(rows, start, stop))
+
+    def iterator(self, chunk_size=2000):
+        """Iterate over the merged rows, chunk_size rows of each shard."""
+        return heapq.merge(*(queryset.iterator(chunk_size=chunk_size)
+                             for queryset in self.querysets), key=self.key)
+
+
+def spread(queryset):
+    """
+    Return queryset on every shard, or only queryset when the rows are not
+    sharded or a shard is pinned.
+    """
+    if not is_sharded() or current_shard.get() is not None:
+        return [queryset]
+    return [queryset.using(alias) for alias in aliases()]
+
+
+def scatter(queryset):
+    """
+    Return queryset, or its merge over every shard when the rows are
+    sharded and no shard is pinned.
+    """
+    if not is_sharded() or current_shard.get() is not None:
+        return queryset
+    return Merge(queryset)
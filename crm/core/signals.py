@@ -0,0 +1,179 @@
+"""
+Signal receivers keeping the derived tables in sync with the models.
+"""
+from django.db.models.signals import (
+        post_delete,
+        post_migrate,
+        post_save,
+        pre_migrate,
+        )
+from django.dispatch import receiver
+
+from core import (
+        audit,
+        directory,
+        identity,
+        notes,
+        notifications,
+        pipeline,
+        rollups,
+        sharding,
+        )
+from core.models import (
+        ArchivedEvent,
+        Contract,
+        Customer,
+        Event,
+        EventNote,
+        Tombstone,
+        User,
+        )
+
+
+@receiver(post_save, sender=Contract)
+def contract_saved(sender, instance, created, **kwargs):
+    """Move the contract's amount to its new pipeline and customer rows."""
+    before, after = instance.loaded_values(), instance.current_values()
+    pipeline.record_change(before, after)
+    rollups.record_contract_change(before, after)
+    audit.record(instance, 'create' if created else 'update', before, after)
+    if (after.get('signed') and not before.get('signed')
+            and instance.event_id is not None):
+        notifications.notify(instance.event.support_contact_id,
+                             'contract.signed', using=instance._state.db,
+                             contract=instance.pk, event=instance.event_id,
+                             customer=instance.customer_id)
+
+
+@receiver(post_delete, sender=Contract)
+def contract_deleted(sender, instance, **kwargs):
+    """Remove the contract's amount from the pipeline and its customer."""
+    if instance.deleted_at is not None:
+        return
+    before = instance.loaded_values() or instance.current_values()
+    pipeline.record_change(before, None)
+    rollups.record_contract_change(before, None)
+    audit.record(instance, 'delete', before, None)
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created, **kwargs):
+    """
+    Write the notes set on the event, update the open event count of its
+    customer and notify its support contact. New events are notified with
+    their signed contract.
+    """
+    before, after = instance.loaded_values(), instance.current_values()
+    if instance.__dict__.pop('_notes_changed', False):
+        previous = notes.store(instance)
+        if not created:
+            before = {**before, 'notes': previous}
+        after = {**after, 'notes': instance.notes}
+    rollups.record_event_change(before, after)
+    audit.record(instance, 'create' if created else 'update', before, after)
+    if created:
+        return
+    if before.get('support_contact_id') != after.get('support_contact_id'):
+        kind = 'event.assigned'
+    elif after.get('event_closed') and not before.get('event_closed'):
+        kind = 'event.closed'
+    else:
+        kind = 'event.updated'
+    notifications.notify(instance.support_contact_id, kind,
+                         using=instance._state.db, event=instance.pk,
+                         customer=instance.customer_id)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    """Remove the event from the open event count of its customer."""
+    if instance.deleted_at is not None:
+        return
+    before = instance.loaded_values() or instance.current_values()
+    rollups.record_event_change(before, None)
+    audit.record(instance, 'delete', before, None)
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=ArchivedEvent)
+def event_removed(sender, instance, **kwargs):
+    """Remove the notes of an event deleted for good."""
+    if getattr(instance, 'deleted_at', None) is None:
+        EventNote.objects.using(instance._state.db).filter(
+            pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, **kwargs):
+    """Record the changed fields of the customer."""
+    audit.record(instance, 'create' if created else 'update',
+                 instance.loaded_values(), instance.current_values())
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    """Record the values of the deleted customer."""
+    if instance.deleted_at is not None:
+        return
+    audit.record(instance, 'delete', instance.loaded_values() or
+                 instance.current_values(), None)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Contract)
+@receiver(post_delete, sender=Event)
+def record_tombstone(sender, instance, **kwargs):
+    """
+    Remember the deletion for the clients synchronizing the lists, unless
+    it was already recorded when the row was soft deleted.
+    """
+    if instance.deleted_at is not None:
+        return
+    Tombstone.objects.create(model=sender._meta.model_name,
+                             object_id=instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """Clear the staff directory of the process, unless on login."""
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        directory.clear()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, using, **kwargs):
+    """Replicate the user to the shards, for the keys of their rows."""
+    if using == 'default':
+        sharding.replicate([instance])
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    """Delete the user from the shards."""
+    if using == 'default':
+        sharding.unreplicate(instance)
+
+
+@receiver(pre_migrate)
+def migration_started(sender, using, **kwargs):
+    """Send the queries of the data migrations to the migrated shard."""
+    sharding.current_shard.set(using)
+
+
+@receiver(post_migrate)
+def migration_ended(sender, using, **kwargs):
+    """Unpin the migrated shard."""
+    sharding.current_shard.set(None)
+
+
+@receiver(post_save)
+def row_saved(sender, instance, **kwargs):
+    """Replace the saved row in the identity map of the request."""
+    identity.refresh(instance)
+
+
+@receiver(post_delete)
+def row_deleted(sender, instance, **kwargs):
+    """Drop the deleted row from the identity map of the request."""
+    identity.discard(sender, [instance.pk])
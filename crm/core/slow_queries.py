@@ -0,0 +1,127 @@
+"""
+Capture of the slow database queries.
+
+The recorder is installed around the request by SlowQueryMiddleware. Every
+query slower than SLOW_QUERY_THRESHOLD_MS is stored in SlowQuery together
+with the view that issued it, and aggregated by normalized SQL fingerprint in
+SlowQueryFingerprint. A sample of the slow SELECT statements, chosen with
+SLOW_QUERY_EXPLAIN_RATE, is run again with EXPLAIN (ANALYZE, BUFFERS).
+Neither keeps the values of the query, which may be emails, phone numbers
+or password hashes: the normalized SQL is stored, and the strings of the
+plans are masked.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+logger = logging.getLogger('django')
+
+_state = threading.local()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Replace the literals and placeholders of a query by '?'."""
+    sql = _STRING.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def mask(plan):
+    """Replace the string literals of an EXPLAIN plan by '?'."""
+    return _STRING.sub('?', plan)
+
+
+def fingerprint(sql):
+    """Return the normalized query and its hash."""
+    normalized = normalize(sql)
+    return normalized, hashlib.md5(normalized.encode()).hexdigest()
+
+
+class SlowQueryRecorder:
+    """Database execute wrapper recording the queries over the threshold."""
+
+    def __init__(self, view=''):
+        self.view = view
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'active', False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            _state.active = True
+            try:
+                self.record(context, sql, params, many, duration)
+            except Exception:
+                logger.exception('Could not record a slow query.')
+            finally:
+                _state.active = False
+        return result
+
+    def explain(self, context, sql, params, many):
+        """Return the EXPLAIN (ANALYZE, BUFFERS) plan of a sampled query."""
+        connection = context['connection']
+        if (many or connection.vendor != 'postgresql' or
+                not sql.lstrip().upper().startswith('SELECT') or
+                random.random() >= settings.SLOW_QUERY_EXPLAIN_RATE):
+            return None
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+                return mask('\n'.join(row[0] for row in cursor.fetchall()))
+
+    def record(self, context, sql, params, many, duration):
+        """Store the slow query and update its fingerprint statistics."""
+        from core.models import SlowQuery, SlowQueryFingerprint
+
+        connection = context['connection']
+        if connection.needs_rollback:
+            return
+        normalized, digest = fingerprint(sql)
+        plan = self.explain(context, sql, params, many)
+        now = timezone.now()
+        stats = {
+                'calls': F('calls') + 1,
+                'total_time': F('total_time') + duration,
+                'max_time': Greatest(F('max_time'), duration),
+                'last_view': self.view,
+                'last_seen': now,
+                }
+        if plan is not None:
+            stats['plan'] = plan
+        fingerprints = SlowQueryFingerprint.objects.filter(fingerprint=digest)
+        if not fingerprints.update(**stats):
+            try:
+                with transaction.atomic(using=connection.alias):
+                    SlowQueryFingerprint.objects.create(
+                            fingerprint=digest, sql=normalized, calls=1,
+                            total_time=duration, max_time=duration,
+                            last_view=self.view, last_seen=now, plan=plan)
+            except IntegrityError:
+                fingerprints.update(**stats)
+        sample = SlowQuery.objects.create(
+                fingerprint_id=SlowQueryFingerprint.objects.values_list(
+                    'id', flat=True).get(fingerprint=digest),
+                sql=normalized,
+                duration=duration, view=self.view, plan=plan)
+        SlowQuery.objects.filter(
+                id__lte=sample.id - settings.SLOW_QUERY_MAX_RECORDS).delete()
@@ -0,0 +1,179 @@
+"""
+Columnar snapshots of the contracts and events for analytics.
+
+`export` dumps every column into a typed NumPy array in a new directory of
+SNAPSHOT_DIR, then points the CURRENT file at it. Foreign keys are
+dictionary encoded: the column holds an index into the sorted array of the
+referenced ids (`users.npy`, `customers.npy`), -1 standing for NULL.
+Amounts are stored in cents and dates as datetime64[D], NULL dates as NaT.
+The columns are converted by the database and streamed in chunks into
+arrays allocated once, so no Python tuple of every row is built.
+`load` memory-maps the current snapshot, so the analytics never touch the
+database. Archived contracts and events are exported with the live ones,
+from every shard.
+"""
+import datetime
+import itertools
+import os
+import shutil
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db.models import BigIntegerField, F, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce, TruncDate
+from django.utils import timezone
+
+from core import sharding
+from core.models import ArchivedContract, ArchivedEvent, Contract, Event
+
+
+CURRENT = 'CURRENT'
+KEEP = 2
+CHUNK_SIZE = 10000
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+def _id(field):
+    return Coalesce(field, Value(-1), output_field=BigIntegerField())
+
+
+# The columns exported, as (expression, dtype): the database converts the
+# values, NULL ids becoming -1 and NULL dates None, which NumPy reads as NaT.
+CONTRACT_COLUMNS = {
+    'id': ('id', np.int64),
+    'sales_contact_id': (_id('sales_contact_id'), np.int64),
+    'customer_id': (_id('customer_id'), np.int64),
+    'signed': ('signed', bool),
+    'amount': (Cast(F('amount') * 100, BigIntegerField()), np.int64),
+    'payment_due': ('payment_due', 'datetime64[D]'),
+    'date_created': (TruncDate('date_created'), 'datetime64[D]'),
+}
+EVENT_COLUMNS = {
+    'id': ('id', np.int64),
+    'support_contact_id': (_id('support_contact_id'), np.int64),
+    'customer_id': (_id('customer_id'), np.int64),
+    'event_closed': ('event_closed', bool),
+    'attendees': (Coalesce('attendees', Value(-1),
+                           output_field=IntegerField()), np.int32),
+    'event_date': (TruncDate('event_date'), 'datetime64[D]'),
+}
+
+
+def encode(ids, dictionary):
+    """Return the codes of ids in the sorted dictionary, -1 for NULL."""
+    codes = np.searchsorted(dictionary, ids).astype(np.int32)
+    codes[ids < 0] = -1
+    return codes
+
+
+def _columns(querysets, columns):
+    """
+    Return the columns of the rows of querysets on every shard as arrays
+    allocated once for all the rows counted, filled chunk by chunk from a
+    server-side cursor.
+    """
+    shards = [shard_queryset.order_by('id').values_list(*(
+                  expression for expression, _ in columns.values()))
+              for queryset in querysets
+              for shard_queryset in sharding.spread(queryset.all())]
+    counts = [shard_queryset.count() for shard_queryset in shards]
+    arrays = {name: np.empty(sum(counts), dtype=dtype)
+              for name, (_, dtype) in columns.items()}
+    end = 0
+    for shard_queryset, count in zip(shards, counts):
+        # Rows inserted since the count are left to the next snapshot.
+        rows = itertools.islice(shard_queryset.iterator(
+            chunk_size=CHUNK_SIZE), count)
+        while chunk := list(itertools.islice(rows, CHUNK_SIZE)):
+            start, end = end, end + len(chunk)
+            for array, values in zip(arrays.values(), zip(*chunk)):
+                array[start:end] = values
+    return {name: array[:end] for name, array in arrays.items()}
+
+
+def export(directory=None):
+    """Write a new snapshot and make it the current one."""
+    directory = directory or settings.SNAPSHOT_DIR
+    name = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    contracts = _columns((Contract.objects, ArchivedContract.objects),
+                         CONTRACT_COLUMNS)
+    events = _columns((Event.objects, ArchivedEvent.objects), EVENT_COLUMNS)
+
+    contract_sales = contracts['sales_contact_id']
+    contract_customers = contracts['customer_id']
+    event_support = events['support_contact_id']
+    event_customers = events['customer_id']
+    users = np.unique(np.concatenate([contract_sales, event_support]))
+    users = users[users >= 0]
+    customers = np.unique(np.concatenate([contract_customers,
+                                          event_customers]))
+    customers = customers[customers >= 0]
+
+    columns = {
+        'users': users,
+        'customers': customers,
+        'contract_id': contracts['id'],
+        'contract_sales_contact': encode(contract_sales, users),
+        'contract_customer': encode(contract_customers, customers),
+        'contract_signed': contracts['signed'],
+        'contract_amount': contracts['amount'],
+        'contract_payment_due': contracts['payment_due'],
+        'contract_date_created': contracts['date_created'],
+        'event_id': events['id'],
+        'event_support_contact': encode(event_support, users),
+        'event_customer': encode(event_customers, customers),
+        'event_closed': events['event_closed'],
+        'event_attendees': events['attendees'],
+        'event_date': events['event_date'],
+    }
+    for column, values in columns.items():
+        np.save(os.path.join(path, f'{column}.npy'), values)
+
+    pointer = os.path.join(directory, CURRENT)
+    with open(f'{pointer}.tmp', 'w') as pointer_file:
+        pointer_file.write(name)
+    os.replace(f'{pointer}.tmp', pointer)
+    snapshots = sorted(entry for entry in os.listdir(directory)
+                       if os.path.isdir(os.path.join(directory, entry)))
+    for old in snapshots[:-KEEP]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return path
+
+
+class Snapshot:
+    """The memory-mapped columns of a snapshot."""
+
+    def __init__(self, path, name):
+        self.name = name
+        self.generated_at = datetime.datetime.strptime(
+            name, '%Y%m%dT%H%M%S%f').replace(tzinfo=datetime.timezone.utc)
+        self.columns = {}
+        for filename in os.listdir(path):
+            if filename.endswith('.npy'):
+                self.columns[filename[:-4]] = np.load(
+                    os.path.join(path, filename), mmap_mode='r')
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+
+def load(directory=None):
+    """Return the current snapshot, None when none was exported."""
+    directory = directory or settings.SNAPSHOT_DIR
+    try:
+        with open(os.path.join(directory, CURRENT)) as pointer_file:
+            name = pointer_file.read().strip()
+    except OSError:
+        return None
+    snapshot = _loaded.get(directory)
+    if snapshot is None or snapshot.name != name:
+        with _lock:
+            snapshot = Snapshot(os.path.join(directory, name), name)
+            _loaded[directory] = snapshot
+    return snapshot
@@ -0,0 +1,197 @@
+"""
+Soft deletion of customers, contracts and events.
+
+Deleting a row only sets its deleted_at, in one UPDATE instead of the
+collector loading every related row, and the row can be restored. The rows
+Django would have cascaded the deletion to, the events of a customer and
+the contracts of those events, keep theirs: the default managers hide them
+through a join on the deleted row. As UPDATE sends no signal, the pipeline
+summary and customer rollups are refreshed, and the tombstones of the
+hidden rows and the audit entry of the deleted one are written here.
+
+The purge_deleted command removes the rows deleted more than
+SOFT_DELETE_RETENTION_DAYS ago for good, in batches, with the rows they
+hide, applying the on_delete rules of the foreign keys with plain SQL: no
+signal is sent, the purge records the deletion of the hidden rows in the
+audit trail.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from core import audit, bulk, pipeline, rollups, sharding
+from core.models import (
+        ArchivedContract,
+        ArchivedEvent,
+        Contract,
+        Customer,
+        Event,
+        EventNote,
+        Tombstone,
+        )
+
+BATCH_SIZE = 1000
+
+
+def hidden(model, ids):
+    """
+    Return, per model, the live rows the deletion of the rows of model with
+    the given ids hides, those rows included.
+    """
+    querysets = {model: model.objects.filter(pk__in=ids)}
+    if model is Customer:
+        querysets[Event] = Event.objects.filter(customer_id__in=ids)
+        querysets[Contract] = Contract.objects.filter(
+            event__customer_id__in=ids)
+    elif model is Event:
+        querysets[Contract] = Contract.objects.filter(event_id__in=ids)
+    return querysets
+
+
+def bury(queryset, now):
+    """Record the tombstones of the rows of queryset, in one INSERT."""
+    sql, params = queryset.values('pk').query.get_compiler(
+        queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Tombstone._meta.db_table} '
+            f'(model, object_id, date_deleted) '
+            f'SELECT %s, id, %s FROM ({sql}) hidden',
+            [queryset.model._meta.model_name, now, *params])
+
+
+def refresh(model, ids, keys):
+    """Refresh the pipeline keys and the rollups of the touched customers."""
+    pipeline.refresh(keys)
+    if model is Customer:
+        customers = Customer.objects.filter(pk__in=ids)
+    else:
+        customers = Customer.objects.filter(pk__in=model.all_objects.filter(
+            pk__in=ids).values('customer_id'))
+    rollups.refresh(customers)
+
+
+def delete(queryset):
+    """
+    Hide the rows of queryset, and the rows their deletion cascades to.
+    Return the number of rows deleted and their number per model, as
+    QuerySet.delete does.
+    """
+    now = timezone.now()
+    model = queryset.model
+    using = queryset.db
+    with transaction.atomic(using=using), sharding.pinned(using):
+        rows = list(queryset.filter(deleted_at__isnull=True).values())
+        ids = [row['id'] for row in rows]
+        if not ids:
+            return 0, {}
+        querysets = hidden(model, ids)
+        keys = pipeline.keys_of(querysets.get(Contract,
+                                              Contract.objects.none()))
+        for hidden_rows in querysets.values():
+            bury(hidden_rows, now)
+        audit.record_bulk(model, ((row['id'], row, None) for row in rows),
+                          action='delete')
+        count = bulk.update(model, ids, deleted_at=now)
+        refresh(model, ids, keys)
+    return count, {model._meta.label: count}
+
+
+def restore(queryset):
+    """
+    Bring back the deleted rows of queryset, and the rows their deletion
+    hid. Return the number of rows restored.
+    """
+    model = queryset.model
+    using = queryset.db
+    with transaction.atomic(using=using), sharding.pinned(using):
+        rows = list(queryset.filter(deleted_at__isnull=False).values_list(
+            'pk', 'deleted_at'))
+        ids = [pk for pk, _ in rows]
+        if not ids:
+            return 0
+        count = bulk.update(model, ids, deleted_at=None)
+        audit.record_bulk(model, (
+            (pk, {'deleted_at': deleted_at}, {'deleted_at': None})
+            for pk, deleted_at in rows))
+        querysets = hidden(model, ids)
+        for shown, shown_rows in querysets.items():
+            Tombstone.objects.filter(
+                model=shown._meta.model_name,
+                object_id__in=shown_rows.values('pk')).delete()
+            if shown is not model:
+                # Returned again to the clients which synchronized the
+                # tombstones.
+                shown_rows.update(date_updated=Now())
+        refresh(model, ids, pipeline.keys_of(querysets.get(
+            Contract, Contract.objects.none())))
+    return count
+
+
+def remove(model, ids):
+    """Delete the rows of model with the given ids."""
+    if not ids:
+        return 0
+    with connections[router.db_for_write(model)].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {model._meta.db_table} '
+                       f'WHERE id = ANY(%s)', [list(ids)])
+        return cursor.rowcount
+
+
+def purge_batch(model, ids):
+    """
+    Remove the rows of model with the given ids and the rows they hide,
+    applying the on_delete rules of the keys pointing to them, and record
+    the deletion of the hidden rows in the audit trail. Return the number
+    of rows removed.
+    """
+    ids = {Customer: [], Contract: [], Event: [], model: list(ids)}
+    if model is Customer:
+        ids[Event] = list(Event.all_objects.filter(
+            customer_id__in=ids[Customer]).values_list('id', flat=True))
+    if ids[Event]:
+        ids[Contract] += list(Contract.all_objects.filter(
+            event_id__in=ids[Event]).exclude(
+                pk__in=ids[Contract]).values_list('id', flat=True))
+    for hidden_model in (Event, Contract):
+        audit.record_bulk(hidden_model, (
+            (row['id'], row, None) for row in hidden_model.all_objects.filter(
+                pk__in=ids[hidden_model], deleted_at__isnull=True).values()),
+            action='delete')
+    archived_events = list(ArchivedEvent.objects.filter(
+        customer_id__in=ids[Customer]).values_list('id', flat=True))
+    Contract.all_objects.filter(customer_id__in=ids[Customer]).exclude(
+        pk__in=ids[Contract]).update(customer=None)
+    ArchivedContract.objects.filter(customer_id__in=ids[Customer]).update(
+        customer=None)
+    remove(ArchivedContract, ArchivedContract.objects.filter(
+        event_id__in=archived_events).values_list('id', flat=True))
+    remove(ArchivedEvent, archived_events)
+    remove(EventNote, archived_events + ids[Event])
+    return (remove(Contract, ids[Contract]) + remove(Event, ids[Event]) +
+            remove(Customer, ids[Customer]))
+
+
+def purge(days=None, batch_size=BATCH_SIZE):
+    """
+    Remove the contracts, events and customers deleted more than days ago.
+    Return the number of rows removed.
+    """
+    if days is None:
+        days = settings.SOFT_DELETE_RETENTION_DAYS
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    count = 0
+    for model in (Contract, Event, Customer):
+        while True:
+            with transaction.atomic(using=router.db_for_write(model)):
+                batch = list(model.all_objects.filter(
+                    deleted_at__lt=cutoff).select_for_update(
+                        skip_locked=True).order_by().values_list(
+                            'id', flat=True)[:batch_size])
+                if not batch:
+                    break
+                count += purge_batch(model, batch)
+    return count
@@ -0,0 +1,118 @@
+"""
+Server-Sent Events stream of the notifications of the authenticated user.
+
+A plain ASGI application mounted in front of Django by crm.asgi, so that an
+open stream only costs a coroutine waiting on its queue, not a worker
+thread. EventSource cannot send headers, so the JWT access token can also
+be given as the `token` query parameter. The stream is closed when the
+token expires or the user is found deactivated, which is checked every
+STREAM_USER_CHECK seconds.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import notifications
+
+STREAM_PATH = '/event/stream/'
+
+
+def authenticate(scope):
+    """
+    Return the user id and expiry timestamp of the access token of a
+    request, or None.
+    """
+    token = parse_qs(scope.get('query_string', b'').decode()).get(
+        'token', [None])[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization' and value.startswith(b'Bearer '):
+            token = value[7:].decode()
+    if not token:
+        return None
+    try:
+        token = AccessToken(token)
+        return token[api_settings.USER_ID_CLAIM], token['exp']
+    except (TokenError, KeyError):
+        return None
+
+
+@sync_to_async
+def is_active(user_id):
+    """Return whether the user exists and is active."""
+    return get_user_model().objects.filter(pk=user_id,
+                                           is_active=True).exists()
+
+
+def format_message(message):
+    """Return a notification as a Server-Sent Event."""
+    return (f'event: {message["type"]}\n'
+            f'data: {json.dumps(message)}\n\n').encode()
+
+
+async def wait_disconnect(receive):
+    """Return once the client went away."""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_application(scope, receive, send):
+    """
+    Stream the notifications of the user until they disconnect, their token
+    expires or they are deactivated.
+    """
+    credentials = authenticate(scope)
+    if credentials is None or not await is_active(credentials[0]):
+        await send({'type': 'http.response.start', 'status': 401,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps(
+            {'error': 'Authentication credentials were not provided.'},
+            ).encode()})
+        return
+    user_id, expires = credentials
+    notifications.start_listener()
+    queue = notifications.broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n',
+                    'more_body': True})
+        checked = time.time()
+        while not disconnected.done():
+            now = time.time()
+            if now >= expires:
+                break
+            if now >= checked + settings.STREAM_USER_CHECK:
+                if not await is_active(user_id):
+                    break
+                checked = now
+            wake = min(expires, checked + settings.STREAM_USER_CHECK)
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected},
+                timeout=min(settings.STREAM_HEARTBEAT, wake - now),
+                return_when=asyncio.FIRST_COMPLETED)
+            if message in done:
+                body = format_message(message.result())
+            else:
+                message.cancel()
+                if disconnected.done() or time.time() >= wake:
+                    continue
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        notifications.broker.unsubscribe(user_id, queue)
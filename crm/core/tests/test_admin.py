@@ -1,14 +1,25 @@
 """
 Test for the Django admin.
 """
+import datetime
+import itertools
+import unittest.mock
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
 
+from core import sharding
+from core.models import Company, Contract, Customer, Event
+
 
 class AdminSiteTests(TestCase):
     """Test for admin site."""
+    databases = '__all__'
 
     def setUp(self):
         """Setup."""
@@ -18,6 +29,7 @@ class AdminSiteTests(TestCase):
                 password="adminpass123",
                 )
         self.client.force_login(self.admin_user)
+        self.emails = itertools.count()
         self.management_user = get_user_model().objects.create_user(
                 email="management@example.com",
                 password="userpass123",
@@ -51,6 +63,35 @@ class AdminSiteTests(TestCase):
 
         self.assertEqual(res.status_code, 200)
 
+    def test_user_owning_rows_cannot_leave(self):
+        """Test a user owning customers cannot be deactivated or deleted."""
+        customer = Customer.objects.create(
+                first_name='Test Name', last_name='User',
+                email='customer@example.com', company='Test Company',
+                sales_contact=self.sales_user)
+        url = reverse("admin:core_user_change", args=[self.sales_user.id])
+        res = self.client.post(url, {
+            'email': self.sales_user.email, 'role': 'sales',
+            'is_active': '', 'password': self.sales_user.password})
+
+        self.assertContains(res, 'Transfer the portfolio of this user')
+        self.sales_user.refresh_from_db()
+        self.assertTrue(self.sales_user.is_active)
+
+        url = reverse("admin:core_user_delete", args=[self.sales_user.id])
+        res = self.client.post(url, {'post': 'yes'})
+
+        self.assertContains(res, '1 customers, contracts or open events')
+        self.assertTrue(get_user_model().objects.filter(
+            pk=self.sales_user.pk).exists())
+
+        customer.delete()
+        res = self.client.post(url, {'post': 'yes'})
+
+        self.assertEqual(res.status_code, 302)
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.sales_user.pk).exists())
+
     def test_create_user_page(self):
         """Test that the user create page works."""
         url = reverse("admin:core_user_add")
@@ -84,3 +125,93 @@ class AdminSiteTests(TestCase):
         res = sales_client.get(url)
 
         self.assertEqual(res.status_code, 302)
+
+    def test_slow_queries_listed(self):
+        """Test that the slow query fingerprints are listed."""
+        url = reverse("admin:core_slowqueryfingerprint_changelist")
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+
+    def create_contracts(self, count):
+        """Create count customers with a signed contract and its event."""
+        for index in range(count):
+            customer = Customer.objects.create(
+                    first_name='Test Name',
+                    last_name=f'User{index}',
+                    email=f'customer{next(self.emails)}@example.com',
+                    company='Test Company',
+                    sales_contact=self.sales_user,
+                    )
+            Contract.objects.create(
+                    sales_contact=self.sales_user, customer=customer,
+                    signed=True, amount=Decimal('1000.00'),
+                    payment_due=datetime.date.today(),
+                    event=Event.objects.create(
+                        customer=customer, support_contact=self.support_user))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test the changelists do not query the related rows per row."""
+        for name in ('contract', 'event', 'customer'):
+            url = reverse(f"admin:core_{name}_changelist")
+            counts = []
+            for rows in (1, 4):
+                self.create_contracts(rows)
+                with CaptureQueriesContext(connection) as queries:
+                    res = self.client.get(url)
+                self.assertEqual(res.status_code, 200)
+                counts.append(len(queries))
+            self.assertEqual(counts[0], counts[1], name)
+
+    def test_unfiltered_changelist_count_is_estimated(self):
+        """Test a large table is not counted row by row."""
+        self.create_contracts(2)
+        url = reverse("admin:core_contract_changelist")
+        with unittest.mock.patch('core.admin.estimated_count',
+                                 return_value=5000000):
+            res = self.client.get(url)
+            self.assertEqual(res.context['cl'].paginator.count,
+                             5000000 * len(sharding.aliases()))
+
+            res = self.client.get(url, {'q': 'User1'})
+            self.assertEqual(res.context['cl'].paginator.count, 1)
+
+    def test_capped_count_is_shown_as_a_floor(self):
+        """Test a filtered count stopped at the limit is shown with a +."""
+        self.create_contracts(3)
+        url = reverse("admin:core_contract_changelist")
+        with unittest.mock.patch('core.admin.EstimatedCountPaginator.'
+                                 'COUNT_LIMIT', 2):
+            res = self.client.get(url, {'q': 'User'})
+
+        self.assertEqual(res.context['cl'].paginator.count, 2)
+        self.assertContains(res, '2+ results')
+        self.assertContains(res, '2+ contracts')
+
+    def test_customer_search_uses_indexes(self):
+        """Test the admin searches on customers can use an index."""
+        company = Company.objects.create(name='Test Company')
+        Customer.objects.bulk_create(
+                Customer(first_name='Test', last_name=f'Name{index}',
+                         email=f'customer{index}@example.com',
+                         organization=company)
+                for index in range(2000))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_customer')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for lookups, index in (
+                ({'last_name__istartswith': 'Dup'},
+                 'customer_live_last_name_idx'),
+                ({'organization__name__istartswith': 'Epic'},
+                 'company_name_like_idx'),
+                ({'email__iexact': 'Test@example.com'},
+                 'customer_live_email_upper_idx')):
+            plan = Customer.objects.filter(**lookups).explain()
+            self.assertIn(index, plan)
+
+    def test_contract_form_uses_autocomplete(self):
+        """Test the foreign keys are not rendered as full dropdowns."""
+        res = self.client.get(reverse("admin:core_contract_add"))
+
+        self.assertContains(res, 'admin-autocomplete')
+        self.assertContains(res, 'vForeignKeyRawIdAdminField')
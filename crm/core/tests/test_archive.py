@@ -0,0 +1,102 @@
+"""
+Tests for the archival of the contracts and events.
+"""
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core import archive, pipeline, rollups, sharding
+from core.models import (
+        ArchivedContract,
+        ArchivedEvent,
+        Contract,
+        Customer,
+        Event,
+        PipelineSummary,
+        Tombstone,
+        )
+
+
+class ArchiveTests(TestCase):
+    """Test moving settled contracts and closed events to the archive."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.customer = Customer.objects.create(
+                first_name='Test Name',
+                last_name='User',
+                email='customer@example.com',
+                company='Test Company',
+                sales_contact=self.sales_user,
+                )
+        # The rows all live on the shard of the customer.
+        self.enterContext(sharding.pinned(self.customer._state.db))
+        self.old = timezone.now() - datetime.timedelta(days=400)
+
+    def create_contract(self, closed, age, **params):
+        """Create a signed contract and its event, last updated age ago."""
+        event = Event.objects.create(customer=self.customer,
+                                     event_closed=closed)
+        contract = Contract.objects.create(
+                sales_contact=self.sales_user, customer=self.customer,
+                signed=True, amount=Decimal('1000.00'), event=event,
+                payment_due=(timezone.now() - age).date(), **params)
+        updated = timezone.now() - age
+        Contract.objects.filter(pk=contract.pk).update(date_updated=updated)
+        Event.objects.filter(pk=event.pk).update(date_updated=updated)
+        return contract
+
+    def test_archive_moves_settled_contracts_and_closed_events(self):
+        """Test only the old signed contracts with a closed event move."""
+        settled = self.create_contract(True, datetime.timedelta(days=400))
+        open_event = self.create_contract(False,
+                                          datetime.timedelta(days=400))
+        recent = self.create_contract(True, datetime.timedelta(days=10))
+        lone_event = Event.objects.create(customer=self.customer,
+                                          event_closed=True)
+        Event.objects.filter(pk=lone_event.pk).update(date_updated=self.old)
+
+        out = io.StringIO()
+        call_command('archive', '--batch-size', '1', stdout=out)
+
+        self.assertIn('1 contracts and 2 events archived.', out.getvalue())
+        self.assertEqual(
+            set(Contract.objects.values_list('id', flat=True)),
+            {open_event.id, recent.id})
+        archived = ArchivedContract.objects.get()
+        self.assertEqual((archived.id, archived.event_id, archived.amount),
+                         (settled.id, settled.event_id, Decimal('1000.00')))
+        self.assertEqual(
+            set(ArchivedEvent.objects.values_list('id', flat=True)),
+            {settled.event_id, lone_event.id})
+        self.assertEqual(
+            set(Tombstone.objects.values_list('model', 'object_id')),
+            {('contract', settled.id), ('event', settled.event_id),
+             ('event', lone_event.id)})
+
+    def test_refresh_counts_archived_contracts(self):
+        """Test the derived tables keep counting the archived contracts."""
+        self.create_contract(True, datetime.timedelta(days=400))
+        archive.archive(days=365)
+
+        pipeline.refresh()
+        rollups.refresh()
+
+        self.assertEqual(
+            list(PipelineSummary.objects.values_list('contract_count',
+                                                     'total_amount')),
+            [(1, Decimal('1000.00'))])
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.contract_count,
+                          self.customer.signed_amount),
+                         (1, Decimal('1000.00')))
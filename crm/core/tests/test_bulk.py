@@ -0,0 +1,162 @@
+"""
+Tests for the set-based bulk changes and their admin actions.
+"""
+import datetime
+import unittest.mock
+from decimal import Decimal
+
+from django.contrib.admin import helpers
+from django.db import connections
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from core import bulk, sharding
+from core.models import (
+        AuditEntry,
+        Contract,
+        Customer,
+        Event,
+        PipelineSummary,
+        )
+
+
+class BulkTests(TestCase):
+    """Test the bulk reassignments, signatures and closures."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(get_user_model().objects.create_superuser(
+                email="admin@example.com",
+                password="adminpass123",
+                ))
+        self.sales_users = [
+                get_user_model().objects.create_user(
+                    email=f'sales{index}@example.com',
+                    role='sales',
+                    password='testpass',
+                    )
+                for index in range(2)]
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com',
+                role='support',
+                password='testpass',
+                )
+        # The rows all live on the shard of the sales contact.
+        self.db = sharding.shard_of_user(self.sales_users[0].pk)
+        self.enterContext(sharding.pinned(self.db))
+        # Flush the audit entries of the fixtures.
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            self.customer = Customer.objects.create(
+                    first_name='Test Name',
+                    last_name='User',
+                    email='customer@example.com',
+                    company='Test Company',
+                    sales_contact=self.sales_users[0],
+                    )
+            self.contracts = [
+                    Contract.objects.create(
+                        sales_contact=self.sales_users[0],
+                        customer=self.customer, amount=Decimal('1000.00'),
+                        payment_due=datetime.date.today())
+                    for _ in range(3)]
+
+    def post_action(self, action, ids, **data):
+        """Post an action of the contract changelist."""
+        return self.client.post(reverse("admin:core_contract_changelist"), {
+            'action': action, helpers.ACTION_CHECKBOX_NAME: ids, **data})
+
+    def test_reassign_action_asks_for_a_user(self):
+        """Test reassigning contracts in one UPDATE after choosing a user."""
+        ids = [contract.id for contract in self.contracts[:2]]
+        res = self.post_action('reassign_sales_contact', ids)
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, self.sales_users[1].email)
+        self.assertNotContains(res, self.support_user.email)
+
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            res = self.post_action('reassign_sales_contact', ids,
+                                   apply='Apply',
+                                   user=self.sales_users[1].id)
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(
+            set(Contract.objects.filter(
+                sales_contact=self.sales_users[1]).values_list(
+                    'id', flat=True)), set(ids))
+        self.assertEqual(
+            dict(PipelineSummary.objects.values_list('sales_contact_id',
+                                                     'contract_count')),
+            {self.sales_users[0].id: 1, self.sales_users[1].id: 2})
+        self.assertEqual(AuditEntry.objects.filter(
+            model='contract', action='update').count(), 2)
+
+    def test_delete_action_hides_the_rows_at_once(self):
+        """Test deleting contracts in one UPDATE after a confirmation."""
+        ids = [contract.id for contract in self.contracts[:2]]
+        res = self.post_action('delete_rows', ids)
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'will be deleted')
+        self.assertEqual(Contract.objects.count(), 3)
+
+        with CaptureQueriesContext(connections[self.db]) as queries:
+            res = self.post_action('delete_rows', ids, apply='Apply')
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(Contract.objects.values_list('id', flat=True)),
+                         [self.contracts[2].id])
+        self.assertEqual(Contract.all_objects.filter(
+            pk__in=ids, deleted_at__isnull=False).count(), 2)
+        self.assertFalse([query for query in queries
+                          if 'DELETE FROM "core_contract"' in query['sql']])
+
+    def test_delete_selected_is_not_offered(self):
+        """Test the per row delete_selected action is replaced."""
+        res = self.client.get(reverse("admin:core_contract_changelist"))
+
+        self.assertNotContains(res, 'value="delete_selected"')
+        self.assertContains(res, 'value="delete_rows"')
+
+    @unittest.mock.patch('core.notifications.publish')
+    def test_sign_contracts_creates_their_events(self, publish):
+        """Test signing creates the events and updates the rollups."""
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            count = bulk.sign_contracts(Contract.objects.all(),
+                                        self.support_user)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(Event.objects.filter(
+            support_contact=self.support_user).count(), 3)
+        self.assertFalse(Contract.objects.filter(event__isnull=True).exists())
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.signed_amount,
+                          self.customer.open_event_count),
+                         (Decimal('3000.00'), 3))
+        self.assertEqual(publish.call_count, 3)
+
+    def test_sign_contracts_needs_an_active_support_user(self):
+        """Test signing with another user is refused."""
+        self.support_user.is_active = False
+        self.support_user.save()
+
+        for user in (self.support_user, self.sales_users[0]):
+            with self.assertRaises(ValueError):
+                bulk.sign_contracts(Contract.objects.all(), user)
+
+        self.assertFalse(Contract.objects.filter(signed=True).exists())
+
+    def test_close_events_in_chunks(self):
+        """Test closing events runs one UPDATE per chunk of ids."""
+        bulk.sign_contracts(Contract.objects.all(), self.support_user)
+
+        with CaptureQueriesContext(connections[self.db]) as queries:
+            count = bulk.close_events(Event.objects.all(), chunk_size=2)
+
+        self.assertEqual(count, 3)
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE "core_event"')]
+        self.assertEqual(len(updates), 2)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.open_event_count, 0)
@@ -0,0 +1,112 @@
+"""
+Tests for the identity map of the requests.
+"""
+import datetime
+import types
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import bulk, identity, sharding
+from core.models import Contract, Customer, Event
+
+
+class IdentityMapTests(TestCase):
+    """Test the rows are looked up once per request."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.customer = Customer.objects.create(
+                sales_contact=self.sales_user, first_name='Test Name',
+                last_name='User', email='customer@example.com',
+                company='Test Company')
+        # The rows all live on the shard of the customer.
+        self.db = self.customer._state.db
+        self.enterContext(sharding.pinned(self.db))
+
+    def test_lookups_query_without_map(self):
+        """Test the lookups outside of a request query every time."""
+        with self.assertNumQueries(2, using=self.db):
+            identity.get(Customer, self.customer.pk)
+            identity.get(Customer, self.customer.pk)
+
+    def test_rows_loaded_once(self):
+        """Test a row is loaded once, the request user never."""
+        identity_map = identity.IdentityMap(
+                types.SimpleNamespace(user=self.sales_user))
+        token = identity.current_map.set(identity_map)
+        try:
+            with self.assertNumQueries(1, using=self.db):
+                first = identity.get(Customer, self.customer.pk)
+                second = identity.get(Customer, str(self.customer.pk))
+                user = identity.get(get_user_model(), self.sales_user.pk)
+            with self.assertRaises(Customer.DoesNotExist):
+                identity.get(Customer, self.customer.pk + 1)
+        finally:
+            identity.current_map.reset(token)
+        self.assertIs(first, second)
+        self.assertIs(user, self.sales_user)
+        self.assertEqual(sum(identity_map.hits.values()), 2)
+        self.assertEqual(
+                identity_map.redundant(),
+                f'core.customer/{self.customer.pk}, '
+                f'core.user/{self.sales_user.pk}')
+
+    def test_changed_rows_refreshed(self):
+        """Test saved rows replace their entry, bulk changes drop it."""
+        identity_map = identity.IdentityMap()
+        token = identity.current_map.set(identity_map)
+        try:
+            loaded = identity.get(Customer, self.customer.pk)
+            saved = Customer.objects.get(pk=self.customer.pk)
+            saved.last_name = 'Renamed'
+            saved.save()
+            self.assertIs(identity.get(Customer, self.customer.pk), saved)
+            bulk.update(Customer, [self.customer.pk], first_name='Bulk')
+            with self.assertNumQueries(1, using=self.db):
+                self.assertEqual(identity.get(
+                    Customer, self.customer.pk).first_name, 'Bulk')
+        finally:
+            identity.current_map.reset(token)
+        self.assertIsNot(loaded, saved)
+
+    @override_settings(IDENTITY_MAP_DEBUG=True)
+    def test_debug_headers_report_saved_lookups(self):
+        """Test the debug headers list the lookups the map saved."""
+        client = APIClient()
+        client.force_authenticate(self.sales_user)
+        res = client.post(
+                reverse('contract-list', args=[self.customer.pk]),
+                {'signed': True, 'amount': 1000.00,
+                 'support_contact': self.sales_user.pk,
+                 'payment_due': (datetime.date.today() +
+                                 datetime.timedelta(days=30))})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Event.objects.get().support_contact,
+                         self.sales_user)
+        self.assertEqual(res['X-Identity-Map-Hits'], '1')
+        self.assertEqual(res['X-Identity-Map-Redundant'],
+                         f'core.user/{self.sales_user.pk}')
+
+    def test_no_debug_headers_by_default(self):
+        """Test the responses carry no identity map header by default."""
+        client = APIClient()
+        client.force_authenticate(self.sales_user)
+        contract = Contract.objects.create(
+                sales_contact=self.sales_user, customer=self.customer,
+                amount=1000, payment_due=datetime.date.today())
+        res = client.get(reverse('contract-detail',
+                                 args=[self.customer.pk, contract.pk]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Identity-Map-Hits', res)
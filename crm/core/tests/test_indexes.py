@@ -0,0 +1,88 @@
+"""
+Tests that the planner uses the filter indexes on a seeded dataset.
+"""
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from core import archive
+from core.models import Contract, Customer, Event
+from customer import calendar
+
+USERS = 20
+ROWS_PER_USER = 250
+
+
+class FilterIndexTests(TestCase):
+    """Test the plans of the owner, status and date filters."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Seed the rows of the users interleaved, half of the contracts past
+        due and a tenth of the contracts and events unsigned or open.
+        """
+        cls.users = [get_user_model().objects.create_user(
+                         email=f'user{index}@example.com', role='sales',
+                         password='testpass')
+                     for index in range(USERS)]
+        customer = Customer.objects.create(
+                first_name='Test', last_name='Customer',
+                email='customer@example.com', company='Test Company')
+        now = timezone.now()
+        today = datetime.date.today()
+        Contract.objects.bulk_create(
+                Contract(sales_contact=user, customer=customer,
+                         amount=Decimal('100.00'), signed=index % 10 != 0,
+                         payment_due=today + datetime.timedelta(
+                             days=index - ROWS_PER_USER // 2))
+                for index in range(ROWS_PER_USER) for user in cls.users)
+        Event.objects.bulk_create(
+                Event(support_contact=user, customer=customer,
+                      event_closed=index % 10 != 0,
+                      event_date=now + datetime.timedelta(hours=index))
+                for index in range(ROWS_PER_USER) for user in cls.users)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_contract')
+            cursor.execute('ANALYZE core_event')
+
+    def assertUsesIndex(self, queryset, index):
+        """Assert the plan of queryset reads index."""
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+
+    def test_open_events_of_support_user_by_date(self):
+        """Test the calendar reads the open events index in date order."""
+        self.assertUsesIndex(
+                calendar.upcoming_events(self.users[0].id).order_by(
+                    'event_date'),
+                'event_live_open_support_idx')
+
+    def test_unsigned_contracts_of_sales_user(self):
+        """Test the unsigned contracts of a sales user use their index."""
+        self.assertUsesIndex(
+                Contract.objects.filter(
+                    sales_contact=self.users[0], signed=False).order_by(
+                        'date_created'),
+                'contract_live_unsigned_idx')
+
+    def test_overdue_contracts_of_sales_user(self):
+        """Test the overdue report of a sales contact uses its index."""
+        self.assertUsesIndex(
+                Contract.objects.filter(
+                    sales_contact=self.users[0], signed=True,
+                    payment_due__lt=datetime.date.today()).order_by(
+                        'payment_due'),
+                'contract_live_signed_due_idx')
+
+    def test_archivable_events(self):
+        """Test the archival scans the closed events index."""
+        self.assertUsesIndex(
+                archive.archivable_events(
+                    timezone.now() - datetime.timedelta(days=365)),
+                'event_closed_updated_idx')
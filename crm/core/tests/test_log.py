@@ -0,0 +1,96 @@
+"""
+Tests for the logging pipeline.
+"""
+import json
+import logging
+import os
+import tempfile
+
+from django.test import TestCase
+from django.urls import reverse
+
+from core import log
+
+
+def make_record(msg, *args):
+    """Return a log record for the tests."""
+    return logging.LogRecord('django', logging.ERROR, __file__, 1, msg, args,
+                             None)
+
+
+class LogTests(TestCase):
+    """Test the JSON queue logging pipeline."""
+    databases = '__all__'
+
+    def test_records_are_written_as_json_by_the_listener(self):
+        """Test that records are queued then written as JSON lines."""
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'debug.log')
+            handler = log.AsyncHandler(filename, console=False)
+            handler.addFilter(log.RequestIDFilter())
+            token = log.request_id.set('abc')
+            try:
+                handler.handle(make_record('Amount is %s.', 'negative'))
+            finally:
+                log.request_id.reset(token)
+            handler.close()
+
+            with open(os.path.join(directory, f'debug.{os.getpid()}.log')) \
+                    as log_file:
+                data = json.loads(log_file.readline())
+        self.assertEqual(data['message'], 'Amount is negative.')
+        self.assertEqual(data['request_id'], 'abc')
+        self.assertEqual(data['level'], 'ERROR')
+
+    def test_each_process_writes_its_own_file(self):
+        """Test a forked worker writes and rotates a file of its own."""
+        with tempfile.TemporaryDirectory() as directory:
+            handler = log.AsyncHandler(os.path.join(directory, 'debug.log'),
+                                       console=False)
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    handler.handle(make_record('From the child.'))
+                    handler.close()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            handler.handle(make_record('From the parent.'))
+            handler.close()
+
+            messages = {}
+            for process in (pid, os.getpid()):
+                path = os.path.join(directory, f'debug.{process}.log')
+                with open(path) as log_file:
+                    messages[process] = [json.loads(line)['message']
+                                         for line in log_file]
+        self.assertEqual(messages, {pid: ['From the child.'],
+                                    os.getpid(): ['From the parent.']})
+
+    def test_repeated_messages_are_rate_limited(self):
+        """Test that identical messages are suppressed after the burst."""
+        deduplicate = log.DeduplicateFilter(interval=60, burst=2)
+        passed = [deduplicate.filter(make_record('Amount is negative.'))
+                  for _ in range(5)]
+
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(deduplicate.filter(make_record('Other message.')))
+
+    def test_suppressed_count_is_reported_after_the_interval(self):
+        """Test that the next record tells how many copies were dropped."""
+        deduplicate = log.DeduplicateFilter(interval=60, burst=1)
+        for _ in range(4):
+            deduplicate.filter(make_record('Amount is negative.'))
+        deduplicate.interval = 0
+        record = make_record('Amount is negative.')
+
+        self.assertTrue(deduplicate.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+    def test_request_id_is_returned(self):
+        """Test that the request id is echoed in the response."""
+        res = self.client.get(reverse('login'), HTTP_X_REQUEST_ID='req-1')
+        self.assertEqual(res['X-Request-ID'], 'req-1')
+
+        res = self.client.get(reverse('login'), HTTP_X_REQUEST_ID='bad id!')
+        self.assertNotEqual(res['X-Request-ID'], 'bad id!')
@@ -0,0 +1,79 @@
+"""
+Tests for the metrics endpoint.
+"""
+import json
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse("metrics")
+
+
+class MetricsTests(TestCase):
+    """Test the Prometheus metrics endpoint."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.settings = override_settings(METRICS_DIR=self.metrics_dir.name,
+                                          METRICS_TOKEN='')
+        self.settings.enable()
+        metrics.registry = metrics.Registry()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.metrics_dir.cleanup()
+
+    def test_requests_are_labelled_by_viewset_and_action(self):
+        """Test that requests are counted per viewset, action and status."""
+        self.client.get(reverse("customer-list"), {'offset': 20})
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn('crm_http_requests_total{action="list",method="GET",'
+                      'status="200",viewset="CustomerViewSet"} 1', body)
+        self.assertIn('crm_db_queries_per_request_count{action="list",'
+                      'viewset="CustomerViewSet"} 1', body)
+        self.assertIn('crm_pagination_offset_bucket{viewset="CustomerViewSet"'
+                      ',le="50"} 1', body)
+
+    def test_metrics_of_other_processes_are_merged(self):
+        """Test that the files dumped by other workers are aggregated."""
+        metrics.cache_hit('schema')
+        other = {
+                'counters': [['crm_cache_requests_total',
+                              [['cache', 'schema'], ['result', 'hit']], 2]],
+                'histograms': [],
+                }
+        path = os.path.join(self.metrics_dir.name, '1.json')
+        with open(path, 'w') as metrics_file:
+            json.dump(other, metrics_file)
+
+        body = metrics.render()
+
+        self.assertIn(
+            'crm_cache_requests_total{cache="schema",result="hit"} 3', body)
+
+    def test_token_is_required_when_configured(self):
+        """Test that the endpoint can be protected by a bearer token."""
+        with override_settings(METRICS_TOKEN='secret'):
+            res = self.client.get(METRICS_URL)
+            self.assertEqual(res.status_code, 403)
+            res = self.client.get(METRICS_URL,
+                                  HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(res.status_code, 200)
@@ -12,6 +12,7 @@ from django.utils.timezone import make_aware
 
 class ModelTests(TestCase):
     """Test for models."""
+    databases = '__all__'
 
     def test_create_user_management_with_email_successful(self):
         """Test creating a new user admin with an email is successful."""
@@ -81,14 +82,14 @@ class ModelTests(TestCase):
         first_name = 'first_name'
         last_name = 'last_name'
         role = 'wrongrole'
-        user = get_user_model().objects.create_user(
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name,
-            role=role,
-            )
-        self.assertEqual(user.email, email)
+        with self.assertRaises(ValueError):
+            get_user_model().objects.create_user(
+                email=email,
+                password=password,
+                first_name=first_name,
+                last_name=last_name,
+                role=role,
+                )
 
     def test_new_user_email_normalized(self):
         """Test the email for a new user is normalized."""
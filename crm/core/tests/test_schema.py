@@ -0,0 +1,95 @@
+"""
+Tests for the OpenAPI schema endpoint.
+"""
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse("schema")
+
+
+class SchemaTests(TestCase):
+    """Test the precomputed OpenAPI schema."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.schema_dir.cleanup)
+        self.settings = override_settings(
+                OPENAPI_SCHEMA_DIR=self.schema_dir.name)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        schema.clear()
+        self.addCleanup(schema.clear)
+
+    def test_schema_is_generated_lazily(self):
+        """Test that the schema is generated on the first request."""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'openapi:', res.content)
+        self.assertIn(b'/customer/', res.content)
+
+    def test_schema_is_served_from_the_generated_files(self):
+        """Test that the files written by the command are served."""
+        call_command('generate_schema', stdout=io.StringIO())
+        path = os.path.join(self.schema_dir.name, 'schema.json')
+        with open(path, 'wb') as schema_file:
+            schema_file.write(b'{"openapi": "3.0.3"}')
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.content, b'{"openapi": "3.0.3"}')
+
+    def test_conditional_and_compressed_responses(self):
+        """Test the ETag and gzip support."""
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn(b'openapi:', gzip.decompress(res.content))
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+    def test_api_views_are_described(self):
+        """Test the views without a serializer get their annotations."""
+        document = json.loads(schema.generate()['json'])
+
+        pipeline = document['paths']['/reports/pipeline/']['get']
+        self.assertIn('sales_contact', [parameter['name'] for parameter
+                                        in pipeline['parameters']])
+        self.assertEqual(pipeline['responses']['200']['content'][
+            'application/json']['schema']['items'],
+            {'$ref': '#/components/schemas/Pipeline'})
+        self.assertIn('requestBody',
+                      document['paths']['/user/{id}/transfer/']['post'])
+        self.assertIn('DirectoryUser', document['components']['schemas'])
+
+    def test_docs_page(self):
+        """Test that the Swagger UI is served."""
+        res = self.client.get(reverse("docs"))
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_urls_do_not_import_spectacular(self):
+        """Test that routing a request leaves drf-spectacular unloaded."""
+        script = (
+            'import sys, django; django.setup(); '
+            'from django.urls import resolve; '
+            'resolve("/customer/").func.cls().schema; '
+            'print("drf_spectacular.openapi" in sys.modules)')
+        output = subprocess.run(
+                [sys.executable, '-c', script], capture_output=True,
+                text=True, check=True,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'crm.settings'})
+
+        self.assertEqual(output.stdout.strip(), 'False')
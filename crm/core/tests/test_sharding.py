@@ -0,0 +1,284 @@
+"""
+Tests for the sharding of the customers, contracts and events.
+
+The tests spreading rows over several databases need shards, e.g. run
+DB_SHARDS=crm_shard1 manage.py test core.tests.test_sharding to test with a
+second database on the default server.
+"""
+import datetime
+import random
+import unittest
+import unittest.mock
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import sharding
+from core.models import Contract, Customer, Event, PipelineSummary
+
+CUSTOMER_URL = reverse("customer-list")
+
+
+def create_customer(sales_user, email, **fields):
+    """Create and return a new customer."""
+    fields = {'first_name': 'Test Name', 'last_name': 'User',
+              'company': 'Test Company', **fields}
+    return Customer.objects.create(sales_contact=sales_user, email=email,
+                                   **fields)
+
+
+class ShardKeyTests(TestCase):
+    """Test the shard key and the merge of the shards' rows."""
+    databases = '__all__'
+
+    @override_settings(SHARDS=['default', 'shard1'])
+    def test_shard_of_id(self):
+        """Test the shard of a row is known from its id."""
+        self.assertEqual(sharding.shard_of_id(5), 'default')
+        self.assertEqual(sharding.shard_of_id(sharding.SHARD_ID_RANGE + 5),
+                         'shard1')
+        self.assertIsNone(sharding.shard_of_id(
+            2 * sharding.SHARD_ID_RANGE + 5))
+        self.assertIsNone(sharding.shard_of_id('abc'))
+        self.assertEqual(sharding.shard_of_user(3), 'shard1')
+        self.assertEqual(sharding.shard_of_user(None), 'default')
+
+    def test_merge_key_follows_database_order(self):
+        """Test merged rows are sorted as each shard sorts them."""
+        user = get_user_model().objects.create_user(
+                email='sales@example.com', role='sales', password='pass')
+        now = timezone.now()
+        for index in range(12):
+            customer = create_customer(user, f'customer{index}@example.com')
+            Customer.objects.filter(pk=customer.pk).update(
+                    signed_amount=index % 3,
+                    last_activity=(now - datetime.timedelta(days=index % 4)
+                                   if index % 5 else None))
+        for ordering in (
+                (F('last_activity').desc(nulls_last=True), '-id'),
+                (F('last_activity').asc(nulls_first=True), 'id'),
+                ('last_activity', 'id'),
+                ('-signed_amount', 'id')):
+            queryset = Customer.objects.order_by(*ordering)
+            merge = sharding.Merge(queryset)
+            rows = list(queryset)
+            shuffled = rows[:]
+            random.Random(0).shuffle(shuffled)
+            self.assertEqual(sorted(shuffled, key=merge.key), rows)
+
+    @override_settings(SHARDS=['default'])
+    def test_single_database_is_not_scattered(self):
+        """Test the lists run their queryset as is without shards."""
+        queryset = Customer.objects.all()
+        self.assertIs(sharding.scatter(queryset), queryset)
+        self.assertEqual(sharding.spread(queryset), [queryset])
+
+
+@unittest.skipUnless(sharding.is_sharded(), 'DB_SHARDS is not set.')
+class ShardedTests(TestCase):
+    """Test the rows spread over the shards."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.users = []
+        while {sharding.shard_of_user(user.pk)
+               for user in self.users} != set(sharding.aliases()):
+            self.users.append(get_user_model().objects.create_user(
+                    email=f'sales{len(self.users)}@example.com',
+                    role='sales', password='testpass'))
+        self.client = APIClient()
+
+    def test_sequences_end_with_their_range(self):
+        """Test each shard stops handing out ids at the end of its range."""
+        for index, alias in enumerate(sharding.aliases()):
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT max_value FROM pg_sequences WHERE "
+                               "sequencename = 'core_customer_id_seq'")
+                self.assertEqual(cursor.fetchone()[0],
+                                 (index + 1) * sharding.SHARD_ID_RANGE - 1)
+
+    def test_users_replicated(self):
+        """Test the users are copied to every shard."""
+        user = self.users[0]
+        user.first_name = 'Renamed'
+        user.save()
+        for alias in sharding.aliases():
+            self.assertEqual(get_user_model().objects.using(alias).get(
+                pk=user.pk).first_name, 'Renamed')
+
+    def test_email_unique_on_every_shard(self):
+        """Test a customer email cannot be used again on another shard."""
+        customer = create_customer(self.users[0], 'customer@example.com')
+        other = next(user for user in self.users
+                     if sharding.shard_of_user(user.pk) !=
+                     customer._state.db)
+        self.client.force_authenticate(other)
+
+        res = self.client.post(CUSTOMER_URL, {
+            'first_name': 'Test Name', 'last_name': 'User',
+            'email': 'customer@example.com', 'company': 'Test Company'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', res.data)
+
+        owned = create_customer(other, 'other@example.com')
+        res = self.client.patch(reverse('customer-detail', args=[owned.pk]),
+                                {'email': 'customer@example.com'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        owned.refresh_from_db()
+        self.assertEqual(owned.email, 'other@example.com')
+
+    def test_customer_and_contracts_on_owner_shard(self):
+        """Test a customer and its contracts share the owner's shard."""
+        for index, user in enumerate(self.users):
+            self.client.force_authenticate(user)
+            res = self.client.post(CUSTOMER_URL, {
+                'first_name': 'Test Name', 'last_name': 'User',
+                'email': f'customer{index}@example.com',
+                'company': 'Test Company'})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            alias = sharding.shard_of_user(user.pk)
+            self.assertEqual(sharding.shard_of_id(res.data['id']), alias)
+            customer = Customer.objects.using(alias).get(pk=res.data['id'])
+            self.assertEqual(customer.organization._state.db, alias)
+
+            res = self.client.post(
+                    reverse('contract-list', args=[customer.pk]),
+                    {'signed': False, 'amount': 1000.00,
+                     'payment_due': (datetime.date.today() +
+                                     datetime.timedelta(days=30))})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(sharding.shard_of_id(res.data['id']), alias)
+            self.assertTrue(Contract.objects.using(alias).filter(
+                pk=res.data['id'], customer=customer).exists())
+            self.assertTrue(PipelineSummary.objects.using(alias).filter(
+                sales_contact=user, contract_count=1).exists())
+
+            res = self.client.get(
+                    reverse('customer-detail', args=[customer.pk]))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['contract_count'], 1)
+
+    def test_lists_merge_every_shard(self):
+        """Test the lists and searches page through every shard in order."""
+        customers = [create_customer(user, f'customer{index}{n}@example.com',
+                                     last_name=f'Name{n}')
+                     for index, user in enumerate(self.users)
+                     for n in range(3)]
+        self.assertEqual({customer._state.db for customer in customers},
+                         set(sharding.aliases()))
+        self.client.force_authenticate(self.users[0])
+        ids = []
+        for offset in range(0, len(customers), 2):
+            res = self.client.get(CUSTOMER_URL,
+                                  {'limit': 2, 'offset': offset})
+            self.assertEqual(res.data['count'], len(customers))
+            ids += [row['id'] for row in res.data['results']]
+        self.assertEqual(ids, sorted(customer.pk for customer in customers))
+
+        res = self.client.get(CUSTOMER_URL, {'name': 'Name1'})
+        self.assertEqual(
+                {row['id'] for row in res.data['results']},
+                {customer.pk for customer in customers
+                 if customer.last_name == 'Name1'})
+
+    def test_contract_search_across_shards(self):
+        """Test the contract search merges the contracts of each shard."""
+        contracts = [Contract.objects.create(
+                sales_contact=user, customer=create_customer(
+                    user, f'customer{index}@example.com'),
+                amount=Decimal('1000.00'),
+                payment_due=datetime.date.today())
+                for index, user in enumerate(self.users)]
+        self.client.force_authenticate(self.users[0])
+        res = self.client.get(reverse('search-contract-list'),
+                              {'amount': 1000})
+        self.assertEqual([row['id'] for row in res.data['results']],
+                         sorted(contract.pk for contract in contracts))
+        for contract in contracts:
+            res = self.client.get(reverse('search-contract-detail',
+                                          args=[contract.pk]))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(SYNC_SAFETY_WINDOW=0)
+    def test_delete_and_sync_across_shards(self):
+        """Test a delete on a shard is reported by the sync of the list."""
+        since = timezone.now()
+        customers = [create_customer(user, f'customer{index}@example.com')
+                     for index, user in enumerate(self.users)]
+        deleted = customers[-1]
+        self.client.force_authenticate(deleted.sales_contact)
+        res = self.client.delete(
+                reverse('customer-detail', args=[deleted.pk]))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNotNone(Customer.all_objects.using(
+            deleted._state.db).get(pk=deleted.pk).deleted_at)
+
+        res = self.client.get(CUSTOMER_URL,
+                              {'updated_since': since.isoformat()})
+        self.assertEqual([row['id'] for row in res.data['results']],
+                         [customer.pk for customer in customers[:-1]])
+        self.assertEqual(res.data['deleted'], [deleted.pk])
+
+    def test_transfer_balances_every_shard(self):
+        """Test balancing counts the rows the targets own on every shard."""
+        leaving = self.users[0]
+        users = []
+        while len(users) < 2:
+            user = get_user_model().objects.create_user(
+                email=f'target{len(self.users)}@example.com',
+                role='sales', password='testpass')
+            self.users.append(user)
+            if users or sharding.shard_of_user(
+                    user.pk) != sharding.shard_of_user(leaving.pk):
+                users.append(user)
+        for index in range(3):
+            create_customer(users[0], f'owned{index}@example.com')
+        customers = [create_customer(leaving, f'customer{index}@example.com')
+                     for index in range(2)]
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            email='management@example.com', role='management',
+            password='testpass'))
+
+        res = self.client.post(
+                reverse('user-transfer', args=[leaving.pk]),
+                {'targets': [user.pk for user in users], 'balance': True},
+                format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['targets'], {users[0].pk: 0,
+                                               users[1].pk: 2})
+        alias = sharding.shard_of_user(leaving.pk)
+        self.assertEqual(set(Customer.objects.using(alias).filter(
+            pk__in=[customer.pk for customer in customers]).values_list(
+                'sales_contact_id', flat=True)), {users[1].pk})
+
+    @unittest.mock.patch('core.notifications.publish')
+    def test_notifications_wait_for_the_shard(self, publish):
+        """Test a change is notified when the transaction of its shard ends."""
+        support = get_user_model().objects.create_user(
+                email='support@example.com', role='support',
+                password='testpass')
+        customer = create_customer(
+                next(user for user in self.users
+                     if sharding.shard_of_user(user.pk) != 'default'),
+                'customer@example.com')
+        event = Event.objects.create(customer=customer,
+                                     support_contact=support)
+        alias = event._state.db
+        self.assertNotEqual(alias, 'default')
+
+        with self.captureOnCommitCallbacks(using=alias, execute=True):
+            event.attendees = 10
+            event.save()
+
+        publish.assert_called_once_with(support.pk, {
+            'type': 'event.updated', 'event': event.pk,
+            'customer': customer.pk})
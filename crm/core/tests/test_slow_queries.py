@@ -0,0 +1,58 @@
+"""
+Tests for the slow query capture.
+"""
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from core.models import SlowQuery, SlowQueryFingerprint
+from core.slow_queries import SlowQueryRecorder, normalize
+
+
+class SlowQueryTests(TestCase):
+    """Test the slow query recorder."""
+    databases = '__all__'
+
+    def test_normalize_replaces_literals(self):
+        """Test that queries differing by their values share a fingerprint."""
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3)"),
+            normalize("SELECT  * FROM t WHERE a = 'y' AND b IN (4)"),
+            )
+        self.assertEqual(normalize('SELECT * FROM t WHERE a = %s'),
+                         'SELECT * FROM t WHERE a = ?')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN_RATE=1)
+    def test_slow_queries_are_aggregated_by_fingerprint(self):
+        """Test that queries over the threshold are recorded."""
+        with connection.execute_wrapper(SlowQueryRecorder('TestView.list')):
+            get_user_model().objects.filter(email='a@example.com').exists()
+            get_user_model().objects.filter(email='b@example.com').exists()
+
+        stats = SlowQueryFingerprint.objects.get(sql__contains='core_user')
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.last_view, 'TestView.list')
+        self.assertIn('actual time', stats.plan)
+        self.assertEqual(stats.samples.count(), 2)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN_RATE=0,
+                       SLOW_QUERY_MAX_RECORDS=3)
+    def test_recorded_queries_are_bounded(self):
+        """Test that only the last SLOW_QUERY_MAX_RECORDS are kept."""
+        with connection.execute_wrapper(SlowQueryRecorder()):
+            for index in range(10):
+                get_user_model().objects.filter(id=index).exists()
+
+        self.assertLessEqual(SlowQuery.objects.count(), 3)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_EXPLAIN_RATE=1)
+    def test_recorded_queries_keep_no_values(self):
+        """Test that the samples and plans do not show the parameters."""
+        with connection.execute_wrapper(SlowQueryRecorder()):
+            get_user_model().objects.filter(
+                    email='secret@example.com').exists()
+
+        sample = SlowQuery.objects.get(sql__contains='core_user')
+        self.assertNotIn('secret', sample.sql)
+        self.assertNotIn('secret', sample.plan)
+        self.assertNotIn('secret', sample.fingerprint.plan)
@@ -0,0 +1,67 @@
+"""
+Tests for the compact column types and the storage report.
+"""
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Company, Customer
+
+
+def create_customer(email, company):
+    return Customer.objects.create(first_name='Test', last_name='Customer',
+                                   email=email, company=company)
+
+
+class StorageTests(TestCase):
+    """Test the storage of roles and companies."""
+    databases = '__all__'
+
+    def test_role_is_an_enumerated_type(self):
+        """Test the role column uses the user_role enum."""
+        get_user_model().objects.create_user(
+                email='sales@example.com', role='sales', password='testpass')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT udt_name FROM information_schema.columns WHERE "
+                "table_name = 'core_user' AND column_name = 'role'")
+            self.assertEqual(cursor.fetchone()[0], 'user_role')
+
+        self.assertEqual(get_user_model().objects.filter(
+            role='sales').count(), 1)
+
+    def test_customers_share_their_company(self):
+        """Test the company name is stored once for all its customers."""
+        customers = [create_customer(f'customer{index}@example.com',
+                                     'Epic Events')
+                     for index in range(3)]
+
+        self.assertEqual(Company.objects.count(), 1)
+        self.assertEqual(
+            {customer.organization_id for customer in customers},
+            {Company.objects.get().id})
+
+    def test_change_company_by_name(self):
+        """Test setting the company name links the customer to it."""
+        customer = create_customer('customer@example.com', 'Epic Events')
+
+        customer.company = 'Other Company'
+        customer.save()
+
+        customer = Customer.objects.get(pk=customer.pk)
+        self.assertEqual(customer.company, 'Other Company')
+        self.assertEqual(Company.objects.count(), 2)
+
+    def test_storage_report(self):
+        """Test the report lists the sizes of the core tables."""
+        create_customer('customer@example.com', 'Epic Events')
+        out = StringIO()
+
+        call_command('storage_report', analyze=True, stdout=out)
+
+        self.assertIn('core_customer', out.getvalue())
+        self.assertIn('core_company', out.getvalue())
+        self.assertIn('Total:', out.getvalue())
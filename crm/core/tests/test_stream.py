@@ -0,0 +1,183 @@
+"""
+Tests for the event stream and its notifications.
+"""
+import asyncio
+import datetime
+import json
+import unittest.mock
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import notifications
+from core.models import Contract, Customer, Event
+from core.stream import stream_application
+
+
+async def open_stream(query_string):
+    """Start a stream, return its task, sent messages and receive queue."""
+    sent = asyncio.Queue()
+    received = asyncio.Queue()
+    task = asyncio.ensure_future(stream_application(
+        {'type': 'http', 'path': '/event/stream/',
+         'query_string': query_string.encode(), 'headers': []},
+        received.get, sent.put))
+    return task, sent, received
+
+
+class StreamTests(TestCase):
+    """Test the Server-Sent Events stream."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com',
+                role='support',
+                password='testpass',
+                )
+        self.token = str(AccessToken.for_user(self.support_user))
+
+    async def test_stream_requires_a_token(self):
+        """Test a stream without a valid token is refused."""
+        task, sent, _ = await open_stream('token=invalid')
+        await task
+
+        self.assertEqual((await sent.get())['status'], 401)
+
+    async def test_stream_refuses_inactive_users(self):
+        """Test a valid token of a deactivated user is refused."""
+        await sync_to_async(get_user_model().objects.filter(
+            pk=self.support_user.pk).update)(is_active=False)
+        task, sent, _ = await open_stream(f'token={self.token}')
+        await task
+
+        self.assertEqual((await sent.get())['status'], 401)
+
+    async def test_stream_closed_when_token_expires(self):
+        """Test the stream ends when the access token expires."""
+        token = AccessToken.for_user(self.support_user)
+        token.set_exp(lifetime=datetime.timedelta(seconds=1))
+        task, sent, _ = await open_stream(f'token={token}')
+        self.assertEqual((await sent.get())['status'], 200)
+        await sent.get()
+
+        await asyncio.wait_for(task, 3)
+
+        self.assertEqual(await sent.get(),
+                         {'type': 'http.response.body', 'body': b''})
+
+    @override_settings(STREAM_USER_CHECK=0.1)
+    async def test_stream_closed_when_user_deactivated(self):
+        """Test the stream ends once its user is deactivated."""
+        task, sent, _ = await open_stream(f'token={self.token}')
+        self.assertEqual((await sent.get())['status'], 200)
+        await sent.get()
+
+        await sync_to_async(get_user_model().objects.filter(
+            pk=self.support_user.pk).update)(is_active=False)
+        await asyncio.wait_for(task, 3)
+
+        self.assertEqual(await sent.get(),
+                         {'type': 'http.response.body', 'body': b''})
+        self.assertEqual(
+            notifications.broker.subscribers(self.support_user.id), 0)
+
+    async def test_stream_delivers_notifications_of_the_user(self):
+        """Test a notification published to the user is streamed."""
+        task, sent, received = await open_stream(f'token={self.token}')
+        self.assertEqual((await sent.get())['status'], 200)
+        await sent.get()
+
+        notifications.broker.publish(self.support_user.id + 1,
+                                     {'type': 'event.updated', 'event': 1})
+        notifications.broker.publish(self.support_user.id,
+                                     {'type': 'event.closed', 'event': 2})
+        body = (await asyncio.wait_for(sent.get(), 1))['body'].decode()
+        await received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 1)
+
+        self.assertEqual(body, 'event: event.closed\ndata: '
+                         '{"type": "event.closed", "event": 2}\n\n')
+        self.assertEqual(
+            notifications.broker.subscribers(self.support_user.id), 0)
+
+
+class NotificationTests(TestCase):
+    """Test the notifications sent when contracts and events change."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com',
+                role='support',
+                password='testpass',
+                )
+        self.customer = Customer.objects.create(
+                first_name='Test Name',
+                last_name='User',
+                email='customer@example.com',
+                company='Test Company',
+                )
+        self.contract = Contract.objects.create(
+                customer=self.customer,
+                amount=Decimal('1000.00'),
+                payment_due=datetime.date.today(),
+                )
+
+    @unittest.mock.patch('core.notifications.publish')
+    def test_notifications_sent_on_commit(self, publish):
+        """Test signing a contract and closing its event notify support."""
+        with self.captureOnCommitCallbacks(execute=True):
+            event = Event.objects.create(customer=self.customer,
+                                         support_contact=self.support_user)
+            self.contract.event = event
+            self.contract.signed = True
+            self.contract.save()
+            publish.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event.event_closed = True
+            event.save()
+
+        self.assertEqual(publish.call_args_list, [
+            unittest.mock.call(self.support_user.id, {
+                'type': 'contract.signed', 'contract': self.contract.id,
+                'event': event.id, 'customer': self.customer.id}),
+            unittest.mock.call(self.support_user.id, {
+                'type': 'event.closed', 'event': event.id,
+                'customer': self.customer.id}),
+            ])
+
+    @override_settings(NOTIFICATIONS_BACKEND='postgres')
+    def test_postgres_listener_dispatches_to_the_broker(self):
+        """Test a notification sent with pg_notify reaches the broker."""
+        listener = notifications.Listener()
+        received = []
+        with unittest.mock.patch.object(
+                notifications.broker, 'publish',
+                side_effect=lambda *args: received.append(args)):
+            listener.start()
+            wrapper = connections['default']
+            connection = wrapper.get_new_connection(
+                wrapper.get_connection_params())
+            connection.autocommit = True
+            try:
+                for _ in range(50):
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT pg_notify(%s, %s)', [
+                            notifications.CHANNEL, json.dumps(
+                                {'user': 3, 'message': {'type': 'test'}})])
+                    listener.join(0.1)
+                    if received:
+                        break
+            finally:
+                connection.close()
+                listener.stop()
+                listener.join()
+
+        self.assertEqual(received[0], (3, {'type': 'test'}))
@@ -0,0 +1,94 @@
+"""
+Tests for the traffic capture and replay.
+"""
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import traffic
+
+
+def read_capture(directory):
+    """Return the entries recorded in a capture directory."""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    return traffic.load(paths)
+
+
+class TrafficCaptureTests(TestCase):
+    """Test the traffic recorder middleware."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.capture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.capture_dir.cleanup)
+
+    def test_requests_are_recorded_without_credentials(self):
+        """Test that bodies are recorded with the secrets masked."""
+        get_user_model().objects.create_user(
+                email='sales@example.com', role='sales', password='testpass')
+        with override_settings(TRAFFIC_CAPTURE_DIR=self.capture_dir.name):
+            client = APIClient()
+            client.post(reverse('login'), {'email': 'sales@example.com',
+                                           'password': 'testpass'})
+            client.get(reverse('customer-list'), {'name': 'Doe'},
+                       HTTP_AUTHORIZATION='Bearer secret')
+            client.get(reverse('event-calendar-feed'),
+                       {'token': 'secret', 'from': '2023-03-01'})
+
+        login, customers, feed = read_capture(self.capture_dir.name)
+        self.assertEqual(login['m'], 'POST')
+        self.assertEqual(login['b'], {'email': 'sales@example.com',
+                                      'password': '***'})
+        self.assertEqual(login['s'], 200)
+        self.assertEqual(customers['q'], 'name=Doe')
+        self.assertNotIn('secret', json.dumps(customers))
+        self.assertEqual(feed['q'], 'token=***&from=2023-03-01')
+
+    def test_recorder_is_disabled_by_default(self):
+        """Test that nothing is recorded without TRAFFIC_CAPTURE_DIR."""
+        APIClient().get(reverse('customer-list'))
+
+        self.assertEqual(os.listdir(self.capture_dir.name), [])
+
+    def test_summary(self):
+        """Test the latency distribution and error rate of a replay."""
+        summary = traffic.summarize([(200, 10.0), (500, 30.0), (None, 20.0),
+                                     (404, 40.0)])
+
+        self.assertEqual(summary['error_rate'], 0.5)
+        self.assertEqual(summary['p50'], 20.0)
+        self.assertEqual(summary['max'], 40.0)
+        self.assertEqual(summary['statuses']['404'], 1)
+
+
+class ReplayTests(LiveServerTestCase):
+    """Test the replay command against a live server."""
+    databases = '__all__'
+
+    def test_replay_compares_two_instances(self):
+        """Test that a capture is replayed and compared."""
+        with tempfile.TemporaryDirectory() as directory:
+            capture = os.path.join(directory, 'capture.jsonl')
+            report = os.path.join(directory, 'report.json')
+            with open(capture, 'w') as capture_file:
+                for offset, path in enumerate(['/customer/', '/missing/']):
+                    capture_file.write(json.dumps(
+                        {'t': offset / 100, 'm': 'GET', 'p': path}) + '\n')
+            call_command('replay', capture, target=self.live_server_url,
+                         baseline=self.live_server_url, speed=0,
+                         report=report, stdout=io.StringIO())
+            with open(report) as report_file:
+                data = json.load(report_file)
+
+        self.assertEqual(data['target']['requests'], 2)
+        self.assertEqual(data['target']['statuses'],
+                         {'401': 1, '404': 1})
+        self.assertEqual(data['status_changes'], [])
@@ -0,0 +1,203 @@
+"""
+Recording and replay of the API traffic.
+
+TrafficRecorderMiddleware appends one compact JSON line per request to
+``capture-<date>-<pid>.jsonl`` in TRAFFIC_CAPTURE_DIR. The credentials are
+never written: the Authorization and Cookie headers are dropped and the
+sensitive keys of the query strings and JSON bodies are masked. The
+`replay` management command feeds the captures back to one or two running
+instances.
+"""
+import concurrent.futures
+import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+
+
+SENSITIVE_KEY = re.compile(r'pass|token|secret|refresh|access', re.I)
+RECORDED_HEADERS = ('Content-Type', 'Accept')
+MASK = '***'
+
+
+def sanitize(value):
+    """Mask the sensitive keys of a decoded JSON document."""
+    if isinstance(value, dict):
+        return {
+            key: MASK if SENSITIVE_KEY.search(key) else sanitize(item)
+            for key, item in value.items()
+            }
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def sanitize_query(query_string):
+    """Mask the values of the sensitive keys of a query string."""
+    return urllib.parse.urlencode([
+        (key, MASK if SENSITIVE_KEY.search(key) else value)
+        for key, value in urllib.parse.parse_qsl(
+            query_string, keep_blank_values=True)], safe='*')
+
+
+class CaptureWriter:
+    """Append-only capture file of the current process."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.path = None
+        self.file = None
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        path = os.path.join(self.directory, 'capture-{}-{}.jsonl'.format(
+            time.strftime('%Y%m%d'), os.getpid()))
+        with self.lock:
+            if path != self.path:
+                if self.file is not None:
+                    self.file.close()
+                os.makedirs(self.directory, exist_ok=True)
+                self.file = open(path, 'a')
+                self.path = path
+            self.file.write(line)
+            self.file.flush()
+
+
+def capture_entry(request, response, duration):
+    """Return the sanitized description of a request and its outcome."""
+    entry = {
+            't': round(time.time() - duration, 4),
+            'm': request.method,
+            'p': request.path,
+            's': response.status_code,
+            'd': round(duration * 1000, 2),
+            }
+    if request.META.get('QUERY_STRING'):
+        entry['q'] = sanitize_query(request.META['QUERY_STRING'])
+    headers = {name: request.headers[name] for name in RECORDED_HEADERS
+               if name in request.headers}
+    if headers:
+        entry['h'] = headers
+    body = getattr(request, 'captured_body', b'')
+    if body:
+        try:
+            entry['b'] = sanitize(json.loads(body))
+        except ValueError:
+            pass
+    return entry
+
+
+def load(paths):
+    """Return the captured requests of several files, ordered by time."""
+    entries = []
+    for path in paths:
+        with open(path) as capture:
+            entries.extend(json.loads(line) for line in capture
+                           if line.strip())
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def send(target, entry, token=None, timeout=30):
+    """Send a captured request, return its status and latency."""
+    url = target.rstrip('/') + entry['p']
+    if entry.get('q'):
+        url += '?' + entry['q']
+    headers = dict(entry.get('h', {}))
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = None
+    if 'b' in entry:
+        data = json.dumps(entry['b']).encode()
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers,
+                                     method=entry['m'])
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except (urllib.error.URLError, OSError):
+        status = None
+    return status, (time.perf_counter() - start) * 1000
+
+
+def replay(entries, target, speed=1.0, concurrency=10, token=None):
+    """
+    Replay the entries against target, keeping their order and their
+    relative timing divided by `speed`. A speed of 0 sends them as fast as
+    the `concurrency` workers allow.
+    """
+    results = [None] * len(entries)
+    if not entries:
+        return results
+    origin = entries[0]['t']
+    start = time.monotonic()
+
+    def run(index, entry):
+        results[index] = send(target, entry, token)
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        for index, entry in enumerate(entries):
+            if speed:
+                delay = (entry['t'] - origin) / speed
+                delay -= time.monotonic() - start
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(run, index, entry)
+    return results
+
+
+def percentile(values, rank):
+    """Return the nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = max(math.ceil(rank / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def summarize(results):
+    """Return the latency distribution and error rate of a replay."""
+    latencies = sorted(latency for _, latency in results)
+    statuses = {}
+    errors = 0
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if status is None or status >= 500:
+            errors += 1
+    return {
+            'requests': len(results),
+            'error_rate': errors / len(results) if results else 0.0,
+            'statuses': statuses,
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else 0.0,
+            }
+
+
+def compare(entries, baseline, candidate):
+    """Return the requests whose status differs between two replays."""
+    return [
+            {'method': entry['m'], 'path': entry['p'],
+             'baseline': before[0], 'candidate': after[0]}
+            for entry, before, after in zip(entries, baseline, candidate)
+            if before[0] != after[0]
+            ]
+
+
+def get_writer():
+    """Return the capture writer of the process, None when disabled."""
+    if not settings.TRAFFIC_CAPTURE_DIR:
+        return None
+    return CaptureWriter(settings.TRAFFIC_CAPTURE_DIR)
@@ -0,0 +1,16 @@
+"""
+Views of the core app.
+"""
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core import metrics
+
+
+def metrics_view(request):
+    """Expose the metrics of every worker in the Prometheus text format."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.stream import STREAM_PATH, stream_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Serve the event stream outside of Django, the rest with Django."""
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        return await stream_application(scope, receive, send)
+    return await django_application(scope, receive, send)
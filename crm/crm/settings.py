@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import datetime
+import tempfile
 from pathlib import Path
 import environ
 
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "core",
     "crm",
@@ -48,13 +50,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestIDMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.AuditMiddleware",
+    "core.middleware.IdentityMapMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.SlowQueryMiddleware",
+    "core.middleware.TrafficRecorderMiddleware",
 ]
 
 ROOT_URLCONF = "crm.urls"
@@ -92,6 +100,28 @@ DATABASES = {
     }
 }
 
+# Shards
+# DB_SHARDS lists the databases the customers, contracts and events are
+# spread over besides the default one, as comma separated names on the
+# default server or host:port/name, e.g. "crm_2,db-west:5432/crm_3". They
+# are the "shard1", "shard2"... aliases, see core.sharding. The position of
+# a shard in the list is its range of ids: the order must never change,
+# shards can only be appended.
+
+for index, shard in enumerate(env.list("DB_SHARDS", default=[]), 1):
+    host, _, name = shard.rpartition("/")
+    host, _, port = host.partition(":")
+    DATABASES[f"shard{index}"] = {
+        **DATABASES["default"],
+        "NAME": name,
+        "HOST": host or DATABASES["default"]["HOST"],
+        "PORT": port or DATABASES["default"]["PORT"],
+    }
+
+SHARDS = list(DATABASES)
+
+DATABASE_ROUTERS = ["core.routers.ShardRouter"]
+
 REST_FRAMEWORK = {
         'DEFAULT_AUTHENTICATION_CLASSES': (
             'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -103,7 +133,6 @@ REST_FRAMEWORK = {
         "TEST_REQUEST_RENDERER_CLASSES": [
             "rest_framework.renderers.JSONRenderer",
             ],
-        "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
         }
 
 # Password validation
@@ -127,26 +156,30 @@ AUTH_PASSWORD_VALIDATORS = [
 LOGGING = {
         'version': 1,
         'disable_existing_loggers': False,
-        'formatters': {
-            'verbose': {
-                'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-                'style': "{",
+        'filters': {
+            'request_id': {
+                '()': 'core.log.RequestIDFilter',
+                },
+            'deduplicate': {
+                '()': 'core.log.DeduplicateFilter',
+                'interval': env.int('LOG_DEDUPLICATE_INTERVAL', default=60),
+                'burst': env.int('LOG_DEDUPLICATE_BURST', default=5),
                 },
             },
         'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'verbose',
+            'async': {
+                'class': 'core.log.AsyncHandler',
+                'filename': env('LOG_FILE',
+                                default=str(BASE_DIR / 'log' / 'debug.log')),
+                'max_bytes': env.int('LOG_MAX_BYTES', default=10485760),
+                'backup_count': env.int('LOG_BACKUP_COUNT', default=5),
+                'when': 'midnight',
+                'filters': ['request_id', 'deduplicate'],
                 },
-            'file': {
-                'class': 'logging.FileHandler',
-                'filename': 'log/debug.log',
-                'formatter': 'verbose',
-                }
             },
         'loggers': {
             'django': {
-                'handlers': ['console', 'file'],
+                'handlers': ['async'],
                 'level': 'ERROR',
                 'propagate': True,
                 },
@@ -178,6 +211,101 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "core.User"
 
+# Metrics
+# Every worker dumps its metrics in METRICS_DIR at most every
+# METRICS_FLUSH_INTERVAL seconds, /metrics/ merges them.
+
+METRICS_DIR = env("METRICS_DIR",
+                  default=str(Path(tempfile.gettempdir()) / "crm-metrics"))
+
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=5.0)
+
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# Slow queries
+# Queries slower than SLOW_QUERY_THRESHOLD_MS are stored (at most
+# SLOW_QUERY_MAX_RECORDS of them), a SLOW_QUERY_EXPLAIN_RATE share of the
+# slow SELECT statements is run again with EXPLAIN (ANALYZE, BUFFERS).
+
+SLOW_QUERY_THRESHOLD_MS = env.float("SLOW_QUERY_THRESHOLD_MS", default=200.0)
+
+SLOW_QUERY_EXPLAIN_RATE = env.float("SLOW_QUERY_EXPLAIN_RATE", default=0.1)
+
+SLOW_QUERY_MAX_RECORDS = env.int("SLOW_QUERY_MAX_RECORDS", default=1000)
+
+# Traffic capture
+# Set TRAFFIC_CAPTURE_DIR to record a TRAFFIC_CAPTURE_RATE share of the
+# requests for `manage.py replay`. JSON bodies larger than
+# TRAFFIC_CAPTURE_MAX_BODY bytes are not recorded.
+
+TRAFFIC_CAPTURE_DIR = env("TRAFFIC_CAPTURE_DIR", default="")
+
+TRAFFIC_CAPTURE_RATE = env.float("TRAFFIC_CAPTURE_RATE", default=1.0)
+
+TRAFFIC_CAPTURE_MAX_BODY = env.int("TRAFFIC_CAPTURE_MAX_BODY", default=65536)
+
+# OpenAPI schema
+# Written by `manage.py generate_schema` at deploy time, generated on the
+# first request when missing.
+
+OPENAPI_SCHEMA_DIR = env("OPENAPI_SCHEMA_DIR",
+                         default=str(BASE_DIR / "openapi"))
+
+# Analytics snapshots
+# Columnar exports written by `manage.py export_snapshot`.
+
+SNAPSHOT_DIR = env("SNAPSHOT_DIR", default=str(BASE_DIR / "snapshots"))
+
+# Incremental sync
+# Deleted rows are reported to syncing clients for this many days, clients
+# whose position is older have to download the lists again.
+
+TOMBSTONE_RETENTION_DAYS = env.int("TOMBSTONE_RETENTION_DAYS", default=90)
+# The changes are only synced once they are older than the oldest running
+# write transaction, less this many seconds.
+SYNC_SAFETY_WINDOW = env.int("SYNC_SAFETY_WINDOW", default=5)
+
+# Event notes
+# The notes of the events are stored apart from them, zlib compressed from
+# EVENT_NOTES_COMPRESS_MIN bytes.
+
+EVENT_NOTES_COMPRESS_MIN = env.int("EVENT_NOTES_COMPRESS_MIN", default=1024)
+
+# Identity map
+# With IDENTITY_MAP_DEBUG, the responses report the lookups of rows already
+# loaded during the request that the identity map saved.
+
+IDENTITY_MAP_DEBUG = env.bool("IDENTITY_MAP_DEBUG", default=False)
+
+# Soft delete
+# Deleted customers, contracts and events can be restored for this many
+# days, then `manage.py purge_deleted` removes them.
+
+SOFT_DELETE_RETENTION_DAYS = env.int("SOFT_DELETE_RETENTION_DAYS", default=30)
+
+# Event stream
+# Notifications are handed to the streams of the same process ("local") or
+# through Postgres LISTEN/NOTIFY when several ASGI processes serve them
+# ("postgres"). Idle streams get a comment every STREAM_HEARTBEAT seconds,
+# and are closed when their user is found inactive, checked every
+# STREAM_USER_CHECK seconds, or their token expires.
+
+NOTIFICATIONS_BACKEND = env("NOTIFICATIONS_BACKEND", default="local")
+STREAM_HEARTBEAT = env.float("STREAM_HEARTBEAT", default=15)
+STREAM_USER_CHECK = env.float("STREAM_USER_CHECK", default=60)
+
+# Archival
+# Signed contracts due and closed events older than this many days are
+# moved to the archive tables by `manage.py archive`.
+
+ARCHIVE_AFTER_DAYS = env.int("ARCHIVE_AFTER_DAYS", default=365)
+
+# Staff directory
+# Each process keeps the user directory in memory, cleared when it saves a
+# user and reloaded at least every USER_DIRECTORY_TTL seconds.
+
+USER_DIRECTORY_TTL = env.int("USER_DIRECTORY_TTL", default=60)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': datetime.timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': datetime.timedelta(days=1),
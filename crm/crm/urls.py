@@ -16,10 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
-from drf_spectacular.views import (
-        SpectacularAPIView,
-        SpectacularSwaggerView,
-        )
+from core.schema import docs_view, schema_view
+from core.views import metrics_view
 
 from rest_framework_simplejwt.views import (
         TokenObtainPairView,
@@ -32,8 +30,10 @@ urlpatterns = [
     path("login/", TokenObtainPairView.as_view(), name="login"),
     path("refresh/", TokenRefreshView.as_view(), name="refresh"),
     path("verify/", TokenVerifyView.as_view(), name="verify"),
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('docs/', SpectacularSwaggerView.as_view(url_name='schema'),
-         name='docs'),
+    path('schema/', schema_view, name='schema'),
+    path('docs/', docs_view, name='docs'),
+    path("metrics/", metrics_view, name="metrics"),
+    path("reports/", include("report.urls")),
+    path("user/", include("user.urls")),
     path("", include("customer.urls")),
 ]
@@ -0,0 +1,117 @@
+"""
+Access to the archived contracts and events through the live endpoints.
+
+With `include_archived=true` the lists continue with the archived rows once
+the live rows are exhausted, and a detail missing from the live table is
+looked up in the archive (read only). The archive is not synchronized
+incrementally: `updated_since` and `cursor` are refused along with it.
+"""
+import logging
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from core import sharding
+
+logger = logging.getLogger('django')
+
+
+def include_archived(request):
+    """Return whether the request asks for the archived rows too."""
+    return request.query_params.get('include_archived', '').lower() in (
+        'true', '1')
+
+
+class Chain:
+    """
+    The rows of several querysets one after the other, counted and sliced
+    lazily so that the paginator only fetches the rows of its page.
+    """
+    ordered = True
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+        self._counts = None
+
+    def counts(self):
+        """Return the number of rows of each queryset."""
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self):
+        """Return the total number of rows."""
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        rows = []
+        for queryset, count in zip(self.querysets, self.counts()):
+            if stop <= 0:
+                break
+            if start < count:
+                rows.extend(queryset[start:min(stop, count)])
+            start, stop = max(0, start - count), stop - count
+        return rows
+
+
+class ArchiveMixin:
+    """Serve the archived rows of a viewset when asked for."""
+    archived_queryset = None
+    archived_serializer_class = None
+
+    def filter_lists(self, **lookups):
+        """Filter the live and archived rows listed."""
+        self.queryset = self.queryset.filter(**lookups)
+        self.archived_queryset = self.archived_queryset.filter(**lookups)
+
+    def serialize(self, rows):
+        """Serialize live and archived rows with their serializer."""
+        context = self.get_serializer_context()
+        archived_model = self.archived_queryset.model
+        return [self.archived_serializer_class(row, context=context).data
+                if isinstance(row, archived_model)
+                else self.get_serializer(row).data for row in rows]
+
+    def list(self, request, *args, **kwargs):
+        """Return the list, followed by the archived rows when asked for."""
+        if not include_archived(request):
+            return super().list(request, *args, **kwargs)
+        if ('updated_since' in request.query_params
+                or 'cursor' in request.query_params):
+            logger.error('Archived rows requested in a sync.')
+            return Response(
+                    {'error': 'include_archived cannot be combined with '
+                              'updated_since or cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        rows = Chain(sharding.scatter(self.queryset.order_by('id')),
+                     sharding.scatter(self.archived_queryset.order_by('id')))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.serialize(rows[:]))
+        return self.get_paginated_response(self.serialize(page))
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if (not include_archived(self.request)
+                    or self.request.method not in SAFE_METHODS):
+                raise
+        instance = get_object_or_404(self.archived_queryset,
+                                     pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return a live or archived row."""
+        return Response(self.serialize([self.get_object()])[0])
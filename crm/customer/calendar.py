@@ -0,0 +1,132 @@
+"""
+iCalendar feed of the events of a support user.
+"""
+import datetime
+import itertools
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core import notes, sharding
+from core.models import Event
+
+SALT = 'event-calendar-feed'
+FEED_PAST_DAYS = 1
+FEED_TOKEN_MAX_AGE = datetime.timedelta(days=90)
+CHUNK_SIZE = 500
+
+
+def user_key(user):
+    """
+    Return the part of the feed tokens tied to the user's password, so that
+    changing it revokes the feed URLs given before.
+    """
+    return salted_hmac(SALT, f'{user.pk}{user.password}').hexdigest()[:16]
+
+
+def make_token(user):
+    """Return the token giving access to the calendar feed of a user."""
+    return signing.TimestampSigner(salt=SALT).sign_object(
+            {'user': user.pk, 'key': user_key(user)})
+
+
+def read_token(token):
+    """
+    Return the user id of a feed token, None when it is invalid, expired,
+    revoked or of a user who is no longer an active support user.
+    """
+    try:
+        data = signing.TimestampSigner(salt=SALT).unsign_object(
+                token, max_age=FEED_TOKEN_MAX_AGE)
+        user = get_user_model().objects.get(
+                pk=data['user'], is_active=True, role='support')
+    except (signing.BadSignature, KeyError, TypeError, ValueError,
+            get_user_model().DoesNotExist):
+        return None
+    if not constant_time_compare(data.get('key', ''), user_key(user)):
+        return None
+    return user.pk
+
+
+def upcoming_events(user_id):
+    """Return the open events of a support user, starting yesterday."""
+    start = timezone.now() - datetime.timedelta(days=FEED_PAST_DAYS)
+    return Event.objects.filter(support_contact_id=user_id,
+                                event_closed=False, event_date__gte=start)
+
+
+def feed_state(user_id):
+    """Return the number of events of the feed and their last update."""
+    states = [events.aggregate(count=Count('id'),
+                               updated=Max('date_updated'))
+              for events in sharding.spread(upcoming_events(user_id))]
+    return {'count': sum(state['count'] for state in states),
+            'updated': max((state['updated'] for state in states
+                            if state['updated'] is not None), default=None)}
+
+
+def escape(text):
+    """Escape a text value of an iCalendar property."""
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def format_datetime(value):
+    """Format a datetime as an iCalendar UTC date-time."""
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line):
+    """Fold a content line to 75 octets as required by RFC 5545."""
+    encoded = line.encode()
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    parts.append(encoded.decode())
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def with_notes(events):
+    """Yield the events with their notes, loaded a chunk at a time."""
+    events = iter(events)
+    while True:
+        chunk = list(itertools.islice(events, CHUNK_SIZE))
+        if not chunk:
+            return
+        notes.attach(chunk)
+        yield from chunk
+
+
+def render(user_id):
+    """Yield the iCalendar document of the events of a support user."""
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold('PRODID:-//Epic Events//CRM//EN')
+    yield fold('X-WR-CALNAME:Epic Events')
+    now = format_datetime(timezone.now())
+    events = sharding.scatter(upcoming_events(user_id).select_related(
+            'customer__organization').only(
+            'id', 'event_date', 'date_updated', 'attendees',
+            'customer__organization__name').order_by('event_date'))
+    for event in with_notes(events.iterator(chunk_size=CHUNK_SIZE)):
+        description = f'Attendees: {event.attendees or "-"}'
+        if event.notes:
+            description += f'\n{event.notes}'
+        yield ''.join([
+            fold('BEGIN:VEVENT'),
+            fold(f'UID:event-{event.id}@epic-events'),
+            fold(f'DTSTAMP:{now}'),
+            fold(f'LAST-MODIFIED:{format_datetime(event.date_updated)}'),
+            fold(f'DTSTART:{format_datetime(event.event_date)}'),
+            fold(f'SUMMARY:{escape(event.customer.company)}'),
+            fold(f'DESCRIPTION:{escape(description)}'),
+            fold('END:VEVENT'),
+            ])
+    yield fold('END:VCALENDAR')
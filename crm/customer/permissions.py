@@ -3,21 +3,35 @@ Handle permissions for the API.
 """
 from rest_framework import permissions
 
+from core import policies
 
-class IsSalesOwnerOrReadOnly(permissions.BasePermission):
-    """Custom permission to only allow sales to create a customer."""
+
+class IsOwnerOrReadOnly(permissions.BasePermission):
+    """
+    Custom permission to only allow the owner of a row to change it,
+    applying the policy of the class.
+    """
+    policy = None
 
     def has_permission(self, request, view):
-        """Check if user is sales or read only."""
+        """Check if the user's role may write or read only."""
         if request.method in permissions.SAFE_METHODS:
             return True
-        return request.user.role == 'sales'
+        return self.policy.can_write(request.user)
 
     def has_object_permission(self, request, view, obj):
-        """Check if user is sales or read only."""
+        """Check if the user owns the row or read only."""
         if request.method in permissions.SAFE_METHODS:
             return True
-        return request.user == obj.sales_contact
+        return self.policy.can_write_object(request.user, obj)
+
+
+class IsSalesOwnerOrReadOnly(IsOwnerOrReadOnly):
+    """
+    Custom permission to only allow sales to create a customer or a
+    contract, and their sales contact to change it.
+    """
+    policy = policies.CUSTOMER
 
 
 class IsSales(permissions.BasePermission):
@@ -25,24 +39,22 @@ class IsSales(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         """Check if user is sales."""
-        return request.user == obj.sales_contact
+        return obj.sales_contact_id == request.user.pk
 
     def has_permission(self, request, view):
         """Check if user is sales or read only."""
         return request.user.role == 'sales'
 
 
-class IsSupportOwnerOrReadOnly(permissions.BasePermission):
+class IsSupportOwnerOrReadOnly(IsOwnerOrReadOnly):
     """Custom permission to only allow support to create an event."""
+    policy = policies.EVENT
 
-    def has_permission(self, request, view):
-        """Check if user is support or read only."""
-        if request.method in permissions.SAFE_METHODS:
-            return True
-        return request.user.role == 'support'
 
-    def has_object_permission(self, request, view, obj):
-        """Check if user is support or read only."""
-        if request.method in permissions.SAFE_METHODS:
-            return True
-        return request.user == obj.support_contact
+class IsManagement(permissions.BasePermission):
+    """Custom permission to only allow management to access reports."""
+
+    def has_permission(self, request, view):
+        """Check if user is management."""
+        return (request.user.role == 'management' or
+                request.user.is_superuser)
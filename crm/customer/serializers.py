@@ -4,14 +4,41 @@ Serializers for the customer APIs.
 import datetime
 import logging
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.validators import UniqueValidator, qs_exists
 from django.contrib.auth import get_user_model
 from django.utils.timezone import make_aware
 
-from core.models import Customer, Contract, User, Event
+from core import identity, sharding
+from core.models import (
+        ArchivedContract,
+        ArchivedEvent,
+        Customer,
+        Contract,
+        User,
+        Event,
+        )
 
 logger = logging.getLogger('django')
 
 
+class UniqueOnEveryShard(UniqueValidator):
+    """
+    UniqueValidator looking for the value on every shard, the unique
+    indexes of a shard only covering its own rows.
+    """
+
+    def __call__(self, value, serializer_field):
+        field_name = serializer_field.source_attrs[-1]
+        instance = getattr(serializer_field.parent, 'instance', None)
+        for alias in sharding.aliases():
+            queryset = self.filter_queryset(
+                    value, self.queryset.using(alias), field_name)
+            queryset = self.exclude_current_instance(queryset, instance)
+            if qs_exists(queryset):
+                raise ValidationError(self.message, code='unique')
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object."""
     class Meta:
@@ -23,6 +50,9 @@ class UserSerializer(serializers.ModelSerializer):
 class CustomerSerializer(serializers.ModelSerializer):
     """Serializer for customer objects."""
     sales_contact = UserSerializer(read_only=True)
+    company = serializers.CharField(max_length=250)
+    email = serializers.EmailField(max_length=100, validators=[
+        UniqueOnEveryShard(queryset=Customer.objects.all())])
 
     class Meta:
         model = Customer
@@ -37,8 +67,14 @@ class CustomerSerializer(serializers.ModelSerializer):
                 'date_created',
                 'date_updated',
                 'sales_contact',
+                'contract_count',
+                'signed_amount',
+                'open_event_count',
+                'last_activity',
                 )
-        read_only_fields = ('id', 'date_created', 'date_updated',)
+        read_only_fields = ('id', 'date_created', 'date_updated',
+                            'contract_count', 'signed_amount',
+                            'open_event_count', 'last_activity',)
 
     def create(self, validated_data):
         """Create a new customer."""
@@ -91,8 +127,8 @@ class ContractSerializer(serializers.ModelSerializer):
                 "Support contact is required.")
         if (validated_data['signed'] and
                 validated_data['support_contact'] is not None):
-            support_contact = User.objects.get(
-                id=validated_data['support_contact'])
+            support_contact = identity.get(
+                User, validated_data['support_contact'])
             if support_contact is None:
                 logger.error("Support contact must be a valid user.")
                 raise serializers.ValidationError(
@@ -108,8 +144,8 @@ class ContractSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Update a contract."""
         if 'support_contact' in validated_data:
-            support_contact = User.objects.get(
-                id=validated_data['support_contact'])
+            support_contact = identity.get(
+                User, validated_data['support_contact'])
             if support_contact is None:
                 logger.error("Support contact must be a valid user.")
                 raise serializers.ValidationError(
@@ -130,8 +166,30 @@ class ContractSerializer(serializers.ModelSerializer):
         return instance
 
 
-class EventSerializer(serializers.ModelSerializer):
+class ArchivedContractSerializer(serializers.ModelSerializer):
+    """Serializer for archived contract objects."""
+    payment_due = serializers.DateField(format="%Y-%m-%d")
+
+    class Meta:
+        model = ArchivedContract
+        fields = ContractSerializer.Meta.fields + ('date_archived',)
+        read_only_fields = fields
+
+
+class LazyNotesMixin:
+    """Leave the notes of the events out unless the view asks for them."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('with_notes', True):
+            fields.pop('notes')
+        return fields
+
+
+class EventSerializer(LazyNotesMixin, serializers.ModelSerializer):
     """Serializer for event objects."""
+    notes = serializers.CharField(allow_blank=True, allow_null=True,
+                                  required=False)
 
     class Meta:
         model = Event
@@ -154,7 +212,7 @@ class EventSerializer(serializers.ModelSerializer):
         customer_pk = self.context.get('customer_pk')
         if customer_pk:
             try:
-                data['customer'] = Customer.objects.get(pk=customer_pk)
+                data['customer'] = identity.get(Customer, customer_pk)
             except Customer.DoesNotExist:
                 raise serializers.ValidationError("Invalid customer ID.")
         if 'event_date' in data:
@@ -168,3 +226,12 @@ class EventSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     "Attendees must be a positive number.")
         return data
+
+
+class ArchivedEventSerializer(LazyNotesMixin, serializers.ModelSerializer):
+    """Serializer for archived event objects."""
+
+    class Meta:
+        model = ArchivedEvent
+        fields = EventSerializer.Meta.fields + ('date_archived',)
+        read_only_fields = fields
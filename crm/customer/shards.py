@@ -0,0 +1,31 @@
+"""
+Routing of the customer APIs to the shards, see core.sharding.
+
+The routes with a customer, contract or event id are served by the shard
+holding it, the lists by every shard, merged page by page.
+"""
+from django.db.models import QuerySet
+
+from core import sharding
+
+LOOKUPS = ('customer_pk', 'contract_pk', 'pk')
+
+
+class ShardMixin:
+    """Serve a request from the shard of the row its route names."""
+
+    def route_shard(self, kwargs):
+        """Return the shard of the first id of the route, None if none."""
+        for lookup in LOOKUPS:
+            if lookup in kwargs:
+                return sharding.shard_of_id(kwargs[lookup])
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        with sharding.pinned(self.route_shard(kwargs)):
+            return super().dispatch(request, *args, **kwargs)
+
+    def paginate_queryset(self, queryset):
+        if isinstance(queryset, QuerySet):
+            queryset = sharding.scatter(queryset)
+        return super().paginate_queryset(queryset)
@@ -0,0 +1,175 @@
+"""
+Incremental synchronization of the customer, contract and event lists.
+
+A list requested with `updated_since` or `cursor` returns the rows changed
+since that position ordered by (date_updated, id), the ids of the rows
+deleted since then, and the cursor to resume from. The cursor holds the
+last (date_updated, id) and (date_deleted, id) returned, so rows sharing a
+timestamp are neither skipped nor repeated across pages.
+
+The timestamps are taken when the rows are written, not when their
+transaction commits, so a sync only returns the changes older than the
+horizon: the start of the oldest transaction still writing to the database,
+less SYNC_SAFETY_WINDOW seconds for the clocks and the time a transaction
+takes to write. A change committed after a client synced past its timestamp
+would otherwise never reach that client.
+"""
+import base64
+import binascii
+import datetime
+import json
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.response import Response
+
+from core import sharding
+from core.models import Tombstone
+
+logger = logging.getLogger('django')
+
+SYNC_PAGE_SIZE = 500
+
+# Start of the oldest other transaction holding a transaction id, that is
+# which has written, or the current time. The activity statistics are read
+# once per transaction unless their snapshot is cleared.
+HORIZON_SQL = (
+    "SELECT least(clock_timestamp(), min(xact_start)) FROM pg_stat_activity "
+    "WHERE datname = current_database() AND backend_xid IS NOT NULL "
+    "AND pid <> pg_backend_pid()"
+)
+
+
+def parse_since(value):
+    """Return the aware datetime of an ISO 8601 timestamp."""
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(value)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def encode_cursor(position):
+    """Return the opaque cursor of a sync position."""
+    data = {'u': position['updated'].isoformat(), 'i': position['id'],
+            'd': position['deleted'].isoformat(), 't': position['tombstone']}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the sync position of a cursor, raise ValueError if invalid."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {'updated': parse_since(data['u']), 'id': int(data['i']),
+                'deleted': parse_since(data['d']),
+                'tombstone': int(data['t'])}
+    except (TypeError, KeyError, AttributeError, json.JSONDecodeError,
+            UnicodeDecodeError, binascii.Error) as error:
+        raise ValueError(cursor) from error
+
+
+def after(position, field):
+    """Return the filter of the rows after a (field, id) position."""
+    value, pk = position
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+
+
+def horizon(queryset):
+    """
+    Return the time before which the changes of the databases of queryset
+    are all committed.
+    """
+    starts = []
+    for shard_queryset in sharding.spread(queryset):
+        with connections[shard_queryset.db].cursor() as cursor:
+            cursor.execute('SELECT pg_stat_clear_snapshot()')
+            cursor.execute(HORIZON_SQL)
+            starts.append(cursor.fetchone()[0])
+    return min(starts) - datetime.timedelta(
+            seconds=settings.SYNC_SAFETY_WINDOW)
+
+
+def changes(queryset, position, until, page_size=SYNC_PAGE_SIZE):
+    """
+    Return the rows changed after position and before until, and whether
+    more follow.
+    """
+    rows = list(sharding.scatter(queryset.filter(
+        after((position['updated'], position['id']), 'date_updated'),
+        date_updated__lt=until,
+        ).order_by('date_updated', 'id'))[:page_size + 1])
+    return rows[:page_size], len(rows) > page_size
+
+
+def deletions(model, position, until, page_size=SYNC_PAGE_SIZE):
+    """
+    Return the tombstones of model after position and before until, and
+    whether more follow.
+    """
+    tombstones = list(sharding.scatter(Tombstone.objects.filter(
+        after((position['deleted'], position['tombstone']), 'date_deleted'),
+        model=model._meta.model_name, date_deleted__lt=until,
+        ).order_by('date_deleted', 'id').only(
+            'id', 'object_id', 'date_deleted'))[:page_size + 1])
+    return tombstones[:page_size], len(tombstones) > page_size
+
+
+class SyncMixin:
+    """Serve the delta of a list when asked for `updated_since`/`cursor`."""
+
+    def list(self, request, *args, **kwargs):
+        """Return the list, or its changes since the requested position."""
+        if ('updated_since' not in request.query_params
+                and 'cursor' not in request.query_params):
+            return super().list(request, *args, **kwargs)
+        return self.sync(request)
+
+    def sync_position(self, request):
+        """Return the position requested, raise ValueError if invalid."""
+        if 'cursor' in request.query_params:
+            return decode_cursor(request.query_params['cursor'])
+        since = parse_since(request.query_params['updated_since'])
+        return {'updated': since, 'id': 0, 'deleted': since, 'tombstone': 0}
+
+    def sync(self, request):
+        """Return one page of changed rows and deleted ids."""
+        try:
+            position = self.sync_position(request)
+        except ValueError:
+            logger.error('Invalid sync position.')
+            return Response(
+                    {'error': 'Invalid sync position.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        retention = datetime.timedelta(
+                days=settings.TOMBSTONE_RETENTION_DAYS)
+        if position['deleted'] < timezone.now() - retention:
+            logger.error('Sync position expired.')
+            return Response(
+                    {'error': 'Sync position expired, download the list '
+                              'again.'},
+                    status=status.HTTP_410_GONE
+                    )
+        queryset = self.filter_queryset(self.get_queryset())
+        until = horizon(queryset)
+        rows, more_rows = changes(queryset, position, until)
+        tombstones, more_tombstones = deletions(queryset.model, position,
+                                                until)
+        if rows:
+            position['updated'] = rows[-1].date_updated
+            position['id'] = rows[-1].id
+        if tombstones:
+            position['deleted'] = tombstones[-1].date_deleted
+            position['tombstone'] = tombstones[-1].id
+        return Response({
+            'results': self.get_serializer(rows, many=True).data,
+            'deleted': [tombstone.object_id for tombstone in tombstones],
+            'cursor': encode_cursor(position),
+            'more': more_rows or more_tombstones,
+            })
@@ -0,0 +1,102 @@
+"""
+Tests for the archived contracts and events in the api.
+"""
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import sharding
+from core.models import ArchivedContract, Contract, Customer
+
+CONTRACT_URL = reverse("search-contract-list")
+
+
+def detail_contract_url(contract_id):
+    """Return contract detail URL."""
+    return reverse("search-contract-detail", args=[contract_id])
+
+
+class ArchivedApiTests(TestCase):
+    """Test the include_archived parameter."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.sales_user)
+        self.customer = Customer.objects.create(
+                first_name='Test Name',
+                last_name='User',
+                email='customer@example.com',
+                company='Test Company',
+                sales_contact=self.sales_user,
+                )
+        self.contracts = [
+                Contract.objects.create(
+                    sales_contact=self.sales_user, customer=self.customer,
+                    amount=Decimal('1000.00'),
+                    payment_due=datetime.date.today())
+                for _ in range(8)]
+        # The archived contracts keep ids of the range of their shard.
+        db = self.customer._state.db
+        self.first_id = (sharding.aliases().index(db) *
+                         sharding.SHARD_ID_RANGE + 1000)
+        now = timezone.now()
+        self.archived = [
+                ArchivedContract.objects.using(db).create(
+                    id=self.first_id + index, sales_contact=self.sales_user,
+                    customer=self.customer, signed=True,
+                    amount=Decimal('500.00'), date_created=now,
+                    date_updated=now, payment_due=datetime.date.today())
+                for index in range(4)]
+
+    def test_list_without_archived(self):
+        """Test the archived contracts are not listed by default."""
+        res = self.client.get(CONTRACT_URL)
+
+        self.assertEqual(res.data['count'], 8)
+
+    def test_list_continues_with_archived(self):
+        """Test the pages run through live then archived contracts."""
+        res = self.client.get(CONTRACT_URL, {'include_archived': 'true'})
+        self.assertEqual(res.data['count'], 12)
+        self.assertEqual([contract['id'] for contract in res.data['results']],
+                         [contract.id for contract in self.contracts] +
+                         [self.first_id, self.first_id + 1])
+        self.assertNotIn('date_archived', res.data['results'][0])
+        self.assertIn('date_archived', res.data['results'][-1])
+
+        res = self.client.get(CONTRACT_URL, {'include_archived': 'true',
+                                             'offset': 10,
+                                             'email': 'customer@example.com'})
+        self.assertEqual([contract['id'] for contract in res.data['results']],
+                         [self.first_id + 2, self.first_id + 3])
+
+    def test_sync_with_archived_is_refused(self):
+        """Test the archived rows are not silently left out of a sync."""
+        res = self.client.get(CONTRACT_URL, {
+            'include_archived': 'true',
+            'updated_since': '2023-03-01T00:00:00Z'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_archived(self):
+        """Test an archived contract is only found when asked for."""
+        res = self.client.get(detail_contract_url(self.first_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(detail_contract_url(self.first_id),
+                              {'include_archived': 'true'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['amount'], '500.00')
@@ -0,0 +1,137 @@
+"""
+Tests for the event calendar api.
+"""
+import datetime
+from unittest import mock
+
+from django.utils import timezone
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.models import Customer, Event
+from customer import calendar
+
+CALENDAR_URL = reverse("search-event-calendar")
+FEED_URL = reverse("event-calendar-feed")
+
+
+class CalendarApiTests(TestCase):
+    """Test the calendar of the support users."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com',
+                role='support',
+                password='testpass',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.support_user)
+        self.customer = Customer.objects.create(
+                first_name='Test Name',
+                last_name='User',
+                email='customer@example.com',
+                company='Big, Corp',
+                )
+        now = timezone.now()
+        self.soon = Event.objects.create(
+                customer=self.customer, support_contact=self.support_user,
+                event_date=now + datetime.timedelta(days=2), notes='Gala')
+        self.later = Event.objects.create(
+                customer=self.customer, support_contact=self.support_user,
+                event_date=now + datetime.timedelta(days=30))
+        Event.objects.create(
+                customer=self.customer, support_contact=self.support_user,
+                event_date=now + datetime.timedelta(days=3),
+                event_closed=True)
+
+    def feed_url(self):
+        """Return the feed URL given by the calendar endpoint."""
+        return self.client.get(CALENDAR_URL).data['feed']
+
+    def test_calendar_returns_the_week_by_default(self):
+        """Test that the open events of the coming week are returned."""
+        res = self.client.get(CALENDAR_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['id'] for event in res.data['results']],
+                         [self.soon.id])
+
+    def test_calendar_window(self):
+        """Test the from and to parameters."""
+        start = datetime.date.today()
+        end = start + datetime.timedelta(days=60)
+        res = self.client.get(CALENDAR_URL, {'from': start.isoformat(),
+                                             'to': end.isoformat()})
+
+        self.assertEqual([event['id'] for event in res.data['results']],
+                         [self.soon.id, self.later.id])
+        res = self.client.get(CALENDAR_URL, {'from': end.isoformat(),
+                                             'to': start.isoformat()})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_feed_streams_icalendar(self):
+        """Test that the tokenized feed lists the upcoming events."""
+        res = APIClient().get(self.feed_url())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        body = b''.join(res.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:event-{self.soon.id}@epic-events', body)
+        self.assertIn(f'UID:event-{self.later.id}@epic-events', body)
+        self.assertIn('SUMMARY:Big\\, Corp', body)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+
+    def test_feed_conditional_get(self):
+        """Test that an unchanged feed answers 304."""
+        url = self.feed_url()
+        res = APIClient().get(url)
+
+        res = APIClient().get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.soon.attendees = 10
+        self.soon.save()
+        res = APIClient().get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_feed_requires_a_valid_token(self):
+        """Test that a forged token is rejected."""
+        res = APIClient().get(FEED_URL, {'token': 'forged:token'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_feed_token_expires(self):
+        """Test that a feed URL stops working after its maximum age."""
+        url = self.feed_url()
+        later = (datetime.datetime.now().timestamp() +
+                 calendar.FEED_TOKEN_MAX_AGE.total_seconds() + 1)
+
+        with mock.patch('time.time', return_value=later):
+            res = APIClient().get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_feed_revoked_with_the_user(self):
+        """Test a deactivation, a role or password change revoke the feed."""
+        for change in ({'is_active': False}, {'role': 'sales'}):
+            url = self.feed_url()
+            get_user_model().objects.filter(pk=self.support_user.pk).update(
+                    **change)
+
+            res = APIClient().get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+            get_user_model().objects.filter(pk=self.support_user.pk).update(
+                    is_active=True, role='support')
+        url = self.feed_url()
+        self.support_user.set_password('newpass')
+        self.support_user.save()
+
+        res = APIClient().get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
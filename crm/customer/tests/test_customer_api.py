@@ -12,6 +12,7 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core import sharding
 from core.models import Customer, Contract, Event
 
 CUSTOMER_URL = reverse("customer-list")
@@ -53,6 +54,7 @@ def get_event_url(customer_id, contract_id, event_id):
 
 class PublicProductApiTests(TestCase):
     """Test the customer API (public)."""
+    databases = '__all__'
 
     def setUp(self):
         self.client = APIClient()
@@ -65,6 +67,7 @@ class PublicProductApiTests(TestCase):
 
 class PrivateCustomerApiTests(TestCase):
     """Test the customer API (private)."""
+    databases = '__all__'
 
     def setUp(self):
         self.sales_client = APIClient()
@@ -96,7 +99,8 @@ class PrivateCustomerApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertEqual(res.data['sales_contact'].get('id'),
                          self.sales_user.id)
-        customer = Customer.objects.get(id=res.data['id'])
+        customer = Customer.objects.using(
+                sharding.shard_of_id(res.data['id'])).get(id=res.data['id'])
         for key in payload.keys():
             assert payload[key] == getattr(customer, key)
 
@@ -127,9 +131,10 @@ class PrivateCustomerApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data['results']), 3)
-        self.assertEqual(res.data['results'][0]['id'], customer1.id)
-        self.assertEqual(res.data['results'][1]['id'], customer2.id)
-        self.assertEqual(res.data['results'][2]['id'], customer3.id)
+        # Ordered by id, the ids of a shard coming after those of the
+        # previous shards.
+        self.assertEqual([customer['id'] for customer in res.data['results']],
+                         sorted([customer1.id, customer2.id, customer3.id]))
 
     def test_sales_user_can_modify_his_assigned_customers_with_put(self):
         """Test that sales user can modify his assigned customers."""
@@ -211,7 +216,8 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
-        exists = Customer.objects.filter(id=customer.id).exists()
+        exists = Customer.objects.using(customer._state.db).filter(
+                id=customer.id).exists()
         self.assertFalse(exists)
 
     def test_sales_user_cannot_delete_an_unassigned_customer(self):
@@ -227,7 +233,8 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
-        exists = Customer.objects.filter(id=customer2.id).exists()
+        exists = Customer.objects.using(customer2._state.db).filter(
+                id=customer2.id).exists()
         self.assertTrue(exists)
 
     def test_sales_user_is_able_to_filter_customer_by_email(self):
@@ -294,7 +301,8 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.post(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
-        contract = Contract.objects.get(id=res.data['id'])
+        contract = Contract.objects.using(
+                sharding.shard_of_id(res.data['id'])).get(id=res.data['id'])
         self.assertEqual(contract.signed, payload['signed'])
         self.assertEqual(contract.amount, payload['amount'])
         self.assertEqual(contract.payment_due, date_in_1_year)
@@ -490,7 +498,7 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Contract.objects.count(), 0)
+        self.assertEqual(sharding.scatter(Contract.objects.all()).count(), 0)
 
     def test_sales_cannot_delete_anothers_contract(self):
         """Test that a sales user cannot delete another's sales contract."""
@@ -512,7 +520,7 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.delete(url)
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(Contract.objects.count(), 1)
+        self.assertEqual(sharding.scatter(Contract.objects.all()).count(), 1)
 
     def test_sales_user_can_search_contract_with_customer_name(self):
         """Test that a sales user can search contracts from a customer name"""
@@ -788,9 +796,10 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.post(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
-        contract = Contract.objects.get(id=res.data['id'])
+        contract = Contract.objects.using(
+                sharding.shard_of_id(res.data['id'])).get(id=res.data['id'])
         self.assertTrue(contract.signed)
-        self.assertTrue(len(Event.objects.all()), 1)
+        self.assertTrue(sharding.scatter(Event.objects.all()).count(), 1)
         event = contract.event
         self.assertEqual(event.customer, customer)
         self.assertEqual(event.support_contact, self.support_user)
@@ -814,9 +823,10 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.patch(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        contract = Contract.objects.get(id=res.data['id'])
+        contract = Contract.objects.using(
+                sharding.shard_of_id(res.data['id'])).get(id=res.data['id'])
         self.assertTrue(contract.signed)
-        self.assertTrue(len(Event.objects.all()), 1)
+        self.assertTrue(sharding.scatter(Event.objects.all()).count(), 1)
         event = contract.event
         self.assertEqual(event.customer, customer1)
         self.assertEqual(event.support_contact, self.support_user)
@@ -844,9 +854,10 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.put(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        contract = Contract.objects.get(id=res.data['id'])
+        contract = Contract.objects.using(
+                sharding.shard_of_id(res.data['id'])).get(id=res.data['id'])
         self.assertTrue(contract.signed)
-        self.assertTrue(len(Event.objects.all()), 1)
+        self.assertTrue(sharding.scatter(Event.objects.all()).count(), 1)
         event = contract.event
         self.assertEqual(event.customer, customer1)
         self.assertEqual(event.support_contact, self.support_user)
@@ -924,7 +935,8 @@ class PrivateCustomerApiTests(TestCase):
         res = self.sales_client.patch(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertEqual(Event.objects.get(id=event.id).attendees, None)
+        self.assertEqual(Event.objects.using(event._state.db).get(
+                id=event.id).attendees, None)
 
     def test_support_user_see_all_events(self):
         """Test that a support user can see all events."""
@@ -985,7 +997,8 @@ class PrivateCustomerApiTests(TestCase):
         res = self.support_client.patch(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(Event.objects.get(id=event.id).attendees, 10)
+        self.assertEqual(Event.objects.using(event._state.db).get(
+                id=event.id).attendees, 10)
 
     def test_support_user_can_modify_an_event_with_put(self):
         """Test that a support user can modify an event."""
@@ -1014,7 +1027,8 @@ class PrivateCustomerApiTests(TestCase):
         res = self.support_client.put(url, payload)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(Event.objects.get(id=event.id).attendees, 10)
+        self.assertEqual(Event.objects.using(event._state.db).get(
+                id=event.id).attendees, 10)
 
     def test_sales_user_see_all_events(self):
         """Test that a sales user can see all events."""
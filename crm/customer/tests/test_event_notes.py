@@ -0,0 +1,119 @@
+"""
+Tests for the notes of the events, stored apart from them.
+"""
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import archive, sharding
+from core.models import ArchivedEvent, Contract, Customer, Event, EventNote
+
+EVENT_URL = reverse("search-event-list")
+
+
+def detail_event_url(customer_id, contract_id, event_id):
+    """Return event detail URL."""
+    return reverse("event-detail", args=[customer_id, contract_id, event_id])
+
+
+class EventNotesTests(TestCase):
+    """Test the notes are read and written only when needed."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com',
+                role='support',
+                password='testpass',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.support_user)
+        self.customer = Customer.objects.create(
+                first_name='Test Name',
+                last_name='User',
+                email='customer@example.com',
+                company='Test Company',
+                sales_contact=self.sales_user,
+                )
+        self.event = Event.objects.create(
+                customer=self.customer, support_contact=self.support_user,
+                notes='Bring the projector')
+        self.contract = Contract.objects.create(
+                signed=True, amount=2000.00, customer=self.customer,
+                sales_contact=self.sales_user, event=self.event,
+                payment_due=datetime.date.today())
+        self.url = detail_event_url(self.customer.pk, self.contract.pk,
+                                    self.event.pk)
+        # The rows all live on the shard of the customer.
+        self.enterContext(sharding.pinned(self.customer._state.db))
+
+    def test_list_omits_notes_unless_asked(self):
+        """Test the lists load the notes only with include_notes."""
+        res = self.client.get(EVENT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('notes', res.data['results'][0])
+
+        res = self.client.get(EVENT_URL, {'include_notes': 'true'})
+
+        self.assertEqual(res.data['results'][0]['notes'],
+                         'Bring the projector')
+
+    def test_detail_serves_notes(self):
+        """Test the detail of an event carries its notes."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['notes'], 'Bring the projector')
+
+    def test_update_without_notes_keeps_them(self):
+        """Test an update leaving the notes out does not rewrite them."""
+        before = EventNote.objects.get(pk=self.event.pk).date_updated
+
+        res = self.client.patch(self.url, {'attendees': 12})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        note = EventNote.objects.get(pk=self.event.pk)
+        self.assertEqual(note.date_updated, before)
+
+        res = self.client.patch(self.url, {'notes': ''})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(EventNote.objects.filter(
+            pk=self.event.pk).exists())
+
+    @override_settings(EVENT_NOTES_COMPRESS_MIN=64)
+    def test_long_notes_compressed(self):
+        """Test the long notes are stored compressed and read back."""
+        text = 'Call the caterer about the menu. ' * 20
+        self.event.notes = text
+        self.event.save()
+
+        note = EventNote.objects.get(pk=self.event.pk)
+        self.assertTrue(note.compressed)
+        self.assertLess(len(note.body), len(text))
+        self.assertEqual(Event.objects.get(pk=self.event.pk).notes, text)
+
+    def test_archived_event_keeps_notes(self):
+        """Test an archived event still has its notes."""
+        long_ago = timezone.now() - datetime.timedelta(days=400)
+        Event.objects.filter(pk=self.event.pk).update(
+                event_closed=True, date_updated=long_ago)
+        Contract.objects.filter(pk=self.contract.pk).update(
+                payment_due=long_ago.date(), date_updated=long_ago)
+
+        archive.archive(days=365)
+
+        self.assertEqual(ArchivedEvent.objects.get(pk=self.event.pk).notes,
+                         'Bring the projector')
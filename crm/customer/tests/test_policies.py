@@ -0,0 +1,108 @@
+"""
+Tests for the ownership policies and the mine scope.
+"""
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import policies
+from core.models import Contract, Customer, Event
+
+CUSTOMER_URL = reverse("customer-list")
+CONTRACT_URL = reverse("search-contract-list")
+EVENT_URL = reverse("search-event-list")
+
+
+class PolicyTests(TestCase):
+    """Test the policies compiled to filters and object checks."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_users = [
+                get_user_model().objects.create_user(
+                    email=f'sales{index}@example.com',
+                    role='sales',
+                    password='testpass',
+                    )
+                for index in range(2)]
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com',
+                role='support',
+                password='testpass',
+                )
+        self.customers = []
+        self.contracts = []
+        for index, sales_user in enumerate(self.sales_users):
+            customer = Customer.objects.create(
+                    first_name='Test Name',
+                    last_name='User',
+                    email=f'customer{index}@example.com',
+                    company='Test Company',
+                    sales_contact=sales_user,
+                    )
+            self.customers.append(customer)
+            self.contracts.append(Contract.objects.create(
+                    sales_contact=sales_user, customer=customer,
+                    amount=Decimal('1000.00'),
+                    payment_due=datetime.date.today()))
+        self.event = Event.objects.create(customer=self.customers[1],
+                                          support_contact=self.support_user)
+        self.contracts[1].event = self.event
+        self.contracts[1].save()
+
+    def list_ids(self, user, url, **params):
+        """Return the ids listed to a user."""
+        client = APIClient()
+        client.force_authenticate(user)
+        res = client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {row['id'] for row in res.data['results']}
+
+    def test_filter_and_object_check_agree(self):
+        """Test the rows matched by the filter are the writable ones."""
+        users = self.sales_users + [self.support_user]
+        for policy, model in ((policies.CUSTOMER, Customer),
+                              (policies.CONTRACT, Contract),
+                              (policies.EVENT, Event)):
+            for user in users:
+                writable = set(model.objects.filter(
+                    policy.write_filter(user)).values_list('pk', flat=True))
+                self.assertEqual(writable, {
+                    obj.pk for obj in model.objects.all()
+                    if policy.can_write_object(user, obj)})
+
+    def test_mine_scope_of_sales_user(self):
+        """Test a sales user only lists their customers and contracts."""
+        sales_user = self.sales_users[0]
+
+        self.assertEqual(self.list_ids(sales_user, CUSTOMER_URL,
+                                       scope='mine'),
+                         {self.customers[0].id})
+        self.assertEqual(self.list_ids(sales_user, CONTRACT_URL,
+                                       scope='mine'),
+                         {self.contracts[0].id})
+        self.assertEqual(self.list_ids(sales_user, CONTRACT_URL),
+                         {contract.id for contract in self.contracts})
+
+    def test_mine_scope_of_support_user(self):
+        """Test a support user lists the rows related to their events."""
+        for url, expected in ((EVENT_URL, self.event.id),
+                              (CUSTOMER_URL, self.customers[1].id),
+                              (CONTRACT_URL, self.contracts[1].id)):
+            self.assertEqual(self.list_ids(self.support_user, url,
+                                           scope='mine'), {expected})
+
+    def test_invalid_scope(self):
+        """Test an unknown scope is refused."""
+        client = APIClient()
+        client.force_authenticate(self.support_user)
+
+        res = client.get(EVENT_URL, {'scope': 'theirs'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,154 @@
+"""
+Tests for the per-customer rollups.
+"""
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import sharding
+from core.models import Customer, Contract, Event
+
+CUSTOMER_URL = reverse("customer-list")
+
+
+def create_customer(sales_user, email, **params):
+    """Create and return a new customer."""
+    defaults = {
+            'first_name': 'Test Name',
+            'last_name': 'User',
+            'email': email,
+            'company': 'Test Company',
+            }
+    defaults.update(params)
+    return Customer.objects.create(sales_contact=sales_user, **defaults)
+
+
+def create_contract(sales_user, customer, **params):
+    """Create and return a new contract."""
+    defaults = {
+            'signed': False,
+            'amount': Decimal('1000.00'),
+            'payment_due': datetime.date.today(),
+            }
+    defaults.update(params)
+    return Contract.objects.create(sales_contact=sales_user,
+                                   customer=customer, **defaults)
+
+
+class CustomerRollupTests(TestCase):
+    """Test the maintained contract and event rollups of customers."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.sales_user)
+        self.customer = create_customer(self.sales_user,
+                                        'customer@example.com')
+        self.other_customer = create_customer(self.sales_user,
+                                              'other@example.com')
+        # The rows all live on the shard of the sales user.
+        self.db = self.customer._state.db
+        self.enterContext(sharding.pinned(self.db))
+
+    def rollups(self, customer):
+        """Return the rollups of a customer as stored in the database."""
+        customer.refresh_from_db()
+        return (customer.contract_count, customer.signed_amount,
+                customer.open_event_count)
+
+    def test_rollups_follow_contract_changes(self):
+        """Test creating, signing, moving and deleting contracts."""
+        contract = create_contract(self.sales_user, self.customer)
+        create_contract(self.sales_user, self.customer, signed=True,
+                        amount=Decimal('250.00'))
+        self.assertEqual(self.rollups(self.customer),
+                         (2, Decimal('250.00'), 0))
+        self.assertEqual(self.customer.last_activity,
+                         Contract.objects.latest('date_updated').date_updated)
+
+        contract.signed = True
+        contract.save()
+        self.assertEqual(self.rollups(self.customer),
+                         (2, Decimal('1250.00'), 0))
+
+        contract.customer = self.other_customer
+        contract.save()
+        self.assertEqual(self.rollups(self.customer),
+                         (1, Decimal('250.00'), 0))
+        self.assertEqual(self.rollups(self.other_customer),
+                         (1, Decimal('1000.00'), 0))
+
+        contract.delete()
+        self.assertEqual(self.rollups(self.other_customer),
+                         (0, Decimal('0.00'), 0))
+
+    def test_rollups_follow_event_changes(self):
+        """Test the open event count when events are closed and deleted."""
+        contract = create_contract(self.sales_user, self.customer,
+                                   signed=True)
+        event = Event.objects.create(customer=self.customer,
+                                     contract=contract)
+        Event.objects.create(customer=self.customer, contract=contract)
+        self.assertEqual(self.rollups(self.customer)[2], 2)
+
+        event.event_closed = True
+        event.save()
+        self.assertEqual(self.rollups(self.customer)[2], 1)
+
+        Event.objects.filter(pk=event.pk).get().delete()
+        self.assertEqual(self.rollups(self.customer)[2], 1)
+
+    def test_reconcile_command(self):
+        """Test the command recomputes rollups drifted by bulk updates."""
+        create_contract(self.sales_user, self.customer)
+        Contract.objects.update(signed=True)
+        self.assertEqual(self.rollups(self.customer),
+                         (1, Decimal('0.00'), 0))
+
+        out = io.StringIO()
+        call_command('reconcile_rollups', stdout=out)
+
+        self.assertIn('2 customer rollups reconciled.', out.getvalue())
+        self.assertEqual(self.rollups(self.customer),
+                         (1, Decimal('1000.00'), 0))
+        self.assertEqual(self.rollups(self.other_customer),
+                         (0, Decimal('0.00'), 0))
+
+    def test_list_customers_sorted_and_filtered_by_rollups(self):
+        """Test the rollups are listed, sortable and filterable."""
+        create_contract(self.sales_user, self.other_customer, signed=True,
+                        amount=Decimal('500.00'))
+
+        with self.assertNumQueries(2, using=self.db):
+            res = self.client.get(CUSTOMER_URL,
+                                  {'ordering': '-signed_amount'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']
+        self.assertEqual([customer['id'] for customer in results],
+                         [self.other_customer.id, self.customer.id])
+        self.assertEqual(results[0]['contract_count'], 1)
+        self.assertEqual(results[0]['signed_amount'], '500.00')
+
+        res = self.client.get(CUSTOMER_URL, {'min_signed_amount': '100'})
+        self.assertEqual([customer['id'] for customer in res.data['results']],
+                         [self.other_customer.id])
+
+    def test_list_customers_invalid_ordering(self):
+        """Test ordering on a field without a rollup is refused."""
+        res = self.client.get(CUSTOMER_URL, {'ordering': 'email'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
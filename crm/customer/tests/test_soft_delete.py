@@ -0,0 +1,157 @@
+"""
+Tests for the soft deletion of customers, contracts and events.
+"""
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import sharding
+from core.models import (
+        AuditEntry,
+        Contract,
+        Customer,
+        Event,
+        PipelineSummary,
+        Tombstone,
+        )
+
+CUSTOMER_URL = reverse("customer-list")
+
+
+def detail_customer_url(customer_id):
+    """Return the detail URL of a customer."""
+    return reverse("customer-detail", args=[customer_id])
+
+
+def create_customer(sales_user, email):
+    """Create and return a new customer."""
+    return Customer.objects.create(
+            sales_contact=sales_user, first_name='Test Name',
+            last_name='User', email=email, company='Test Company')
+
+
+class SoftDeleteTests(TestCase):
+    """Test deleting, restoring and purging rows."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.sales_user)
+        # The rows all live on the shard of the sales user, their audit
+        # entries are committed.
+        self.db = sharding.shard_of_user(self.sales_user.pk)
+        self.enterContext(sharding.pinned(self.db))
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            self.customer = create_customer(self.sales_user,
+                                            'customer@example.com')
+            self.event = Event.objects.create(customer=self.customer)
+            self.signed = Contract.objects.create(
+                    sales_contact=self.sales_user, customer=self.customer,
+                    signed=True, amount=Decimal('1000.00'),
+                    payment_due=datetime.date.today(), event=self.event)
+            self.unsigned = Contract.objects.create(
+                    sales_contact=self.sales_user, customer=self.customer,
+                    amount=Decimal('500.00'),
+                    payment_due=datetime.date.today())
+
+    def test_delete_customer_hides_it_and_its_events(self):
+        """Test an API delete only marks the customer deleted."""
+        with CaptureQueriesContext(connections[self.db]) as queries:
+            res = self.client.delete(detail_customer_url(self.customer.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse([
+            query for query in queries if query['sql'].startswith((
+                'DELETE FROM "core_customer"', 'DELETE FROM "core_contract"',
+                'DELETE FROM "core_event"'))])
+        self.assertEqual([
+            query['sql'].split(' SET ')[0] for query in queries
+            if query['sql'].startswith('UPDATE') and
+            '"deleted_at" =' in query['sql'].split(' WHERE ')[0]],
+            ['UPDATE "core_customer"'])
+        self.assertFalse(Event.all_objects.filter(
+            deleted_at__isnull=False).exists())
+        self.assertFalse(Customer.objects.filter(
+            pk=self.customer.pk).exists())
+        self.assertIsNotNone(Customer.all_objects.get(
+            pk=self.customer.pk).deleted_at)
+        self.assertFalse(Event.objects.exists())
+        self.assertEqual(list(Contract.objects.values_list('id', flat=True)),
+                         [self.unsigned.id])
+        self.assertEqual(set(Tombstone.objects.values_list(
+            'model', 'object_id')), {('customer', self.customer.id),
+                                     ('event', self.event.id),
+                                     ('contract', self.signed.id)})
+        self.assertEqual(list(PipelineSummary.objects.values_list(
+            'signed', 'contract_count')), [(False, 1)])
+
+    def test_deleted_email_can_be_reused(self):
+        """Test the email of a deleted customer is free again."""
+        self.customer.delete()
+
+        res = self.client.post(CUSTOMER_URL, {
+            'first_name': 'Test Name', 'last_name': 'User',
+            'email': 'customer@example.com', 'company': 'Test Company'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_restore_brings_back_cascaded_rows(self):
+        """Test restoring a customer restores the rows deleted with it."""
+        self.customer.delete()
+        self.customer.restore()
+
+        self.assertTrue(Customer.objects.filter(pk=self.customer.pk).exists())
+        self.assertEqual(Contract.objects.count(), 2)
+        self.assertFalse(Tombstone.objects.exists())
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.contract_count,
+                          self.customer.signed_amount,
+                          self.customer.open_event_count),
+                         (2, Decimal('1000.00'), 1))
+
+    def test_purge_removes_old_deleted_rows(self):
+        """Test the purge removes the rows deleted before the retention."""
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            self.customer.delete()
+        Customer.all_objects.update(
+            deleted_at=timezone.now() - datetime.timedelta(days=60))
+        out = io.StringIO()
+
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            call_command('purge_deleted', days=30, stdout=out)
+
+        self.assertIn('3 deleted rows purged.', out.getvalue())
+        self.assertFalse(Customer.all_objects.exists())
+        self.assertFalse(Event.all_objects.exists())
+        self.assertEqual(set(AuditEntry.objects.filter(
+            action='delete').values_list('model', 'object_id')), {
+                ('customer', self.customer.id), ('event', self.event.id),
+                ('contract', self.signed.id)})
+        self.unsigned.refresh_from_db()
+        self.assertIsNone(self.unsigned.customer_id)
+        self.assertIsNone(self.unsigned.deleted_at)
+
+    def test_purge_keeps_recent_deletions(self):
+        """Test the rows deleted within the retention stay restorable."""
+        self.unsigned.delete()
+
+        call_command('purge_deleted', stdout=io.StringIO())
+
+        self.assertTrue(Contract.all_objects.filter(
+            pk=self.unsigned.pk).exists())
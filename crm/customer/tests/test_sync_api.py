@@ -0,0 +1,142 @@
+"""
+Tests for the incremental sync of the lists.
+"""
+import datetime
+import unittest.mock
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import sharding
+from core.models import Customer, Tombstone
+
+CUSTOMER_URL = reverse("customer-list")
+
+
+def create_customer(sales_user, email, **params):
+    """Create and return a new customer."""
+    defaults = {
+            'first_name': 'Test Name',
+            'last_name': 'User',
+            'email': email,
+            'company': 'Test Company',
+            }
+    defaults.update(params)
+    return Customer.objects.create(sales_contact=sales_user, **defaults)
+
+
+@override_settings(SYNC_SAFETY_WINDOW=0)
+class SyncApiTests(TestCase):
+    """Test the updated_since and cursor parameters of the lists."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.sales_user)
+        self.since = timezone.now() - datetime.timedelta(minutes=1)
+        self.customers = [
+                create_customer(self.sales_user, f'customer{index}@test.com')
+                for index in range(5)]
+        # The rows all live on the shard of the sales user.
+        self.db = self.customers[0]._state.db
+        self.enterContext(sharding.pinned(self.db))
+
+    def test_sync_pages_through_rows_sharing_a_timestamp(self):
+        """Test every row is returned once, in (date_updated, id) order."""
+        Customer.objects.update(date_updated=timezone.now())
+        ids = []
+        params = {'updated_since': self.since.isoformat()}
+        with unittest.mock.patch('customer.sync.SYNC_PAGE_SIZE', 2):
+            while True:
+                res = self.client.get(CUSTOMER_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                ids += [customer['id'] for customer in res.data['results']]
+                params = {'cursor': res.data['cursor']}
+                if not res.data['more']:
+                    break
+
+        self.assertEqual(ids, [customer.id for customer in self.customers])
+        res = self.client.get(CUSTOMER_URL, params)
+        self.assertEqual(res.data['results'], [])
+
+    def test_sync_returns_updates_and_deletions_after_cursor(self):
+        """Test a later sync only returns what changed since the cursor."""
+        res = self.client.get(CUSTOMER_URL,
+                              {'updated_since': self.since.isoformat()})
+        cursor = res.data['cursor']
+        updated, deleted_id = self.customers[1], self.customers[3].id
+        updated.company = 'New Company'
+        updated.save()
+        self.customers[3].delete()
+
+        res = self.client.get(CUSTOMER_URL, {'cursor': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([customer['id'] for customer in res.data['results']],
+                         [updated.id])
+        self.assertEqual(res.data['deleted'], [deleted_id])
+
+    def test_sync_waits_for_running_transactions(self):
+        """Test the changes made during a write transaction wait for it."""
+        other = connections.create_connection(self.db)
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT pg_current_xact_id()')
+        updated = self.customers[2]
+        updated.company = 'New Company'
+        updated.save()
+
+        res = self.client.get(CUSTOMER_URL,
+                              {'updated_since': self.since.isoformat()})
+
+        self.assertNotIn(updated.id, [customer['id']
+                                      for customer in res.data['results']])
+        with other.cursor() as cursor:
+            cursor.execute('COMMIT')
+        res = self.client.get(CUSTOMER_URL, {'cursor': res.data['cursor']})
+        self.assertEqual([customer['id'] for customer in res.data['results']],
+                         [updated.id])
+
+    def test_invalid_sync_position(self):
+        """Test an invalid timestamp or cursor is refused."""
+        res = self.client.get(CUSTOMER_URL, {'updated_since': 'yesterday'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(CUSTOMER_URL, {'cursor': 'invalid'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_sync_position(self):
+        """Test a position older than the tombstones kept is gone."""
+        since = timezone.now() - datetime.timedelta(days=365)
+
+        res = self.client.get(CUSTOMER_URL,
+                              {'updated_since': since.isoformat()})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_purge_tombstones(self):
+        """Test the command deletes the tombstones past the retention."""
+        expired_id, kept_id = self.customers[0].id, self.customers[1].id
+        self.customers[0].delete()
+        self.customers[1].delete()
+        Tombstone.objects.filter(object_id=expired_id).update(
+                date_deleted=timezone.now() - datetime.timedelta(days=365))
+
+        call_command('purge_tombstones', stdout=unittest.mock.Mock())
+
+        self.assertEqual(list(Tombstone.objects.values_list('object_id',
+                                                            flat=True)),
+                         [kept_id])
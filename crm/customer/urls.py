@@ -23,6 +23,8 @@ event_router = routers.NestedSimpleRouter(contract_router, r"contract",
 event_router.register(r"event", views.EventViewSet)
 
 urlpatterns = [
+        path("event/calendar.ics", views.calendar_feed,
+             name="event-calendar-feed"),
         path("", include(router.urls)),
         path("", include(contract_router.urls)),
         path("", include(event_router.urls)),
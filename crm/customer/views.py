@@ -1,9 +1,17 @@
 """
 Views for the customer APIs.
 """
+import contextlib
 import datetime
 import logging
+
+from django.db.models import F
+from django.http import HttpResponseNotFound, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.timezone import make_aware
+from django.views.decorators.http import condition, require_GET
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import (
         IsAuthenticated,
@@ -15,26 +23,87 @@ from rest_framework.authentication import (
         )
 
 
-from core.models import Customer, Contract, Event
+from core import identity, notes, policies, sharding
+from core.models import (
+        ArchivedContract,
+        ArchivedEvent,
+        Customer,
+        Contract,
+        Event,
+        )
 
+from customer import calendar
 from customer import serializers
 from customer import permissions
+from customer.archived import ArchiveMixin
+from customer.shards import ShardMixin
+from customer.sync import SyncMixin
 
 logger = logging.getLogger('django')
 
+CALENDAR_DAYS = 7
+CALENDAR_MAX_DAYS = 366
+SCOPES = ('all', 'mine')
+CUSTOMER_ORDERING = ('contract_count', 'signed_amount', 'open_event_count',
+                     'last_activity')
+
+
+def scope_filter(request, policy, model):
+    """
+    Return the filter of the requested scope, None for every row. Raise
+    ValueError for an unknown scope.
+    """
+    scope = request.query_params.get('scope', 'all')
+    if scope not in SCOPES:
+        raise ValueError(scope)
+    if scope == 'mine':
+        return policy.scope_filter(request.user, model)
+    return None
+
+
+def include_notes(request):
+    """Return whether the request asks for the notes of the listed events."""
+    return request.query_params.get('include_notes', '').lower() in (
+        'true', '1')
+
+
+def invalid_scope():
+    """Return the response to an unknown scope."""
+    logger.error('Invalid scope.')
+    return Response(
+            {'error': 'Invalid scope.'},
+            status=status.HTTP_400_BAD_REQUEST
+            )
 
-class CustomerViewSet(viewsets.ModelViewSet):
+
+class IdentityMapMixin:
+    """Add the row of a detail route to the identity map of the request."""
+
+    def get_object(self):
+        return identity.add(super().get_object())
+
+
+class CustomerViewSet(ShardMixin, IdentityMapMixin, SyncMixin,
+                      viewsets.ModelViewSet):
     """Manage customers in the database."""
     serializer_class = serializers.CustomerSerializer
     permission_classes = (IsAuthenticated, permissions.IsSalesOwnerOrReadOnly,
                           )
-    queryset = Customer.objects.all()
+    queryset = Customer.objects.select_related(
+            'sales_contact', 'organization').order_by('id')
+    policy = policies.CUSTOMER
 
     def get_queryset(self):
         return self.queryset.all()
 
     def list(self, request, *args, **kwargs):
         """Return a list of customers."""
+        try:
+            scope = scope_filter(request, self.policy, Customer)
+        except ValueError:
+            return invalid_scope()
+        if scope is not None:
+            self.queryset = self.queryset.filter(scope)
         email = request.query_params.get('email', None)
         if email is not None:
             self.queryset = self.queryset.filter(email__iexact=email)
@@ -43,35 +112,100 @@ class CustomerViewSet(viewsets.ModelViewSet):
             self.queryset = self.queryset.filter(
                     last_name__icontains=name
                     )
+        open_events = request.query_params.get('open_events', None)
+        if open_events is not None:
+            if open_events.lower() in ('true', '1'):
+                self.queryset = self.queryset.filter(open_event_count__gt=0)
+            else:
+                self.queryset = self.queryset.filter(open_event_count=0)
+        min_signed_amount = request.query_params.get('min_signed_amount',
+                                                     None)
+        if min_signed_amount is not None:
+            try:
+                self.queryset = self.queryset.filter(
+                        signed_amount__gte=float(min_signed_amount))
+            except ValueError:
+                logger.error('Amount must be a float.')
+                return Response(
+                        {'error': 'Invalid amount'},
+                        status=status.HTTP_400_BAD_REQUEST
+                        )
+        ordering = request.query_params.get('ordering', None)
+        if ordering is not None:
+            if ordering.lstrip('-') not in CUSTOMER_ORDERING:
+                logger.error('Invalid ordering.')
+                return Response(
+                        {'error': 'Invalid ordering.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                        )
+            field = ordering.lstrip('-')
+            if ordering.startswith('-'):
+                self.queryset = self.queryset.order_by(
+                        F(field).desc(nulls_last=True), '-id')
+            else:
+                self.queryset = self.queryset.order_by(
+                        F(field).asc(nulls_first=True), 'id')
         return super().list(request, *args, **kwargs)
 
+    def email_lock(self, request):
+        """Lock the email of the request until its customer is saved."""
+        email = request.data.get('email', None)
+        if not email:
+            return contextlib.nullcontext()
+        return sharding.locked(f'customer.email:{email}')
+
+    def create(self, request, *args, **kwargs):
+        """Create a customer on the shard of its sales contact."""
+        with sharding.pinned(sharding.shard_of_user(request.user.pk)), \
+                self.email_lock(request):
+            return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        """Update a customer, its email staying unique on every shard."""
+        with self.email_lock(request):
+            return super().update(request, *args, **kwargs)
+
 
-class ContractViewSet(viewsets.ModelViewSet):
+class ContractViewSet(ShardMixin, IdentityMapMixin, ArchiveMixin, SyncMixin,
+                      viewsets.ModelViewSet):
     """Manage contracts in the database."""
     serializer_class = serializers.ContractSerializer
     permission_classes = (IsAuthenticated,
                           permissions.IsSalesOwnerOrReadOnly,
                           )
-    queryset = Contract.objects.all()
+    queryset = Contract.objects.order_by('id')
+    archived_queryset = ArchivedContract.objects.all()
+    archived_serializer_class = serializers.ArchivedContractSerializer
+    policy = policies.CONTRACT
 
     def get_queryset(self):
         return self.queryset.all()
 
     def list(self, request, *args, **kwargs):
         """Return a list of contracts."""
+        try:
+            scopes = [scope_filter(request, self.policy, queryset.model)
+                      for queryset in (self.queryset,
+                                       self.archived_queryset)]
+        except ValueError:
+            return invalid_scope()
+        if scopes[0] is not None:
+            self.queryset = self.queryset.filter(scopes[0])
+            self.archived_queryset = self.archived_queryset.filter(
+                    scopes[1])
         email = request.query_params.get('email', None)
         if email is not None:
-            self.queryset = self.queryset.filter(customer__email__iexact=email)
+            self.filter_lists(customer__email__iexact=email)
         last_name = request.query_params.get('last_name', None)
         if last_name is not None:
-            self.queryset = self.queryset.filter(
+            self.filter_lists(
                     customer__last_name__icontains=last_name
                     )
         date = request.query_params.get('date', None)
         if date is not None:
             try:
                 date_obj = datetime.datetime.strptime(date, "%Y-%m-%d")
-                self.queryset = self.queryset.filter(
+                self.filter_lists(
                         date_created__date=date_obj
                         )
             except ValueError:
@@ -90,7 +224,7 @@ class ContractViewSet(viewsets.ModelViewSet):
                         {'error': 'Invalid amount'},
                         status=status.HTTP_400_BAD_REQUEST
                         )
-            self.queryset = self.queryset.filter(
+            self.filter_lists(
                     amount__range=(amount-100, amount+100)
                     )
         return super().list(request, *args, **kwargs)
@@ -106,14 +240,14 @@ class ContractViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                     )
         try:
-            customer = Customer.objects.get(id=customer_pk)
+            customer = identity.get(Customer, customer_pk)
         except Customer.DoesNotExist:
             logger.error('Customer does not exist.')
             return Response(
                     {'error': 'Customer does not exist.'},
                     status=status.HTTP_400_BAD_REQUEST
                     )
-        if customer.sales_contact != request.user:
+        if customer.sales_contact_id != request.user.pk:
             logger.error('Customer does not belong to user.')
             return Response(
                     {'error': 'Customer does not belong to user.'},
@@ -211,39 +345,72 @@ class ContractViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ShardMixin, IdentityMapMixin, ArchiveMixin, SyncMixin,
+                   viewsets.ModelViewSet):
     """Manage events in the database."""
 
     serializer_class = serializers.EventSerializer
     permission_classes = (IsAuthenticated,
                           permissions.IsSupportOwnerOrReadOnly,
                           )
-    queryset = Event.objects.all()
+    queryset = Event.objects.order_by('id')
+    archived_queryset = ArchivedEvent.objects.all()
+    archived_serializer_class = serializers.ArchivedEventSerializer
+    policy = policies.EVENT
 
     def get_queryset(self):
         return self.queryset.all()
 
+    def with_notes(self):
+        """Return whether the notes are served: on details or when asked."""
+        return self.detail or include_notes(self.request)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(),
+                'with_notes': self.with_notes()}
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args and self.with_notes():
+            notes.attach(args[0])
+        return super().get_serializer(*args, **kwargs)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.with_notes():
+            notes.attach(page)
+        return page
+
     def create(self, request, *args, **kwargs):
         return Response(
                 {'error': 'You cannot create an event this way.'})
 
     def list(self, request, *args, **kwargs):
         """Return a list of events."""
+        try:
+            scopes = [scope_filter(request, self.policy, queryset.model)
+                      for queryset in (self.queryset,
+                                       self.archived_queryset)]
+        except ValueError:
+            return invalid_scope()
+        if scopes[0] is not None:
+            self.queryset = self.queryset.filter(scopes[0])
+            self.archived_queryset = self.archived_queryset.filter(
+                    scopes[1])
         email = request.query_params.get('email', None)
         if email is not None:
-            self.queryset = self.queryset.filter(
+            self.filter_lists(
                     customer__email__iexact=email
                     )
         last_name = request.query_params.get('name', None)
         if last_name is not None:
-            self.queryset = self.queryset.filter(
+            self.filter_lists(
                     customer__last_name__icontains=last_name
                     )
         date = request.query_params.get('date', None)
         if date is not None:
             try:
                 date_obj = datetime.datetime.strptime(date, "%Y-%m-%d")
-                self.queryset = self.queryset.filter(
+                self.filter_lists(
                         event_date__date=date_obj
                         )
             except ValueError:
@@ -283,3 +450,85 @@ class EventViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request, *args, **kwargs):
+        """Return the open events of the user between two dates."""
+        try:
+            start = datetime.datetime.strptime(
+                    request.query_params.get(
+                        'from', datetime.date.today().isoformat()),
+                    "%Y-%m-%d").date()
+            end = (datetime.datetime.strptime(request.query_params['to'],
+                                              "%Y-%m-%d").date()
+                   if 'to' in request.query_params
+                   else start + datetime.timedelta(days=CALENDAR_DAYS))
+        except ValueError:
+            logger.error('Invalid date format.')
+            return Response(
+                    {'error': 'Invalid date format.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        if not start <= end <= start + datetime.timedelta(
+                days=CALENDAR_MAX_DAYS):
+            logger.error('Invalid calendar window.')
+            return Response(
+                    {'error': 'Invalid calendar window.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        events = Event.objects.filter(
+                support_contact=request.user,
+                event_closed=False,
+                event_date__gte=make_aware(
+                    datetime.datetime.combine(start, datetime.time.min)),
+                event_date__lt=make_aware(datetime.datetime.combine(
+                    end + datetime.timedelta(days=1), datetime.time.min)),
+                ).order_by('event_date')
+        feed = reverse('event-calendar-feed')
+        return Response({
+            'from': start,
+            'to': end,
+            'feed': request.build_absolute_uri(
+                f'{feed}?token={calendar.make_token(request.user)}'),
+            'results': self.get_serializer(sharding.scatter(events)[:],
+                                           many=True).data,
+            })
+
+
+def calendar_state(request):
+    """Return the user and state of the requested calendar feed."""
+    if not hasattr(request, 'calendar_state'):
+        user_id = calendar.read_token(request.GET.get('token', ''))
+        request.calendar_state = (
+            (user_id, calendar.feed_state(user_id)) if user_id is not None
+            else (None, None))
+    return request.calendar_state
+
+
+def calendar_etag(request):
+    """Return the ETag of the calendar feed of the token's user."""
+    user_id, state = calendar_state(request)
+    if user_id is None:
+        return None
+    updated = state['updated'].timestamp() if state['updated'] else 0
+    return f'{user_id}-{state["count"]}-{updated}'
+
+
+def calendar_last_modified(request):
+    """Return the last update of the calendar feed of the token's user."""
+    user_id, state = calendar_state(request)
+    return state['updated'] if user_id is not None else None
+
+
+@require_GET
+@condition(etag_func=calendar_etag, last_modified_func=calendar_last_modified)
+def calendar_feed(request):
+    """Stream the iCalendar feed of a support user."""
+    user_id, _ = calendar_state(request)
+    if user_id is None:
+        return HttpResponseNotFound()
+    response = StreamingHttpResponse(calendar.render(user_id),
+                                     content_type='text/calendar; '
+                                                  'charset=utf-8')
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
@@ -0,0 +1,143 @@
+"""
+Vectorized aggregations over the columnar snapshots.
+"""
+import datetime
+
+import numpy as np
+
+NAT = np.datetime64('NaT').astype(np.int64)
+AGING_BOUNDS = (1, 31, 61, 91)
+AGING_LABELS = ('current', '1-30', '31-60', '61-90', '90+')
+
+
+def dictionary_keys(codes, dictionary):
+    """Group by a dictionary encoded foreign key."""
+    def label(code):
+        return None if code < 0 else int(dictionary[code])
+    return np.asarray(codes), label
+
+
+def month_keys(dates):
+    """Group dates by month."""
+    months = np.asarray(dates).astype('datetime64[M]').view(np.int64)
+
+    def label(month):
+        if month == NAT:
+            return None
+        return str(np.datetime64(int(month), 'M'))
+    return months, label
+
+
+def bool_keys(values):
+    """Group by a boolean column."""
+    return np.asarray(values).astype(np.int8), bool
+
+
+def aging_keys(payment_due, today=None):
+    """Group by days past the payment due date."""
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    days = (today - np.asarray(payment_due)).astype(np.int64)
+    buckets = np.digitize(days, AGING_BOUNDS)
+    return buckets, lambda bucket: AGING_LABELS[bucket]
+
+
+def group_stats(keys, values, percentiles):
+    """
+    Return count, sum, mean and percentiles of values per distinct key,
+    sorting once by (key, value) instead of looping over the rows.
+    """
+    if not len(keys):
+        return []
+    groups, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(groups))
+    sums = np.bincount(inverse, weights=values, minlength=len(groups))
+    ordered = values[np.lexsort((values, inverse))]
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    stats = []
+    for index, group in enumerate(groups):
+        group_values = ordered[bounds[index]:bounds[index + 1]]
+        stats.append({
+            'key': group,
+            'count': int(counts[index]),
+            'sum': float(sums[index]),
+            'mean': float(sums[index] / counts[index]),
+            'percentiles': dict(zip(
+                (str(rank) for rank in percentiles),
+                (float(value) for value in np.percentile(group_values,
+                                                         percentiles)))),
+            })
+    return stats
+
+
+def histogram(values, bins):
+    """Return the histogram of values in `bins` equal width bins."""
+    counts, edges = np.histogram(values, bins=bins)
+    return {'edges': [float(edge) for edge in edges],
+            'counts': [int(count) for count in counts]}
+
+
+def contracts(snapshot, filters):
+    """Return the groupings and the amounts of the contract dataset."""
+    mask = np.ones(len(snapshot['contract_id']), dtype=bool)
+    if 'signed' in filters:
+        mask &= snapshot['contract_signed'] == filters['signed']
+    amounts = snapshot['contract_amount'][mask] / 100
+    groupings = {
+        'sales_contact': lambda: dictionary_keys(
+            snapshot['contract_sales_contact'][mask], snapshot['users']),
+        'customer': lambda: dictionary_keys(
+            snapshot['contract_customer'][mask], snapshot['customers']),
+        'month': lambda: month_keys(
+            snapshot['contract_date_created'][mask]),
+        'due_month': lambda: month_keys(
+            snapshot['contract_payment_due'][mask]),
+        'signed': lambda: bool_keys(snapshot['contract_signed'][mask]),
+        'aging': lambda: aging_keys(snapshot['contract_payment_due'][mask]),
+        }
+    return groupings, amounts
+
+
+def events(snapshot, filters):
+    """
+    Return the groupings and the attendees of the event dataset, leaving
+    out the events without attendees.
+    """
+    mask = snapshot['event_attendees'] >= 0
+    if 'closed' in filters:
+        mask &= snapshot['event_closed'] == filters['closed']
+    attendees = snapshot['event_attendees'][mask].astype(np.float64)
+    groupings = {
+        'support_contact': lambda: dictionary_keys(
+            snapshot['event_support_contact'][mask], snapshot['users']),
+        'customer': lambda: dictionary_keys(
+            snapshot['event_customer'][mask], snapshot['customers']),
+        'month': lambda: month_keys(snapshot['event_date'][mask]),
+        'closed': lambda: bool_keys(snapshot['event_closed'][mask]),
+        }
+    return groupings, attendees
+
+
+DATASETS = {
+    'contracts': contracts,
+    'events': events,
+}
+
+
+def analyze(snapshot, dataset, group_by=None, filters=None,
+            percentiles=(50, 90, 99), bins=None):
+    """
+    Aggregate the metric of a dataset (contract amount or event attendees)
+    per group. Raise KeyError for an unknown dataset or grouping.
+    """
+    groupings, values = DATASETS[dataset](snapshot, filters or {})
+    if group_by is None:
+        keys, label = np.zeros(len(values), dtype=np.int8), lambda key: None
+    else:
+        keys, label = groupings[group_by]()
+    stats = group_stats(keys, values, list(percentiles))
+    for entry in stats:
+        entry['key'] = label(entry['key'])
+    result = {'groups': stats}
+    if bins:
+        result['histogram'] = histogram(values, bins)
+    return result
@@ -0,0 +1,71 @@
+"""
+Serializers for the report APIs.
+"""
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.models import AuditEntry
+
+from customer.serializers import ContractSerializer
+
+
+class PipelineSerializer(serializers.Serializer):
+    """Serializer for the sales pipeline of a sales contact in a month."""
+    sales_contact = serializers.IntegerField(allow_null=True)
+    month = serializers.DateField(format="%Y-%m")
+    signed_count = serializers.IntegerField()
+    signed_amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    unsigned_count = serializers.IntegerField()
+    unsigned_amount = serializers.DecimalField(max_digits=14,
+                                               decimal_places=2)
+    conversion_rate = serializers.FloatField()
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """Serializer for the query parameters of the analytics API."""
+    group_by = serializers.CharField(required=False)
+    percentiles = serializers.CharField(required=False, default='50,90,99')
+    bins = serializers.IntegerField(required=False, min_value=1,
+                                    max_value=1000)
+
+    def validate_percentiles(self, value):
+        """Check that percentiles are numbers between 0 and 100."""
+        try:
+            percentiles = [float(rank) for rank in value.split(',')]
+        except ValueError:
+            raise serializers.ValidationError(
+                "Percentiles must be comma separated numbers.")
+        if any(rank < 0 or rank > 100 for rank in percentiles):
+            raise serializers.ValidationError(
+                "Percentiles must be between 0 and 100.")
+        return percentiles
+
+
+class OverdueContractSerializer(ContractSerializer):
+    """Serializer for the overdue contracts."""
+    days_overdue = serializers.SerializerMethodField()
+
+    class Meta(ContractSerializer.Meta):
+        fields = ContractSerializer.Meta.fields + ('days_overdue',)
+
+    def get_days_overdue(self, obj):
+        """Return the number of days since the payment was due."""
+        return (timezone.localdate() - obj.payment_due).days
+
+
+class AuditEntrySerializer(serializers.ModelSerializer):
+    """Serializer for the audit trail entries."""
+
+    class Meta:
+        model = AuditEntry
+        fields = (
+                'id',
+                'date_created',
+                'actor',
+                'model',
+                'object_id',
+                'action',
+                'changes',
+                'request_id',
+                )
+        read_only_fields = fields
@@ -0,0 +1,124 @@
+"""
+Tests for the analytics api.
+"""
+import datetime
+import io
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import snapshots
+from core.models import Customer, Contract, Event
+
+
+def analytics_url(dataset):
+    """Return the analytics URL of a dataset."""
+    return reverse("report-analytics", args=[dataset])
+
+
+class AnalyticsApiTests(TestCase):
+    """Test the analytics computed on the columnar snapshots."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.snapshot_dir.cleanup)
+        self.settings = override_settings(SNAPSHOT_DIR=self.snapshot_dir.name)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com', role='sales', password='testpass')
+        self.support_user = get_user_model().objects.create_user(
+                email='support@example.com', role='support',
+                password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(
+                email='management@example.com', role='management',
+                password='testpass'))
+        customer = Customer.objects.create(
+                first_name='Test Name', last_name='User',
+                email='customer@example.com', company='Test Company',
+                sales_contact=self.sales_user)
+        today = datetime.date.today()
+        for amount, signed, days in ((100, True, -45), (300, True, 10),
+                                     (200, False, -5)):
+            Contract.objects.create(
+                    sales_contact=self.sales_user, customer=customer,
+                    amount=Decimal(amount), signed=signed,
+                    payment_due=today + datetime.timedelta(days=days))
+        for attendees in (10, 30, None):
+            Event.objects.create(
+                    customer=customer, support_contact=self.support_user,
+                    attendees=attendees,
+                    event_date=make_aware(datetime.datetime(2030, 5, 1)))
+
+    def test_no_snapshot(self):
+        """Test the error returned before the first export."""
+        res = self.client.get(analytics_url('contracts'))
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_contract_amounts_per_sales_contact(self):
+        """Test group-by, percentiles and histogram of contract amounts."""
+        call_command('export_snapshot', stdout=io.StringIO())
+
+        res = self.client.get(analytics_url('contracts'), {
+            'group_by': 'sales_contact', 'percentiles': '50', 'bins': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        group, = res.data['groups']
+        self.assertEqual(group['key'], self.sales_user.id)
+        self.assertEqual(group['count'], 3)
+        self.assertEqual(group['sum'], 600.0)
+        self.assertEqual(group['percentiles'], {'50.0': 200.0})
+        self.assertEqual(res.data['histogram']['counts'], [1, 2])
+
+    def test_payment_due_aging(self):
+        """Test the aging buckets of the signed contracts."""
+        call_command('export_snapshot', stdout=io.StringIO())
+
+        res = self.client.get(analytics_url('contracts'), {
+            'group_by': 'aging', 'signed': 'true'})
+
+        buckets = {group['key']: group['sum'] for group in res.data['groups']}
+        self.assertEqual(buckets, {'current': 300.0, '31-60': 100.0})
+
+    def test_attendees_per_month(self):
+        """Test attendee totals per month, ignoring unknown attendees."""
+        call_command('export_snapshot', stdout=io.StringIO())
+
+        res = self.client.get(analytics_url('events'), {'group_by': 'month'})
+
+        group, = res.data['groups']
+        self.assertEqual(group['key'], '2030-05')
+        self.assertEqual(group['sum'], 40.0)
+
+    def test_export_streams_the_columns_in_chunks(self):
+        """Test the columns read over several chunks, NULLs included."""
+        with mock.patch.object(snapshots, 'CHUNK_SIZE', 2):
+            call_command('export_snapshot', stdout=io.StringIO())
+
+        snapshot = snapshots.load()
+        self.assertEqual(list(snapshot['contract_amount']),
+                         [10000, 30000, 20000])
+        self.assertEqual(list(snapshot['event_attendees']), [10, 30, -1])
+        self.assertEqual(list(snapshot['event_date'].astype(str)),
+                         ['2030-05-01'] * 3)
+        self.assertEqual(list(snapshot['contract_customer']), [0, 0, 0])
+
+    def test_invalid_grouping(self):
+        """Test that an unknown group_by is rejected."""
+        call_command('export_snapshot', stdout=io.StringIO())
+
+        res = self.client.get(analytics_url('events'), {'group_by': 'amount'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,173 @@
+"""
+Tests for the audit trail and its api.
+"""
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import audit, sharding
+from core.models import AuditEntry, Company, Contract, Customer
+
+AUDIT_URL = reverse("report-audit")
+CUSTOMER_URL = reverse("customer-list")
+
+
+def detail_customer_url(customer_id):
+    """Return customer detail URL."""
+    return reverse("customer-detail", args=[customer_id])
+
+
+class AuditTests(TestCase):
+    """Test the audit trail of the changes."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.sales_client = APIClient()
+        self.sales_client.force_authenticate(self.sales_user)
+        self.management_client = APIClient()
+        self.management_client.force_authenticate(
+                get_user_model().objects.create_user(
+                    email='management@example.com',
+                    role='management',
+                    password='testpass',
+                    ))
+        # The customer and its entries live on the shard of the sales user.
+        self.db = sharding.shard_of_user(self.sales_user.pk)
+
+    def create_customer(self):
+        """Create and return a new customer, committing its audit entry."""
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            return Customer.objects.create(
+                    first_name='Test Name',
+                    last_name='User',
+                    email='customer@example.com',
+                    company='Test Company',
+                    sales_contact=self.sales_user,
+                    )
+
+    def test_api_changes_are_audited_with_their_actor(self):
+        """Test an update through the api records the diff and the user."""
+        customer = self.create_customer()
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            res = self.sales_client.patch(detail_customer_url(customer.id),
+                                          {'company': 'New Company'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.management_client.get(
+                AUDIT_URL, {'model': 'customer', 'object_id': customer.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        entries = res.data['results']
+        self.assertEqual([entry['action'] for entry in entries],
+                         ['update', 'create'])
+        customer.refresh_from_db()
+        self.assertEqual(customer.company, 'New Company')
+        self.assertEqual(entries[0]['changes'], {'organization_id': [
+            Company.objects.using(self.db).get(name='Test Company').id,
+            customer.organization_id]})
+        self.assertEqual(entries[0]['actor'], self.sales_user.id)
+        self.assertIsNone(entries[1]['actor'])
+
+        res = self.management_client.get(AUDIT_URL,
+                                         {'actor': self.sales_user.id})
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_entries_written_in_one_insert_on_commit(self):
+        """Test the entries of a transaction are buffered and batched."""
+        customer = self.create_customer()
+        with self.captureOnCommitCallbacks(using=self.db) as callbacks:
+            with transaction.atomic(using=self.db):
+                contract = Contract.objects.create(
+                        customer=customer, amount=Decimal('1000.00'),
+                        payment_due=datetime.date.today())
+                contract.amount = Decimal('1200.00')
+                contract.save()
+                contract.signed = True
+                contract.save()
+        self.assertEqual(AuditEntry.objects.using(self.db).filter(
+            model='contract').count(), 0)
+
+        with self.assertNumQueries(1, using=self.db):
+            for callback in callbacks:
+                callback()
+
+        entries = AuditEntry.objects.using(self.db).filter(
+            model='contract').order_by('id')
+        self.assertEqual([entry.changes for entry in entries][1:], [
+            {'amount': ['1000.00', '1200.00']},
+            {'signed': [False, True]},
+            ])
+
+    def test_rolled_back_changes_are_not_audited(self):
+        """Test the buffer of a rolled back transaction is dropped."""
+        customer = self.create_customer()
+        with self.captureOnCommitCallbacks(using=self.db, execute=True):
+            try:
+                with transaction.atomic(using=self.db):
+                    customer.company = 'Rolled Back'
+                    customer.save()
+                    raise ValueError
+            except ValueError:
+                pass
+            customer.refresh_from_db()
+            customer.phone = '0123456789'
+            customer.save()
+
+        self.assertEqual(
+            [entry.changes for entry in AuditEntry.objects.using(
+                self.db).filter(action='update')],
+            [{'phone': [None, '0123456789']}])
+
+    def test_entries_stored_in_monthly_partitions(self):
+        """Test the entries land in the partition of their month."""
+        self.create_customer()
+        out = io.StringIO()
+        call_command('create_audit_partitions', '--months', '4', stdout=out)
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text '
+                           'FROM core_auditentry')
+            partitions = [row[0] for row in cursor.fetchall()]
+        month = datetime.datetime.utcnow().strftime('%Y%m')
+        self.assertEqual(partitions, [f'core_auditentry_{month}'])
+        self.assertIn(f'core_auditentry_{month} ready.', out.getvalue())
+
+    def test_partition_takes_entries_from_the_default_one(self):
+        """Test a late partition takes over the entries of its month."""
+        later = audit.month_starts(12)[-1]
+        date = datetime.datetime.combine(
+            later, datetime.time(12), tzinfo=datetime.timezone.utc)
+        AuditEntry.objects.create(
+            date_created=date, model='contract', object_id=2**40,
+            action='update', changes={})
+
+        call_command('create_audit_partitions', '--months', '13',
+                     stdout=io.StringIO())
+        call_command('create_audit_partitions', '--months', '13',
+                     stdout=io.StringIO())
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text, object_id '
+                           'FROM core_auditentry')
+            self.assertEqual(cursor.fetchall(), [
+                (f'core_auditentry_{later:%Y%m}', 2**40)])
+
+    def test_audit_requires_an_object_or_an_actor(self):
+        """Test listing the whole audit trail is refused."""
+        res = self.management_client.get(AUDIT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,85 @@
+"""
+Tests for the collections api.
+"""
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.models import Customer, Contract
+
+COLLECTIONS_URL = reverse("report-collections")
+OVERDUE_URL = reverse("report-overdue")
+
+
+class CollectionsApiTests(TestCase):
+    """Test the receivables aging report."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com', role='sales', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(
+                email='management@example.com', role='management',
+                password='testpass'))
+        self.customer = Customer.objects.create(
+                first_name='Test Name', last_name='User',
+                email='customer@example.com', company='Test Company',
+                sales_contact=self.sales_user)
+        today = timezone.localdate()
+        self.contracts = {}
+        for days, signed in ((-10, True), (0, True), (15, True), (45, True),
+                             (120, True), (200, False)):
+            self.contracts[days] = Contract.objects.create(
+                    sales_contact=self.sales_user, customer=self.customer,
+                    amount=Decimal(100 + days), signed=signed,
+                    payment_due=today - datetime.timedelta(days=days))
+
+    def test_aging_buckets(self):
+        """Test the buckets per sales contact and per customer."""
+        res = self.client.get(COLLECTIONS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sales_contact, = res.data['sales_contacts']
+        self.assertEqual(sales_contact['sales_contact'], self.sales_user.id)
+        self.assertEqual(sales_contact['current'], Decimal('190.00'))
+        self.assertEqual(sales_contact['1-30'], Decimal('115.00'))
+        self.assertEqual(sales_contact['31-60'], Decimal('145.00'))
+        self.assertEqual(sales_contact['61-90'], Decimal('0.00'))
+        self.assertEqual(sales_contact['90+'], Decimal('220.00'))
+        customer, = res.data['customers']
+        self.assertEqual(customer['company'], 'Test Company')
+        self.assertEqual(customer['90+'], Decimal('220.00'))
+
+    def test_overdue_drill_down(self):
+        """Test the paginated list of overdue signed contracts."""
+        res = self.client.get(OVERDUE_URL, {'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual([contract['id'] for contract in res.data['results']],
+                         [self.contracts[120].id, self.contracts[45].id])
+        self.assertEqual(res.data['results'][0]['days_overdue'], 120)
+
+    def test_overdue_bad_filter(self):
+        """Test that sales contacts or customers not ids are rejected."""
+        for params in ({'customer': 'abc'}, {'sales_contact': '1.5'}):
+            res = self.client.get(OVERDUE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sales_cannot_get_collections(self):
+        """Test that the report is restricted to management."""
+        client = APIClient()
+        client.force_authenticate(self.sales_user)
+
+        res = client.get(COLLECTIONS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,137 @@
+"""
+Tests for the pipeline report api.
+"""
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core.models import Customer, Contract, PipelineSummary
+
+PIPELINE_URL = reverse("report-pipeline")
+
+
+def create_contract(sales_user, customer, **params):
+    """Create and return a new contract."""
+    defaults = {
+            'signed': False,
+            'amount': Decimal('1000.00'),
+            'payment_due': datetime.date.today(),
+            }
+    defaults.update(params)
+    return Contract.objects.create(sales_contact=sales_user,
+                                   customer=customer, **defaults)
+
+
+class PipelineApiTests(TestCase):
+    """Test the pipeline summary and its report."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.sales_user = get_user_model().objects.create_user(
+                email='sales@example.com',
+                role='sales',
+                password='testpass',
+                )
+        self.management_client = APIClient()
+        self.management_client.force_authenticate(
+                get_user_model().objects.create_user(
+                    email='management@example.com',
+                    role='management',
+                    password='testpass',
+                    ))
+        self.customer = Customer.objects.create(
+                first_name='Test Name',
+                last_name='User',
+                email='customer@example.com',
+                company='Test Company',
+                sales_contact=self.sales_user,
+                )
+        # The rows all live on the shard of the customer, the report reads
+        # every shard.
+        self.db = self.customer._state.db
+
+    def summary(self, signed):
+        """Return the (count, amount) summarized for a signature status."""
+        row = PipelineSummary.objects.using(self.db).filter(
+                sales_contact=self.sales_user, signed=signed).first()
+        return (row.contract_count, row.total_amount) if row else (0, 0)
+
+    def test_summary_follows_contract_changes(self):
+        """Test that creating, signing, re-amounting and deleting contracts
+        update the summary."""
+        contract = create_contract(self.sales_user, self.customer)
+        create_contract(self.sales_user, self.customer, amount=500)
+        self.assertEqual(self.summary(False), (2, Decimal('1500.00')))
+
+        contract.signed = True
+        contract.save()
+        self.assertEqual(self.summary(False), (1, Decimal('500.00')))
+        self.assertEqual(self.summary(True), (1, Decimal('1000.00')))
+
+        contract.amount = Decimal('1200.00')
+        contract.save()
+        self.assertEqual(self.summary(True), (1, Decimal('1200.00')))
+
+        Contract.objects.using(self.db).get(id=contract.id).delete()
+        self.assertEqual(self.summary(True), (0, Decimal('0.00')))
+
+    def test_rebuild_pipeline_reconciles_the_summary(self):
+        """Test that the command recomputes the summary from contracts."""
+        create_contract(self.sales_user, self.customer, signed=True)
+        Contract.objects.using(self.db).update(amount=Decimal('42.00'))
+        PipelineSummary.objects.using(self.db).create(
+                month=datetime.date(2000, 1, 1), signed=False,
+                contract_count=3)
+
+        call_command('rebuild_pipeline', stdout=io.StringIO())
+
+        self.assertEqual(PipelineSummary.objects.using(self.db).count(), 1)
+        self.assertEqual(self.summary(True), (1, Decimal('42.00')))
+
+    def test_management_gets_the_pipeline(self):
+        """Test the revenue and conversion rate per sales contact."""
+        create_contract(self.sales_user, self.customer, signed=True)
+        create_contract(self.sales_user, self.customer)
+        create_contract(self.sales_user, self.customer)
+        create_contract(self.sales_user, self.customer, signed=True,
+                        amount=Decimal('250.50'))
+
+        res = self.management_client.get(PIPELINE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['sales_contact'], self.sales_user.id)
+        self.assertEqual(res.data[0]['signed_amount'], '1250.50')
+        self.assertEqual(res.data[0]['unsigned_count'], 2)
+        self.assertEqual(res.data[0]['conversion_rate'], 0.5)
+
+    def test_pipeline_bad_month(self):
+        """Test that an invalid month is rejected."""
+        res = self.management_client.get(PIPELINE_URL, {'from': '2023'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pipeline_bad_sales_contact(self):
+        """Test that a sales contact which is not an id is rejected."""
+        for sales_contact in ('abc', '1.5'):
+            res = self.management_client.get(
+                    PIPELINE_URL, {'sales_contact': sales_contact})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sales_cannot_get_the_pipeline(self):
+        """Test that the report is restricted to management."""
+        client = APIClient()
+        client.force_authenticate(self.sales_user)
+
+        res = client.get(PIPELINE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,19 @@
+"""
+URL mappings for the report app.
+"""
+from django.urls import path
+
+from report import views
+
+
+urlpatterns = [
+        path("pipeline/", views.PipelineView.as_view(),
+             name="report-pipeline"),
+        path("collections/", views.CollectionsView.as_view(),
+             name="report-collections"),
+        path("collections/overdue/", views.OverdueContractsView.as_view(),
+             name="report-overdue"),
+        path("audit/", views.AuditView.as_view(), name="report-audit"),
+        path("analytics/<str:dataset>/", views.AnalyticsView.as_view(),
+             name="report-analytics"),
+        ]
@@ -0,0 +1,265 @@
+"""
+Views for the report APIs.
+
+The reports read every shard: the pipeline and the collections add up the
+rows of each one, the overdue contracts and the audit trail are merged in
+their order, and the analytics read the snapshot exported from all of them.
+"""
+import datetime
+import logging
+
+from django.db.models import DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.timezone import make_aware
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import sharding, snapshots
+from core.models import AuditEntry, Contract, PipelineSummary
+
+from customer.permissions import IsManagement
+from report import analytics, serializers
+
+logger = logging.getLogger('django')
+
+
+AGING_BUCKETS = (
+    ('current', 0, None),
+    ('1-30', 1, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+
+
+AUDITED_MODELS = ('customer', 'contract', 'event')
+
+
+def parse_month(value):
+    """Return the first day of a YYYY-MM month."""
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+class PipelineView(APIView):
+    """
+    Sales pipeline per sales contact and month: signed and unsigned
+    contract count and value, and conversion rate.
+    """
+    permission_classes = (IsAuthenticated, IsManagement)
+
+    def get(self, request, *args, **kwargs):
+        """Return the pipeline read from the summary table."""
+        rows = PipelineSummary.objects.order_by('month', 'sales_contact_id')
+        try:
+            if 'from' in request.query_params:
+                rows = rows.filter(
+                        month__gte=parse_month(request.query_params['from']))
+            if 'to' in request.query_params:
+                rows = rows.filter(
+                        month__lte=parse_month(request.query_params['to']))
+        except ValueError:
+            logger.error('Invalid month format.')
+            return Response(
+                    {'error': 'Invalid month format, expected YYYY-MM.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        sales_contact = request.query_params.get('sales_contact', None)
+        if sales_contact is not None:
+            try:
+                rows = rows.filter(sales_contact_id=int(sales_contact))
+            except ValueError:
+                logger.error('Invalid sales contact.')
+                return Response(
+                        {'error': 'Invalid sales contact.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                        )
+        pipeline = {}
+        for row in sharding.scatter(rows).iterator():
+            key = (row.sales_contact_id, row.month)
+            entry = pipeline.setdefault(key, {
+                'sales_contact': row.sales_contact_id,
+                'month': row.month,
+                'signed_count': 0,
+                'signed_amount': 0,
+                'unsigned_count': 0,
+                'unsigned_amount': 0,
+                })
+            prefix = 'signed' if row.signed else 'unsigned'
+            entry[f'{prefix}_count'] += row.contract_count
+            entry[f'{prefix}_amount'] += row.total_amount
+        for entry in pipeline.values():
+            total = entry['signed_count'] + entry['unsigned_count']
+            entry['conversion_rate'] = (entry['signed_count'] / total
+                                        if total else 0.0)
+        serializer = serializers.PipelineSerializer(pipeline.values(),
+                                                    many=True)
+        return Response(serializer.data)
+
+
+class AnalyticsView(APIView):
+    """
+    Group-bys, percentiles and histograms of the contract amounts or event
+    attendees, computed on the latest columnar snapshot.
+    """
+    permission_classes = (IsAuthenticated, IsManagement)
+
+    def get(self, request, dataset, *args, **kwargs):
+        """Return the aggregated dataset."""
+        query = serializers.AnalyticsQuerySerializer(
+                data=request.query_params)
+        query.is_valid(raise_exception=True)
+        snapshot = snapshots.load()
+        if snapshot is None:
+            logger.error('No analytics snapshot has been exported.')
+            return Response(
+                    {'error': 'No analytics snapshot available.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE
+                    )
+        params = query.validated_data
+        filters = {key: request.query_params[key].lower() == 'true'
+                   for key in ('signed', 'closed')
+                   if key in request.query_params}
+        try:
+            result = analytics.analyze(
+                    snapshot, dataset, group_by=params.get('group_by'),
+                    filters=filters, percentiles=params['percentiles'],
+                    bins=params.get('bins'))
+        except KeyError:
+            logger.error('Invalid dataset or grouping.')
+            return Response(
+                    {'error': 'Invalid dataset or group_by.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        result['generated_at'] = snapshot.generated_at
+        return Response(result)
+
+
+def aging_filter(today, low, high):
+    """Return the filter of the contracts due low to high days ago."""
+    if low == 0:
+        return Q(payment_due__gte=today)
+    condition = Q(payment_due__lte=today - datetime.timedelta(days=low))
+    if high is not None:
+        condition &= Q(payment_due__gte=today - datetime.timedelta(days=high))
+    return condition
+
+
+class CollectionsView(APIView):
+    """Receivables of the signed contracts by days overdue."""
+    permission_classes = (IsAuthenticated, IsManagement)
+
+    def get(self, request, *args, **kwargs):
+        """Return the aging buckets per sales contact and per customer."""
+        today = timezone.localdate()
+        amount = DecimalField(max_digits=14, decimal_places=2)
+        buckets = {
+            name: Coalesce(Sum('amount', filter=aging_filter(today, low,
+                                                             high)),
+                           0, output_field=amount)
+            for name, low, high in AGING_BUCKETS
+            }
+        rows = Contract.objects.filter(signed=True).values(
+                'sales_contact_id', 'sales_contact__email', 'customer_id',
+                'customer__organization__name').annotate(**buckets).order_by()
+        by_sales_contact = {}
+        by_customer = {}
+        for row in (row for shard_rows in sharding.spread(rows)
+                    for row in shard_rows):
+            for totals, key, label in (
+                    (by_sales_contact, row['sales_contact_id'],
+                     {'sales_contact': row['sales_contact_id'],
+                      'email': row['sales_contact__email']}),
+                    (by_customer, row['customer_id'],
+                     {'customer': row['customer_id'],
+                      'company': row['customer__organization__name']})):
+                entry = totals.setdefault(key, dict(
+                    label, **{name: 0 for name, _, _ in AGING_BUCKETS}))
+                for name, _, _ in AGING_BUCKETS:
+                    entry[name] += row[name]
+        return Response({
+            'date': today,
+            'sales_contacts': list(by_sales_contact.values()),
+            'customers': list(by_customer.values()),
+            })
+
+
+class OverdueContractsView(generics.ListAPIView):
+    """Signed contracts past their payment due date, oldest first."""
+    permission_classes = (IsAuthenticated, IsManagement)
+    serializer_class = serializers.OverdueContractSerializer
+
+    filters = {}
+
+    def get_queryset(self):
+        return sharding.scatter(Contract.objects.filter(
+                signed=True, payment_due__lt=timezone.localdate(),
+                **self.filters).order_by('payment_due', 'id'))
+
+    def list(self, request, *args, **kwargs):
+        """Return the overdue contracts of a sales contact or customer."""
+        try:
+            self.filters = {f'{key}_id': int(request.query_params[key])
+                            for key in ('sales_contact', 'customer')
+                            if key in request.query_params}
+        except ValueError:
+            logger.error('Invalid overdue filter.')
+            return Response(
+                    {'error': 'Invalid sales contact or customer.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        return super().list(request, *args, **kwargs)
+
+
+class AuditView(generics.ListAPIView):
+    """
+    Audit trail of an object (`model` and `object_id`) or of a user
+    (`actor`), newest first, optionally restricted to a date range.
+    """
+    permission_classes = (IsAuthenticated, IsManagement)
+    serializer_class = serializers.AuditEntrySerializer
+    queryset = AuditEntry.objects.all()
+
+    def get_queryset(self):
+        return sharding.scatter(self.queryset.all())
+
+    def list(self, request, *args, **kwargs):
+        """Return the audit entries of an object or of a user."""
+        params = request.query_params
+        try:
+            if 'object_id' in params:
+                if params.get('model') not in AUDITED_MODELS:
+                    raise ValueError(params.get('model'))
+                self.queryset = self.queryset.filter(
+                        model=params['model'],
+                        object_id=int(params['object_id']))
+            if 'actor' in params:
+                self.queryset = self.queryset.filter(
+                        actor_id=int(params['actor']))
+            if 'from' in params:
+                self.queryset = self.queryset.filter(
+                        date_created__gte=make_aware(
+                            datetime.datetime.strptime(params['from'],
+                                                       "%Y-%m-%d")))
+            if 'to' in params:
+                self.queryset = self.queryset.filter(
+                        date_created__lt=make_aware(
+                            datetime.datetime.strptime(params['to'],
+                                                       "%Y-%m-%d")
+                            + datetime.timedelta(days=1)))
+        except ValueError:
+            logger.error('Invalid audit filter.')
+            return Response(
+                    {'error': 'Invalid audit filter.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        if 'object_id' not in params and 'actor' not in params:
+            logger.error('Object or actor not provided.')
+            return Response(
+                    {'error': 'Provide model and object_id, or actor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        self.queryset = self.queryset.order_by('-date_created', '-id')
+        return super().list(request, *args, **kwargs)
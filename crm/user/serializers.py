@@ -0,0 +1,30 @@
+"""
+Serializers for the user APIs.
+"""
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+
+class TransferSerializer(serializers.Serializer):
+    """Serializer for the transfer of the portfolio of a user."""
+    targets = serializers.PrimaryKeyRelatedField(
+            many=True, queryset=get_user_model().objects.filter(
+                is_active=True))
+    customers = serializers.ListField(
+            child=serializers.IntegerField(), required=False,
+            allow_empty=False)
+    balance = serializers.BooleanField(default=False)
+
+    def validate_targets(self, value):
+        """Check the targets have the role of the user leaving."""
+        user = self.context['user']
+        if not value:
+            raise serializers.ValidationError(
+                "At least one target user is required.")
+        if any(target.pk == user.pk for target in value):
+            raise serializers.ValidationError(
+                "A user cannot transfer their portfolio to themselves.")
+        if any(target.role != user.role for target in value):
+            raise serializers.ValidationError(
+                f"Target users must have the {user.role} role.")
+        return list({target.pk: target for target in value}.values())
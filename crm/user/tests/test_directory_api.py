@@ -0,0 +1,134 @@
+"""
+Tests for the staff directory API.
+"""
+import threading
+import unittest.mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import directory
+
+DIRECTORY_URL = reverse('user-directory')
+
+
+def create_user(email, role, **params):
+    return get_user_model().objects.create_user(
+            email=email, role=role, password='testpass', **params)
+
+
+class DirectoryApiTests(TestCase):
+    """Test the cached staff directory."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sales = create_user('sales@example.com', 'sales',
+                                 first_name='Alice', last_name='Martin')
+        self.support = create_user('support@example.com', 'support',
+                                   first_name='Bob', last_name='Durand')
+        self.former = create_user('former@example.com', 'support',
+                                  first_name='Mallory', last_name='Dupont',
+                                  is_active=False)
+        self.manager = create_user('manager@example.com', 'management',
+                                   first_name='Carol', last_name='Dumas')
+        self.client.force_authenticate(self.sales)
+
+    def test_directory_requires_authentication(self):
+        """Test anonymous users cannot list the staff."""
+        res = APIClient().get(DIRECTORY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_filter_by_role_and_active_state(self):
+        """Test the directory lists the active users of a role."""
+        res = self.client.get(DIRECTORY_URL, {'role': 'support'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['id'] for user in res.data],
+                         [self.support.id])
+
+        self.client.force_authenticate(self.manager)
+        res = self.client.get(DIRECTORY_URL, {'role': 'support',
+                                              'active': 'all'})
+
+        self.assertEqual([user['email'] for user in res.data],
+                         ['former@example.com', 'support@example.com'])
+
+    def test_only_active_sales_and_support_users_are_listed(self):
+        """Test the other roles and the inactive users stay hidden."""
+        res = self.client.get(DIRECTORY_URL)
+
+        self.assertEqual([user['id'] for user in res.data],
+                         [self.support.id, self.sales.id])
+
+        res = self.client.get(DIRECTORY_URL, {'active': 'false'})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_prefix_search(self):
+        """Test the search matches the start of the email or names."""
+        res = self.client.get(DIRECTORY_URL, {'search': 'dur'})
+
+        self.assertEqual([user['id'] for user in res.data],
+                         [self.support.id])
+        self.assertEqual(self.client.get(
+            DIRECTORY_URL, {'search': 'artin'}).data, [])
+
+    def test_etag_and_invalidation(self):
+        """Test unchanged directories answer 304 until a user is saved."""
+        res = self.client.get(DIRECTORY_URL, {'role': 'sales'})
+        etag = res['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(DIRECTORY_URL, {'role': 'sales'},
+                                  HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.sales.first_name = 'Alicia'
+        self.sales.save()
+        res = self.client.get(DIRECTORY_URL, {'role': 'sales'},
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['first_name'], 'Alicia')
+
+    def test_invalid_active_state(self):
+        """Test an unknown active state is rejected."""
+        res = self.client.get(DIRECTORY_URL, {'active': 'maybe'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_clear_during_reads(self):
+        """Test reads racing with clears always see a whole directory."""
+        users = [{'id': 1, 'email': 'a@example.com', 'first_name': 'A',
+                  'last_name': 'B', 'role': 'sales', 'is_active': True}]
+        errors = []
+        done = threading.Event()
+
+        def read():
+            while not done.is_set():
+                try:
+                    directory.search(role='sales')
+                except Exception as error:
+                    errors.append(error)
+                    return
+
+        with unittest.mock.patch('core.directory.load',
+                                 side_effect=lambda: [dict(users[0])]):
+            readers = [threading.Thread(target=read) for _ in range(4)]
+            for reader in readers:
+                reader.start()
+            for _ in range(2000):
+                directory.clear()
+            done.set()
+            for reader in readers:
+                reader.join()
+        directory.clear()
+
+        self.assertEqual(errors, [])
@@ -0,0 +1,140 @@
+"""
+Tests for the portfolio transfer API.
+"""
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Contract, Customer, Event, PipelineSummary
+
+
+def transfer_url(user_id):
+    """Return the transfer URL of a user."""
+    return reverse('user-transfer', args=[user_id])
+
+
+def create_user(email, role):
+    return get_user_model().objects.create_user(
+            email=email, role=role, password='testpass')
+
+
+class TransferApiTests(TestCase):
+    """Test the transfer of the portfolio of a leaving user."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = create_user('manager@example.com', 'management')
+        self.client.force_authenticate(self.manager)
+        self.leaving = create_user('leaving@example.com', 'sales')
+        self.targets = [create_user(f'sales{index}@example.com', 'sales')
+                        for index in range(2)]
+        self.support = create_user('support@example.com', 'support')
+        self.customers = []
+        for index in range(3):
+            customer = Customer.objects.create(
+                    first_name='Test', last_name=f'Customer {index}',
+                    email=f'customer{index}@example.com',
+                    company='Test Company', sales_contact=self.leaving)
+            for _ in range(index + 1):
+                Contract.objects.create(
+                        sales_contact=self.leaving, customer=customer,
+                        amount=Decimal('100.00'),
+                        payment_due=datetime.date.today())
+            self.customers.append(customer)
+        # The rows all live on the shard of the leaving user.
+        self.db = self.customers[0]._state.db
+
+    def test_transfer_requires_management(self):
+        """Test a sales user cannot transfer a portfolio."""
+        self.client.force_authenticate(self.targets[0])
+
+        res = self.client.post(transfer_url(self.leaving.id),
+                               {'targets': [self.targets[0].id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_transfer_whole_portfolio(self):
+        """Test every customer and contract moves to the target."""
+        res = self.client.post(transfer_url(self.leaving.id),
+                               {'targets': [self.targets[0].id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['customers'], res.data['contracts']),
+                         (3, 6))
+        self.assertEqual(res.data['targets'], {self.targets[0].id: 9})
+        self.assertTrue(res.data['progress'])
+        self.assertFalse(Customer.objects.using(self.db).filter(
+            sales_contact=self.leaving).exists())
+        self.assertFalse(Contract.objects.using(self.db).filter(
+            sales_contact=self.leaving).exists())
+        self.assertEqual(
+            list(PipelineSummary.objects.using(self.db).values_list(
+                'sales_contact_id', 'contract_count')),
+            [(self.targets[0].id, 6)])
+
+    def test_transfer_subset_of_customers(self):
+        """Test only the rows of the given customers move."""
+        res = self.client.post(transfer_url(self.leaving.id), {
+            'targets': [self.targets[0].id],
+            'customers': [self.customers[0].id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual((res.data['customers'], res.data['contracts']),
+                         (1, 1))
+        self.assertEqual(Contract.objects.using(self.db).filter(
+            sales_contact=self.leaving).count(), 5)
+
+    def test_transfer_balances_targets(self):
+        """Test balancing hands the customers to the least loaded target."""
+        Customer.objects.create(
+                first_name='Test', last_name='Owned',
+                email='owned@example.com', company='Test Company',
+                sales_contact=self.targets[0])
+
+        res = self.client.post(transfer_url(self.leaving.id), {
+            'targets': [target.id for target in self.targets],
+            'balance': True}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['targets'],
+                         {self.targets[0].id: 5, self.targets[1].id: 4})
+        for customer in Customer.objects.using(self.db).filter(pk__in=[
+                customer.id for customer in self.customers]):
+            self.assertFalse(customer.contract_set.exclude(
+                sales_contact=customer.sales_contact).exists())
+
+    def test_transfer_open_events_of_support(self):
+        """Test a support user's open events move, closed ones stay."""
+        Event.objects.create(customer=self.customers[0],
+                             support_contact=self.support)
+        closed = Event.objects.create(customer=self.customers[1],
+                                      support_contact=self.support,
+                                      event_closed=True)
+        other = create_user('support2@example.com', 'support')
+
+        res = self.client.post(transfer_url(self.support.id),
+                               {'targets': [other.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['events'], 1)
+        closed.refresh_from_db()
+        self.assertEqual(closed.support_contact, self.support)
+
+    def test_transfer_rejects_other_role(self):
+        """Test targets must have the role of the leaving user."""
+        res = self.client.post(transfer_url(self.leaving.id),
+                               {'targets': [self.support.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Customer.objects.using(self.db).filter(
+            sales_contact=self.leaving).count(), 3)
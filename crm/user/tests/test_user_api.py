@@ -17,6 +17,7 @@ def create_user(**params):
 
 class PublicUserApiTests(TestCase):
     """Test the users API (public)."""
+    databases = '__all__'
 
     def setUp(self):
         self.client = APIClient()
@@ -62,6 +63,8 @@ class PublicUserApiTests(TestCase):
 
 
 class JWTAuthenticationTestCase(APITestCase):
+    databases = '__all__'
+
     def test_get_token(self):
         """
         Test that controls the implementation of the JWT Authentication.
@@ -0,0 +1,13 @@
+"""
+URL mappings for the user app.
+"""
+from django.urls import path
+
+from user import views
+
+
+urlpatterns = [
+        path("", views.DirectoryView.as_view(), name="user-directory"),
+        path("<int:pk>/transfer/", views.TransferView.as_view(),
+             name="user-transfer"),
+        ]
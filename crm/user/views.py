@@ -0,0 +1,116 @@
+"""
+Views for the user APIs.
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import bulk, directory, sharding
+
+from customer.permissions import IsManagement
+from user import serializers
+
+logger = logging.getLogger('django')
+
+ACTIVE_STATES = {'true': True, 'false': False, 'all': None}
+
+
+class DirectoryView(APIView):
+    """
+    Staff directory for the contact pickers: the sales or support users of
+    a `role`, active ones unless `active` is false or all (for management
+    users only), whose email, first or last name starts with `search`.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """Return the matching users from the cached directory."""
+        params = request.query_params
+        active = params.get('active', 'true').lower()
+        if active not in ACTIVE_STATES:
+            logger.error('Invalid active state.')
+            return Response(
+                    {'error': 'Invalid active state, expected true, false '
+                              'or all.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        if (ACTIVE_STATES[active] is not True and
+                not IsManagement().has_permission(request, self)):
+            logger.error('Inactive users requested by a non management '
+                         'user.')
+            return Response(
+                    {'error': 'Only management users can list the inactive '
+                              'users.'},
+                    status=status.HTTP_403_FORBIDDEN
+                    )
+        etag, users = directory.search(
+                role=params.get('role'), active=ACTIVE_STATES[active],
+                prefix=params.get('search'))
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(users)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=60'
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class TransferView(APIView):
+    """
+    Move the customers and contracts of a sales user, or the open events of
+    a support user, to one or more target users: all of them or those of
+    the given `customers`, dealt in turn to the targets or, with `balance`,
+    to the least loaded ones, counting the rows they own on every shard.
+    Each shard is moved in its own transaction.
+    """
+    permission_classes = (IsAuthenticated, IsManagement)
+
+    def post(self, request, pk, *args, **kwargs):
+        """Transfer the portfolio and return the number of rows moved."""
+        user = get_object_or_404(get_user_model(), pk=pk)
+        if user.role not in ('sales', 'support'):
+            logger.error('User has no portfolio to transfer.')
+            return Response(
+                    {'error': 'Only sales and support users have a '
+                              'portfolio to transfer.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                    )
+        serializer = serializers.TransferSerializer(
+                data=request.data, context={'user': user})
+        serializer.is_valid(raise_exception=True)
+        progress = []
+
+        def report(model, done, total):
+            logger.info('Transferred %d of %d %s of user %d.', done, total,
+                        model._meta.verbose_name_plural, user.pk)
+            progress.append({'model': model._meta.model_name,
+                             'done': done, 'total': total})
+
+        targets = serializer.validated_data['targets']
+        loads = None
+        if serializer.validated_data['balance']:
+            loads = {target.pk: 0 for target in targets}
+            for _ in sharding.each():
+                counts = bulk.owned_counts(bulk.owner_field(user), targets)
+                for key, count in counts.items():
+                    loads[key] += count
+        moved = {'customers': 0, 'contracts': 0, 'events': 0,
+                 'targets': {target.pk: 0 for target in targets}}
+        for _ in sharding.each():
+            shard_moved = bulk.transfer(
+                    user, targets,
+                    customers=serializer.validated_data.get('customers'),
+                    balance=serializer.validated_data['balance'],
+                    progress=report, loads=loads)
+            for key, count in shard_moved.pop('targets').items():
+                moved['targets'][key] += count
+            for key, count in shard_moved.items():
+                moved[key] += count
+        return Response({**moved, 'progress': progress})